@@ -1,9 +1,18 @@
-from typing import List
+from typing import List, TextIO
+import itertools
+import numpy as np
 import simpy
 import random
 import string
 
+from event_trace import EventTrace, format_commit_id
 from queue_metrics import QueueMetrics
+from rate_limiter import make_rate_limiter
+from resources import MonitoredResource, MonitoredFilterStore
+from variates import RandomVariates
+
+# nombre d'unités de temps de la simulation par minute
+MINUTE_UNIT = 2
 
 
 class Utilisateur:
@@ -12,17 +21,99 @@ class Utilisateur:
 
     :param name: Nom de l'étudiant.
     :param promo: Promotion de l'étudiant.
+    :param intelligence: Intelligence de l'étudiant (tirée au hasard si None).
     """
 
+    __slots__ = ("name", "promo", "current_exo", "index", "intelligence")
+
     def __init__(
         self,
         name: str,
         promo: str,
+        intelligence: float | None = None,
     ):
         self.name = name
         self.promo = promo
         self.current_exo = 1
-        self.intelligence = max(min(random.gauss(mu=0.6, sigma=0.075), 0.75), 0.2)
+        self.index = -1  # position dans la moulinette, fixée par Moulinette.add_user
+        self.intelligence = (
+            RandomVariates().intelligence() if intelligence is None else intelligence
+        )
+
+    def __str__(self):
+        return f"[{self.name} - {self.promo}]"
+
+
+PROMOS = ("ING", "PREPA")
+
+
+class UserTable:
+    """
+    Table des utilisateurs stockée en colonnes numpy (struct-of-arrays) pour les grandes populations.
+    Les utilisateurs sont manipulés au travers de vues légères (TableUser).
+
+    :param size: Nombre d'utilisateurs de la table.
+    :param prefix: Préfixe des noms des utilisateurs (suivi de leur numéro).
+    """
+
+    def __init__(self, size: int, prefix: str = "USER"):
+        self.prefix = prefix
+        self.name_index = np.arange(size, dtype=np.int32)
+        self.promo = np.zeros(size, dtype=np.int8)  # index dans PROMOS
+        self.intelligence = np.zeros(size, dtype=np.float64)
+        self.current_exo = np.ones(size, dtype=np.int16)
+        self.size = 0
+
+    def add(self, promo: str, intelligence: float | None = None) -> "TableUser":
+        """
+        Ajoute un utilisateur et retourne sa vue.
+
+        :param promo: Promotion de l'étudiant.
+        :param intelligence: Intelligence de l'étudiant (tirée au hasard si None).
+        """
+        row = self.size
+        self.promo[row] = PROMOS.index(promo)
+        self.intelligence[row] = (
+            RandomVariates().intelligence() if intelligence is None else intelligence
+        )
+        self.size += 1
+        return TableUser(self, row)
+
+
+class TableUser:
+    """
+    Vue sur une ligne de UserTable, interchangeable avec Utilisateur.
+
+    :param table: Table des utilisateurs.
+    :param row: Ligne de l'utilisateur dans la table.
+    """
+
+    __slots__ = ("table", "row", "index")
+
+    def __init__(self, table: UserTable, row: int):
+        self.table = table
+        self.row = row
+        self.index = -1  # position dans la moulinette, fixée par Moulinette.add_user
+
+    @property
+    def name(self) -> str:
+        return f"{self.table.prefix}{self.table.name_index[self.row]}"
+
+    @property
+    def promo(self) -> str:
+        return PROMOS[self.table.promo[self.row]]
+
+    @property
+    def intelligence(self) -> float:
+        return float(self.table.intelligence[self.row])
+
+    @property
+    def current_exo(self) -> int:
+        return int(self.table.current_exo[self.row])
+
+    @current_exo.setter
+    def current_exo(self, value: int):
+        self.table.current_exo[self.row] = value
 
     def __str__(self):
         return f"[{self.name} - {self.promo}]"
@@ -35,22 +126,49 @@ class Commit:
     :param user: autheur du commit.
     :param date: date (timestep de la simulation) du commit
     :param exo: exercice du commit.
+    :param number: numéro du commit dans la simulation.
+    :param random_id: si False, l'identifiant affiché est dérivé du numéro (à la demande) au lieu d'être tiré au hasard.
+    :param attempt: rang du commit parmi les commits de l'utilisateur pour cet exercice (0 pour le premier).
     """
 
+    __slots__ = ("user", "_id", "number", "date", "exo", "chance_to_pass", "attempt")
+
     def __init__(
-        self, user: Utilisateur, date: int, exo: int, chance_to_pass: float | None
+        self,
+        user: Utilisateur,
+        date: int,
+        exo: int,
+        chance_to_pass: float | None,
+        number: int = -1,
+        random_id: bool = True,
+        attempt: int = 0,
     ):
         self.user = user
-        self.id = self._generate_id()
+        self._id = self._generate_id() if random_id else None
+        self.number = number
         self.date = date
         self.exo = exo
         self.chance_to_pass = (
             user.intelligence if chance_to_pass == None else chance_to_pass
         )
+        self.attempt = attempt
 
     def _generate_id(self):
         return "".join(random.choices(string.ascii_lowercase + string.digits, k=6))
 
+    @property
+    def draw_key(self) -> tuple:
+        """
+        Clé (utilisateur, exo, essai) des tirages aléatoires liés à ce commit (voir CommonRandomVariates).
+        """
+        return (self.user.index, self.exo, self.attempt)
+
+    @property
+    def id(self) -> str:
+        if self._id is None:
+            self._id = format_commit_id(self.number)
+        return self._id
+
     def __str__(self):
         return f"[{self.id} - exo {self.exo} - time {self.date}] by {self.user}"
 
@@ -64,8 +182,19 @@ class Moulinette:
     :param result_time: Temps de process d'un utilisateur dans la file d'envoi.
     :param tag_limit: Nombre de tag limite par heure (60 unités de temps).
     :param nb_exos: Nombre d'exos par utilisateur.
+    :param metrics_mode: "sampled" (relevé à chaque unité de temps), "event" (relevé à chaque changement d'état) ou "stream" (relevé à chaque changement d'état, statistiques en mémoire constante, sans graphe).
+    :param rate_limit: Politique de limitation des tags ("sliding_window", "token_bucket" ou "leaky_bucket").
+    :param trace: Trace des événements (par défaut, affichage texte sur la sortie standard).
+    :param compact: Commits à identifiants entiers (pas de tirage d'identifiant aléatoire).
+    :param variates: Source des tirages aléatoires (par défaut, le module random global).
+    :param engine: Moteur de simulation : "simpy" (processus simpy), "fast" (calendrier d'événements natif, voir fast_engine) ou "vector" (pas de temps vectorisé, variantes infinie et finie, voir vector_engine).
     """
 
+    # variantes du modèle, lues par les moteurs "fast" et "vector"
+    initial_think = True  # premier exercice travaillé avant le premier commit
+    uses_backup = False  # résultats refusés placés dans un backup
+    prepa_test_coeff = 1  # multiplicateur du temps de test des PREPA
+
     def __init__(
         self,
         K: int = 10,
@@ -73,65 +202,152 @@ class Moulinette:
         result_time: int = 1,
         tag_limit: int = 5,
         nb_exos: int = 10,
+        metrics_mode: str = "sampled",
+        rate_limit: str = "sliding_window",
+        trace: EventTrace | None = None,
+        compact: bool = False,
+        variates: RandomVariates | None = None,
+        engine: str = "simpy",
     ):
+        if metrics_mode not in ("sampled", "event", "stream"):
+            raise ValueError(f"Unknown metrics mode: {metrics_mode}")
+        if engine not in ("simpy", "fast", "vector"):
+            raise ValueError(f"Unknown engine: {engine}")
+
         self.env = simpy.Environment()
-        self.test_server = simpy.Resource(self.env, capacity=K)
-        self.result_server = simpy.Resource(self.env, capacity=1)
+        self.metrics_mode = metrics_mode
+        self.engine = engine
+        event_driven = metrics_mode in ("event", "stream")
+        on_change = self._record_state_change if event_driven else None
+        self.test_server = MonitoredResource(self.env, capacity=K, on_change=on_change)
+        self.result_server = MonitoredResource(
+            self.env, capacity=1, on_change=on_change
+        )
         self.tag_limit = tag_limit
         self.process_time = process_time
         self.result_time = result_time
         self.nb_exos = nb_exos
         self.users: List[Utilisateur] = []
-        self.users_commit_time = {}  # user -> [timestep, ...] (maxlen tag_limit)
-        self.backup_storage = simpy.FilterStore(self.env)
-        self.metrics = QueueMetrics()
+        self.rate_limiter = make_rate_limiter(
+            rate_limit, limit=tag_limit, window=60 * MINUTE_UNIT
+        )
+        self.backup_storage = MonitoredFilterStore(self.env, on_change=on_change)
+        self.metrics = QueueMetrics(
+            event_driven=event_driven, streaming=metrics_mode == "stream"
+        )
+        self.trace = trace if trace is not None else EventTrace()
+        self.compact = compact
+        self.variates = variates if variates is not None else RandomVariates()
+        self._commit_numbers = itertools.count()
+        self._attempts = {}  # index utilisateur -> (exo, rang du dernier commit)
+        # fin de simulation : tous les utilisateurs ont fini et le backup est vide
+        self.nb_users_done = 0
+        self.all_done = self.env.event()
+
+    def _current_state(self) -> dict:
+        """
+        État instantané des files et serveurs, au format attendu par QueueMetrics.record_state.
+        """
+        # Test queue metrics
+        test_server_count = self.test_server.count
+        test_queue_length = len(self.test_server.queue) + test_server_count
+        test_utilization = (
+            self.test_server.count / self.test_server.capacity
+            if self.test_server.capacity > 0
+            else 0
+        )
+        backup_length = len(self.backup_storage.items)
+
+        # Result queue metrics
+        result_server_count = self.result_server.count
+        result_queue_length = len(self.result_server.queue) + result_server_count
+        result_utilization = (
+            self.result_server.count / self.result_server.capacity
+            if self.result_server.capacity > 0
+            else 0
+        )
+
+        return {
+            "test_agents": test_server_count,
+            "test_queue_length": test_queue_length,
+            "backup_length": backup_length,
+            "result_agents": result_server_count,
+            "result_queue_length": result_queue_length,
+            "test_server_utilization": test_utilization,
+            "result_server_utilization": result_utilization,
+        }
+
+    def _record_state_change(self):
+        """
+        Enregistre l'état courant suite à un changement (mode "event").
+        """
+        self.metrics.record_state(self.env.now, **self._current_state())
+
+    def _new_commit(
+        self, user: Utilisateur, date: int, exo: int, chance_to_pass: float | None
+    ) -> Commit:
+        """
+        Crée un commit numéroté pour la trace, avec son rang parmi les commits de l'utilisateur pour cet exo.
+        """
+        last_exo, attempt = self._attempts.get(user.index, (exo, -1))
+        attempt = attempt + 1 if last_exo == exo else 0
+        self._attempts[user.index] = (exo, attempt)
+        return Commit(
+            user,
+            date,
+            exo,
+            chance_to_pass,
+            number=next(self._commit_numbers),
+            random_id=not self.compact,
+            attempt=attempt,
+        )
+
+    def _exo_key(self, user: Utilisateur) -> tuple:
+        """
+        Clé (utilisateur, exo, essai) des tirages du temps de travail sur l'exercice courant.
+        """
+        return (user.index, user.current_exo, 0)
+
+    def _pass_exo(self, user: Utilisateur):
+        """
+        Valide l'exercice courant d'un utilisateur et signale la fin de son dernier exercice.
+
+        :param user: Utilisateur.
+        """
+        user.current_exo += 1
+        self.rate_limiter.reset(user.index)
+        if user.current_exo == self.nb_exos + 1:
+            self.nb_users_done += 1
+            self._check_all_done()
+
+    def _check_all_done(self):
+        """
+        Déclenche all_done si tous les utilisateurs ont fini et que le backup est vide.
+        """
+        if (
+            not self.all_done.triggered
+            and self.nb_users_done >= len(self.users)
+            and len(self.backup_storage.items) == 0
+        ):
+            self.all_done.succeed()
 
     def collect_metrics(self):
         """
         Collect metrics at regular intervals
         """
         while True:
-            if (all(user.current_exo > self.nb_exos for user in self.users) and
-                len(self.backup_storage.items) == 0 and
+            if (self.all_done.triggered and
                 self.test_server.count == 0 and
                 len(self.test_server.queue) == 0 and
                 self.result_server.count == 0 and
                 len(self.result_server.queue) == 0):
                 break
 
-            # Test queue metrics
-            test_server_count = self.test_server.count
-            test_queue_length = len(self.test_server.queue) + test_server_count
-            test_utilization = (
-                self.test_server.count / self.test_server.capacity
-                if self.test_server.capacity > 0
-                else 0
-            )
-            backup_length = len(self.backup_storage.items)
-
-            # Result queue metrics
-            result_server_count = self.result_server.count
-            result_queue_length = len(self.result_server.queue) + result_server_count
-            result_utilization = (
-                self.result_server.count / self.result_server.capacity
-                if self.result_server.capacity > 0
-                else 0
-            )
-
-            self.metrics.record_state(
-                self.env.now,
-                test_agents=test_server_count,
-                test_queue_length=test_queue_length,
-                backup_length=backup_length,
-                result_agents=result_server_count,
-                result_queue_length=result_queue_length,
-                test_server_utilization=test_utilization,
-                result_server_utilization=result_utilization,
-            )
+            self.metrics.record_state(self.env.now, **self._current_state())
 
             yield self.env.timeout(1)
 
-    def add_user(self, user: Utilisateur = None):
+    def add_user(self, user: Utilisateur | TableUser = None):
         """
         Ajoute un nouvel utilisateur dans la moulinette.
 
@@ -139,38 +355,102 @@ class Moulinette:
         """
         if user is None:
             user = Utilisateur()
+        user.index = len(self.users)
         self.users.append(user)
-        self.users_commit_time[user.name] = []
+        self.trace.register_user(user)
 
-    def start_simulation(self, until: int | None, save_filename: str = "metrics.png"):
+    def _control_processes(self) -> list:
         """
-        Lance une simulation complète sur tous les utilisateurs dans la moulinette et affiche des métriques.
+        Processus de contrôle propres à la variante (régulation, vidage du backup...).
+        """
+        return []
+
+    def run_simulation(self, until: int | None = None) -> int:
+        """
+        Exécute la simulation sur tous les utilisateurs de la moulinette.
 
         :param until: Limite de temps de la simulation.
+        :return: Nombre d'événements traités par le moteur.
         """
-        self.env.process(self.collect_metrics())
+        if self.engine == "fast":
+            from fast_engine import FastKernel
+
+            events = FastKernel(self).run(until=until)
+            self.trace.close()
+            return events
+        if self.engine == "vector":
+            from vector_engine import VectorKernel
+
+            events = VectorKernel(self).run(until=until)
+            self.trace.close()
+            return events
+
+        for process in self._control_processes():
+            self.env.process(process)
+
+        if self.metrics.event_driven:
+            self._record_state_change()
+        else:
+            self.env.process(self.collect_metrics())
 
         for user in self.users:
             self.env.process(self.handle_commit(user))
+        self._check_all_done()
+
+        events = 0
+        end = float("inf") if until is None else until
+        while self.env.peek() < end:
+            self.env.step()
+            events += 1
+        if until is not None:
+            self.env.run(until=until)
+        self.trace.close()
+        return events
+
+    def start_simulation(
+        self,
+        until: int | None,
+        save_filename: str = "metrics.png",
+        log: TextIO | None = None,
+        plot: bool = True,
+    ) -> dict:
+        """
+        Lance une simulation complète sur tous les utilisateurs dans la moulinette et affiche des métriques.
 
-        self.env.run(until=until)
+        :param until: Limite de temps de la simulation.
+        :param log: Flux où écrire le résumé des métriques (par défaut, la sortie standard).
+        :param plot: Trace le graphe des métriques (False : rendu différé, voir report.py).
+        :return: Métriques calculées (QueueMetrics.calculate_metrics).
+        """
+        self.run_simulation(until=until)
 
         metrics = self.metrics.calculate_metrics()
-        print("\nSimulation Metrics:")
-        print("\nTest Queue Metrics:")
+        print("\nSimulation Metrics:", file=log)
+        print("\nTest Queue Metrics:", file=log)
         for metric, value in metrics["test_queue"].items():
-            print(f"- {metric}: {value}")
+            print(f"- {metric}: {value}", file=log)
 
-        print("\nResult Queue Metrics:")
+        print("\nResult Queue Metrics:", file=log)
         for metric, value in metrics["result_queue"].items():
-            print(f"- {metric}: {value}")
+            print(f"- {metric}: {value}", file=log)
+
+        print("\nBackup Metrics:", file=log)
+        for metric, value in metrics["backup"].items():
+            print(f"- {metric}: {value}", file=log)
+
+        if metrics["ing_regulation"]["blocked_count"] > 0:
+            print("\nING Regulation Metrics:", file=log)
+            for metric, value in metrics["ing_regulation"].items():
+                print(f"- {metric}: {value}", file=log)
 
-        print("\nSojourn Times:")
+        print("\nSojourn Times:", file=log)
         for queue, times in metrics["sojourn_times"].items():
-            print(f"- {queue}:")
-            print(f"  - Average: {times['avg']}")
-            print(f"  - Variance: {times['var']}")
+            print(f"- {queue}:", file=log)
+            print(f"  - Average: {times['avg']}", file=log)
+            print(f"  - Variance: {times['var']}", file=log)
 
-        print(f"\nThroughput: {metrics['throughput']}")
+        print(f"\nThroughput: {metrics['throughput']}", file=log)
 
-        self.metrics.plot_metrics(save_filename=save_filename)
+        if plot:
+            self.metrics.plot_metrics(save_filename=save_filename, log=log)
+        return metrics
@@ -0,0 +1,182 @@
+import argparse
+import time
+from typing import Dict, Sequence
+
+from event_trace import EventTrace, TraceLevel
+from population import create_user_list, generate_users_names, set_random_seed
+from replications import MetricEstimate, paired_differences, replicate
+from waterfall.infinite import WaterfallMoulinetteInfinite
+from waterfall.finite import WaterfallMoulinetteFinite
+from waterfall.backup import WaterfallMoulinetteFiniteBackup
+from channels_dams.channelsdams import ChannelsAndDams
+
+BENCH_CONFIGS = {
+    WaterfallMoulinetteInfinite: {
+        "K": 3,
+        "process_time": 2,
+        "result_time": 1,
+        "tag_limit": 5,
+        "nb_exos": 10,
+    },
+    WaterfallMoulinetteFinite: {
+        "K": 4,
+        "process_time": 2,
+        "result_time": 1,
+        "tag_limit": 5,
+        "nb_exos": 10,
+        "ks": 20,
+        "kf": 10,
+    },
+    WaterfallMoulinetteFiniteBackup: {
+        "K": 4,
+        "process_time": 2,
+        "result_time": 1,
+        "tag_limit": 5,
+        "nb_exos": 10,
+        "ks": 25,
+        "kf": 12,
+    },
+    ChannelsAndDams: {
+        "K": 3,
+        "process_time": 2,
+        "result_time": 1,
+        "ks": 15,
+        "kf": 8,
+        "tb": 10,
+        "block_option": True,
+    },
+}
+
+
+def bench(module, config: dict, nb_user: int, engine: str, seed: int) -> dict:
+    """
+    Simule une configuration sans trace ni graphe et mesure le débit d'événements du moteur.
+
+    :param engine: "simpy", "fast" ou "vector".
+    """
+    set_random_seed(seed)
+    moulinette = module(
+        **config,
+        metrics_mode="event",
+        trace=EventTrace(level=TraceLevel.OFF),
+        engine=engine,
+    )
+    for user in create_user_list(generate_users_names(nb_user), promo_ratio=0.7):
+        moulinette.add_user(user)
+
+    start = time.perf_counter()
+    events = moulinette.run_simulation()
+    elapsed = time.perf_counter() - start
+
+    metrics = moulinette.metrics.calculate_metrics()
+    return {
+        "events": events,
+        "seconds": elapsed,
+        "events_per_sec": events / elapsed if elapsed > 0 else 0,
+        "test_avg_length": metrics["test_queue"]["avg_length"],
+        "test_utilization": metrics["test_queue"]["avg_utilization"],
+        "total_sojourn": metrics["sojourn_times"]["total"]["avg"],
+        "throughput": metrics["throughput"],
+    }
+
+
+# métriques comparées d'un moteur à l'autre
+COMPARED_METRICS = (
+    "sojourn_times.total.avg",
+    "throughput",
+    "test_queue.avg_length",
+    "test_queue.blocking_rate",
+    "result_queue.blocking_rate",
+    "backup.avg_length",
+)
+
+
+def compare_engines(
+    module,
+    config: dict,
+    nb_user: int,
+    engines: Sequence[str],
+    replications: int,
+    seed: int,
+    workers: int = 1,
+) -> Dict[str, Dict[str, MetricEstimate]]:
+    """
+    Équivalence statistique des moteurs : replications réplications de la configuration par moteur,
+    en nombres aléatoires communs, et différences appariées (moteur - simpy) avec leur intervalle de
+    confiance. Un intervalle qui ne contient pas 0 signale un écart de modélisation entre les moteurs.
+
+    :return: moteur -> métrique -> différence avec simpy.
+    """
+    results = replicate(
+        module,
+        {engine: {**config, "engine": engine} for engine in engines},
+        nb_user,
+        seed=seed,
+        min_replications=replications,
+        max_replications=replications,
+        workers=workers,
+        crn=True,
+    )
+    return paired_differences(results, "simpy")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare les moteurs de simulation (events/sec et métriques)."
+    )
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--replications",
+        type=int,
+        default=0,
+        help="compare aussi les métriques des moteurs sur ce nombre de réplications (IC à 95 %%)",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    columns = [
+        "events",
+        "seconds",
+        "events_per_sec",
+        "test_avg_length",
+        "test_utilization",
+        "total_sojourn",
+        "throughput",
+    ]
+    for module, config in BENCH_CONFIGS.items():
+        print(f"=== {module.__name__} (U{args.users}) ===")
+        # le moteur vectorisé ne gère ni backup ni barrage
+        engines = ["simpy", "fast"]
+        if not module.uses_backup and "tb" not in config:
+            engines.append("vector")
+        results = {
+            engine: bench(module, config, args.users, engine, args.seed)
+            for engine in engines
+        }
+        print(f"{'':>18}" + "".join(f" {engine:>12}" for engine in engines))
+        for column in columns:
+            print(
+                f"{column:>18}"
+                + "".join(f" {results[engine][column]:>12.4g}" for engine in engines)
+            )
+        for engine in engines[1:]:
+            speedup = results["simpy"]["seconds"] / results[engine]["seconds"]
+            print(f"{engine + ' speedup':>18} {speedup:>12.2f}x")
+        if args.replications > 1:
+            differences = compare_engines(
+                module,
+                config,
+                args.users,
+                engines,
+                args.replications,
+                args.seed,
+                workers=args.workers,
+            )
+            print(f"--- {args.replications} replications, difference with simpy (95% CI) ---")
+            for engine, estimates in differences.items():
+                for metric in COMPARED_METRICS:
+                    difference = estimates[metric]
+                    drift = abs(difference.mean) > difference.half_width
+                    print(f"{engine:>8} {metric:>28}: {difference}{'  DRIFT' if drift else ''}")
+        print()
@@ -0,0 +1,261 @@
+import argparse
+import functools
+import glob
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+from queue_metrics import QueueMetrics
+
+DEFAULT_CACHE_DIR = os.path.join("output", ".cache")
+
+# fichiers dont dépend le résultat d'une simulation (main.py n'y est pas : il ne contient que les campagnes,
+# la population, les graines et le choix des tirages sont dans population.py)
+SOURCE_PATTERNS = (
+    "basics.py",
+    "event_trace.py",
+    "fast_engine.py",
+    "population.py",
+    "queue_metrics.py",
+    "rate_limiter.py",
+    "resources.py",
+    "variates.py",
+    "vector_engine.py",
+    os.path.join("waterfall", "*.py"),
+    os.path.join("channels_dams", "*.py"),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def source_hash(root: str | None = None) -> str:
+    """
+    Empreinte du code de simulation : toute modification d'un de ces fichiers invalide le cache.
+
+    :param root: dossier du projet (par défaut, celui de ce module).
+    """
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for pattern in SOURCE_PATTERNS:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, "rb") as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+def cache_identity(
+    module: Callable,
+    config: dict,
+    nb_user: int,
+    promo_ratio: float,
+    seed: int,
+    **options,
+) -> dict:
+    """
+    Description complète d'une simulation, dont l'empreinte est la clé du cache.
+
+    :param options: autres paramètres qui changent le résultat (crn, compact, ...).
+    """
+    return {
+        "model": module.__name__,
+        "config": config,
+        "nb_user": nb_user,
+        "promo_ratio": promo_ratio,
+        "seed": seed,
+        "options": options,
+        "source": source_hash(),
+    }
+
+
+def cache_key(identity: dict) -> str:
+    """
+    Clé d'une simulation : empreinte de sa description (voir cache_identity).
+    """
+    text = json.dumps(identity, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def _to_json(value):
+    # scalaires numpy des métriques
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _write_atomic(path: str, write: Callable):
+    # écriture dans un fichier temporaire puis renommage : un worker concurrent ne lit jamais d'entrée partielle
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as file:
+        write(file)
+    os.replace(temp, path)
+
+
+class ResultCache:
+    """
+    Cache disque des simulations, adressé par le contenu : une entrée est retrouvée par l'empreinte du modèle,
+    de sa configuration, du nombre d'utilisateurs, de la proportion d'ING, de la graine et du code de simulation.
+
+    Chaque entrée est formée de trois fichiers :
+
+    - <clé>.json : description de la simulation et métriques (QueueMetrics.calculate_metrics) ;
+    - <clé>.npz : séries brutes de QueueMetrics, pour retracer les graphes sans resimuler ;
+    - <clé>.txt : résumé des métriques tel qu'écrit dans le log de la simulation.
+
+    :param root: dossier du cache.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.root, f"{key}.{extension}")
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            os.path.exists(self._path(key, extension)) for extension in ("json", "npz")
+        )
+
+    def get(self, key: str) -> dict | None:
+        """
+        Entrée du cache (description, métriques et résumé), ou None si elle est absente.
+        """
+        if key not in self:
+            return None
+        with open(self._path(key, "json")) as file:
+            entry = json.load(file)
+        summary = self._path(key, "txt")
+        if os.path.exists(summary):
+            with open(summary) as file:
+                entry["summary"] = file.read()
+        return entry
+
+    def load_metrics(self, key: str) -> QueueMetrics:
+        """
+        Reconstruit le QueueMetrics d'une entrée à partir de ses séries brutes.
+        """
+        with open(self._path(key, "json")) as file:
+            event_driven = json.load(file)["event_driven"]
+        with np.load(self._path(key, "npz")) as arrays:
+            return QueueMetrics.from_arrays(arrays, event_driven=event_driven)
+
+    def put(
+        self,
+        key: str,
+        identity: dict,
+        metrics: QueueMetrics,
+        results: dict,
+        summary: str | None = None,
+        name: str | None = None,
+    ):
+        """
+        Ajoute (ou remplace) une entrée.
+
+        :param identity: description de la simulation (voir cache_identity).
+        :param metrics: métriques brutes de la simulation.
+        :param results: métriques calculées.
+        :param summary: résumé texte des métriques.
+        :param name: nom de la simulation dans output/ (nom du graphe tracé par report.py).
+        """
+        arrays = metrics.to_arrays()
+
+        _write_atomic(
+            self._path(key, "npz"), lambda file: np.savez_compressed(file, **arrays)
+        )
+        if summary is not None:
+            _write_atomic(self._path(key, "txt"), lambda file: file.write(summary.encode()))
+        entry = {
+            "identity": identity,
+            "name": name,
+            "event_driven": metrics.event_driven,
+            "created": time.time(),
+            "metrics": results,
+        }
+        text = json.dumps(entry, default=_to_json)
+        _write_atomic(self._path(key, "json"), lambda file: file.write(text.encode()))
+
+    def keys(self) -> List[str]:
+        return sorted(
+            os.path.basename(path)[: -len(".json")]
+            for path in glob.glob(os.path.join(self.root, "*.json"))
+        )
+
+    def identities(self) -> Dict[str, dict]:
+        """
+        Description de chaque entrée du cache.
+        """
+        identities = {}
+        for key in self.keys():
+            with open(self._path(key, "json")) as file:
+                identities[key] = json.load(file)["identity"]
+        return identities
+
+    def remove(self, key: str):
+        for extension in ("json", "npz", "txt"):
+            path = self._path(key, extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def evict(
+        self,
+        keep: Iterable[str] | None = None,
+        stale: bool = False,
+        model: str | None = None,
+    ) -> List[str]:
+        """
+        Supprime des entrées et retourne leurs clés. Sans critère, vide le cache.
+
+        :param keep: clés à garder (les autres sont supprimées), par exemple celles de la campagne courante :
+            les entrées des configurations modifiées disparaissent.
+        :param stale: supprime les entrées d'une version précédente du code de simulation.
+        :param model: ne considère que les entrées de ce modèle.
+        """
+        keep = set(keep) if keep is not None else None
+        current = source_hash()
+        evicted = []
+        for key, identity in self.identities().items():
+            if model is not None and identity["model"] != model:
+                continue
+            if keep is None and not stale:
+                remove = True
+            else:
+                remove = (keep is not None and key not in keep) or (
+                    stale and identity["source"] != current
+                )
+            if remove:
+                self.remove(key)
+                evicted.append(key)
+        return evicted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspection et nettoyage du cache des simulations.")
+    parser.add_argument("--dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--model", help="ne considère que les entrées de ce modèle")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument(
+        "--evict-stale",
+        action="store_true",
+        help="supprime les entrées d'une version précédente du code",
+    )
+    action.add_argument("--clear", action="store_true", help="supprime les entrées")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.dir)
+    if args.evict_stale or args.clear:
+        evicted = cache.evict(stale=args.evict_stale, model=args.model)
+        print(f"{len(evicted)} entries evicted")
+    else:
+        current = source_hash()
+        for key, identity in cache.identities().items():
+            if args.model is not None and identity["model"] != args.model:
+                continue
+            flag = "" if identity["source"] == current else " [stale]"
+            print(
+                f"{key} {identity['model']} U{identity['nb_user']} seed {identity['seed']}"
+                f" {json.dumps(identity['config'], sort_keys=True)}{flag}"
+            )
@@ -1,6 +1,8 @@
-import random
+from typing import Callable
 
-from basics import Utilisateur, Commit
+from basics import Utilisateur, MINUTE_UNIT
+from event_trace import EventCode, EventTrace
+from variates import RandomVariates
 from waterfall.backup import WaterfallMoulinetteFiniteBackup
 
 
@@ -22,8 +24,18 @@ class ChannelsAndDams(WaterfallMoulinetteFiniteBackup):
     :param kf: Taille de la FIFO pour l'envoi des résultats.
     :param tb: Temps de blocage de la moulinette pour les ING.
     :param block_option: Permet d'activer ou non la fonction de blocage des ING.
+    :param ing_jitter: Tirage optionnel du délai entre le déblocage et la reprise d'un ING bloqué.
+    :param metrics_mode: "sampled" (relevé à chaque unité de temps), "event" (relevé à chaque changement d'état) ou "stream" (relevé à chaque changement d'état, statistiques en mémoire constante, sans graphe).
+    :param rate_limit: Politique de limitation des tags ("sliding_window", "token_bucket" ou "leaky_bucket").
+    :param trace: Trace des événements (par défaut, affichage texte sur la sortie standard).
+    :param compact: Commits à identifiants entiers (pas de tirage d'identifiant aléatoire).
+    :param variates: Source des tirages aléatoires (par défaut, le module random global).
+    :param engine: Moteur de simulation : "simpy" (processus simpy), "fast" (calendrier d'événements natif, voir fast_engine) ou "vector" (pas de temps vectorisé, variantes infinie et finie, voir vector_engine).
     """
 
+    # modéliser l'occupation plus longue de la moulinette par les prépas
+    prepa_test_coeff = 2
+
     def __init__(
         self,
         K: int = 1,
@@ -33,33 +45,56 @@ class ChannelsAndDams(WaterfallMoulinetteFiniteBackup):
         kf: int = 1,
         tb: int = 5,
         block_option: bool = False,
+        ing_jitter: Callable[[], float] | None = None,
+        metrics_mode: str = "sampled",
+        rate_limit: str = "sliding_window",
+        trace: EventTrace | None = None,
+        compact: bool = False,
+        variates: RandomVariates | None = None,
+        engine: str = "simpy",
     ):
         super().__init__(
-            K=K, process_time=process_time, result_time=result_time, ks=ks, kf=kf
+            K=K,
+            process_time=process_time,
+            result_time=result_time,
+            ks=ks,
+            kf=kf,
+            metrics_mode=metrics_mode,
+            rate_limit=rate_limit,
+            trace=trace,
+            compact=compact,
+            variates=variates,
+            engine=engine,
         )
         self.tb = tb
         self.block_option = block_option
-        self.is_blocked = False
+        # temps de séjour des ING et des PREPA tracés séparément
+        self.metrics.promo_breakdown = True
+        self.ing_jitter = ing_jitter
+        # barrage ING : ouvert tant que l'événement est déclenché
+        self.ing_gate = self.env.event()
+        self.ing_gate.succeed()
+
+    @property
+    def is_blocked(self) -> bool:
+        return not self.ing_gate.triggered
+
+    def _control_processes(self) -> list:
+        return [self.regulate_ing()] + super()._control_processes()
 
     def regulate_ing(self):
         """
         Implémentation du "barrage" de régulation pour la population ING.
         """
-        while True:
-            if (
-                all(user.current_exo > self.nb_exos for user in self.users)
-                and len(self.backup_storage.items) == 0
-            ):
-                break
-
+        while not self.all_done.triggered:
             # On bloque le serveur pour tb temps
-            self.is_blocked = True
-            print(f"Moulinette blocked for ING population at {self.env.now}")
+            self.ing_gate = self.env.event()
+            self.trace.event(EventCode.DAM_CLOSED, self.env.now)
             yield self.env.timeout(self.tb)
 
-            # On débloque le serveur pour tb/2 temps
-            self.is_blocked = False
-            print(f"Moulinette unblocked for ING population at {self.env.now}")
+            # On débloque le serveur pour tb/2 temps : tous les ING bloqués repartent
+            self.ing_gate.succeed()
+            self.trace.event(EventCode.DAM_OPENED, self.env.now)
             yield self.env.timeout(self.tb // 2)
 
     def handle_commit(self, user: Utilisateur):
@@ -68,104 +103,97 @@ class ChannelsAndDams(WaterfallMoulinetteFiniteBackup):
 
         :param user: Utilisateur.
         """
-        minute_unit = 2
+        minute_unit = MINUTE_UNIT
         last_chance_commit = None
-        # modéliser l'occupation plus longue de la moulinette par les prépas
-        coeff = 2 if user.promo == "PREPA" else 1
+        coeff = self.prepa_test_coeff if user.promo == "PREPA" else 1
 
         while user.current_exo <= self.nb_exos:
             # check si ING et blocage actif
             if self.block_option and user.promo == "ING" and self.is_blocked:
-                print(f"{user} : blocked by ING regulation.")
-                yield self.env.timeout(random.randint(1, 3))
+                self.trace.user(EventCode.ING_BLOCKED, self.env.now, user)
+                blocked_since = self.env.now
+                yield self.ing_gate
+                self.metrics.record_ing_blocked(blocked_since, self.env.now)
+                if self.ing_jitter is not None:
+                    yield self.env.timeout(self.ing_jitter())
                 continue
 
             # push autorisé si dans la limite de tag
             current_time = self.env.now
-            if len(self.users_commit_time[user.name]) >= self.tag_limit:
-                if (
-                    self.users_commit_time[user.name][0]
-                    > current_time - 60 * minute_unit
-                ):
-                    yield self.env.timeout(minute_unit)
-                    continue
-                self.users_commit_time[user.name].pop(0)
+            next_tag_time = self.rate_limiter.next_allowed(user.index, current_time)
+            if next_tag_time > current_time:
+                yield self.env.timeout(next_tag_time - current_time)
+                continue
 
             exo = user.current_exo
-            commit = Commit(user, current_time, exo, last_chance_commit)
-            user_id = f"{user.promo}_{user.name}_{current_time}_{exo}"
+            commit = self._new_commit(user, current_time, exo, last_chance_commit)
 
             # si plus de place dans la FIFO de test, refus
-            if len(self.test_queue.items) >= self.ks:
+            if self.test_queue.is_full():
                 self.metrics.record_test_queue_blocked(self.env.now)
-                print(f"{commit} : refused at test queue (FULL).")
-                yield self.env.timeout(random.randint(4, 10) * minute_unit)
+                self.trace.commit(EventCode.TEST_REFUSED, self.env.now, commit)
+                yield self.env.timeout(self.variates.retry_delay(commit.draw_key) * minute_unit)
                 continue
 
             # métriques queue test
-            self.metrics.record_test_queue_entry(user_id, current_time)
+            commit_id = self.metrics.record_test_queue_entry(
+                user.index, user.promo, exo, current_time
+            )
 
             # fifo serveur test
-            print(f"{commit} : enters the test queue.")
-            yield self.test_queue.put(user)
+            self.trace.commit(EventCode.TEST_ENTER, self.env.now, commit)
+            yield self.test_queue.admit()
             with self.test_server.request() as test_request:
                 yield test_request
-                print(f"{commit} : starts testing.")
+                self.trace.commit(EventCode.TEST_START, self.env.now, commit)
                 yield self.env.timeout(self.process_time * coeff)
-                print(f"{commit} : finishes testing.")
-                yield self.test_queue.get(lambda x: x == user)
+                self.trace.commit(EventCode.TEST_FINISH, self.env.now, commit)
+                yield self.test_queue.release()
 
-            self.metrics.record_test_queue_exit(user_id, self.env.now)
+            self.metrics.record_test_queue_exit(commit_id, self.env.now)
 
             # si plus de place dans la FIFO d'envoi, refus
-            if len(self.result_queue.items) >= self.kf:
+            if self.result_queue.is_full():
                 self.metrics.record_result_queue_blocked(self.env.now)
-                print(
-                    f"{commit} : refused at result queue (FULL). The result is backed up."
-                )
+                self.trace.commit(EventCode.RESULT_BACKED_UP, self.env.now, commit)
                 # on ajoute le commit dans le backup
-                self.backup_storage.put((commit, user_id))
+                self._push_backup(commit, commit_id)
 
-                yield self.env.timeout(random.randint(4, 10) * minute_unit)
+                yield self.env.timeout(self.variates.retry_delay(commit.draw_key) * minute_unit)
                 continue
 
             # métriques queue résultat
-            self.metrics.record_result_queue_entry(user_id, self.env.now)
+            self.metrics.record_result_queue_entry(commit_id, self.env.now)
 
             # fifo serveur d'envoi
-            print(f"{commit} : enters the result queue.")
-            yield self.result_queue.put(user)
+            self.trace.commit(EventCode.RESULT_ENTER, self.env.now, commit)
+            yield self.result_queue.admit()
             with self.result_server.request() as result_request:
                 yield result_request
-                print(f"{commit} : starts result processing.")
+                self.trace.commit(EventCode.RESULT_START, self.env.now, commit)
                 yield self.env.timeout(self.result_time)
-                print(f"{commit} : finishes result processing.")
-                yield self.result_queue.get(lambda x: x == user)
+                self.trace.commit(EventCode.RESULT_FINISH, self.env.now, commit)
+                yield self.result_queue.release()
 
-            self.metrics.record_result_queue_exit(user_id, self.env.now)
+            self.metrics.record_result_queue_exit(commit_id, self.env.now)
 
             # si le commit est bon
-            if random.random() <= commit.chance_to_pass:
-                print(f"{commit} : commit passed for exo {exo} !")
-                user.current_exo += 1
-                self.users_commit_time[user.name] = []
+            if self.variates.pass_draw(commit.draw_key) <= commit.chance_to_pass:
+                self.trace.commit(EventCode.PASSED, self.env.now, commit)
+                self._pass_exo(user)
                 last_chance_commit = None
 
                 if user.current_exo > self.nb_exos:
                     break
 
-                wating_before_next = round(max(random.gauss(mu=45, sigma=15), 1))
+                wating_before_next = self.variates.exo_think(self._exo_key(user))
                 yield self.env.timeout(wating_before_next * minute_unit)
             else:
-                print(
-                    f"{commit} : commit failed for exo {exo}... Increasing chance to pass for next commit."
-                )
-                more_chance_to_pass = max(
-                    min(random.gauss(mu=0.1, sigma=0.015), 0.2), 0.05
-                )
+                self.trace.commit(EventCode.FAILED, self.env.now, commit)
+                more_chance_to_pass = self.variates.improvement(commit.draw_key)
                 last_chance_commit = min(commit.chance_to_pass + more_chance_to_pass, 1)
 
-                self.users_commit_time[user.name].append(current_time)
-                wating_before_next = round(max(random.gauss(mu=15, sigma=5), 1))
+                self.rate_limiter.record(user.index, current_time)
+                wating_before_next = self.variates.retry_think(commit.draw_key)
 
                 yield self.env.timeout(wating_before_next * minute_unit)
@@ -0,0 +1,289 @@
+import argparse
+import itertools
+import json
+from typing import Dict, Tuple
+
+import numpy as np
+
+from mva import mean_think_time
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+except ImportError:  # itérations de puissance numpy sur la chaîne uniformisée
+    scipy = None
+
+# taille par défaut du backup dans la chaîne tronquée de WaterfallMoulinetteFiniteBackup
+DEFAULT_MAX_BACKUP = 200
+
+
+def tandem_states(ks: int, kf: int, max_backup: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    États (n1, n2, b) de la chaîne : n1 commits dans l'étage de test (file et serveurs, au plus ks),
+    n2 dans l'étage d'envoi (au plus kf), b dans le backup. Le backup n'est vidé que dans la file
+    d'envoi : il n'est non vide que si celle-ci est pleine.
+
+    :param max_backup: taille maximale du backup (0 : pas de backup).
+    :return: états (n1, n2, b) et numéro de chaque triplet (-1 pour un triplet impossible).
+    """
+    n1, n2, b = np.meshgrid(
+        np.arange(ks + 1), np.arange(kf + 1), np.arange(max_backup + 1), indexing="ij"
+    )
+    valid = (b == 0) | (n2 == kf)
+    states = np.stack([n1[valid], n2[valid], b[valid]], axis=1)
+    index = np.full(n1.shape, -1)
+    index[valid] = np.arange(len(states))
+    return states, index
+
+
+def tandem_transitions(
+    arrival_rate: float,
+    K: int,
+    test_rate: float,
+    result_rate: float,
+    ks: int,
+    kf: int,
+    max_backup: int = 0,
+) -> Dict[str, np.ndarray]:
+    """
+    Transitions de la chaîne de Markov de l'enchaînement M/M/K/ks -> M/M/1/kf, au format COO
+    (source, target, rate). Un commit qui trouve l'étage de test plein est refusé ; un résultat qui
+    trouve l'étage d'envoi plein est perdu, ou placé dans le backup si max_backup > 0.
+
+    :param arrival_rate: débit des tentatives de commit (poissonnien).
+    :param test_rate: taux de service d'un serveur de test (1 / process_time).
+    :param result_rate: taux de service du serveur d'envoi (1 / result_time).
+    :return: états, transitions et, pour chaque transition, son type (voir tandem_metrics).
+    """
+    states, index = tandem_states(ks, kf, max_backup)
+    n1, n2, b = states.T
+    source = []
+    target = []
+    rate = []
+    kind = []
+
+    def add(name: str, selected: np.ndarray, to: Tuple[np.ndarray, np.ndarray, np.ndarray], rates):
+        source.append(np.flatnonzero(selected))
+        target.append(index[to[0][selected], to[1][selected], to[2][selected]])
+        rate.append(np.broadcast_to(rates, selected.shape)[selected])
+        kind.append(np.full(np.count_nonzero(selected), name))
+
+    # arrivée d'un commit dans l'étage de test
+    add("arrival", n1 < ks, (n1 + 1, n2, b), arrival_rate)
+    # fin d'un test : le résultat entre dans l'étage d'envoi, dans le backup ou est perdu
+    tests = np.minimum(n1, K) * test_rate
+    add("test", (n1 > 0) & (n2 < kf), (n1 - 1, n2 + 1, b), tests)
+    if max_backup > 0:
+        add("backed_up", (n1 > 0) & (n2 == kf) & (b < max_backup), (n1 - 1, n2, b + 1), tests)
+    add("lost", (n1 > 0) & (n2 == kf) & (b == max_backup), (n1 - 1, n2, b), tests)
+    # fin d'un envoi : un commit du backup prend la place libérée
+    add("result", (n2 > 0) & (b == 0), (n1, n2 - 1, b), result_rate)
+    add("backup", b > 0, (n1, n2, b - 1), result_rate)
+
+    return {
+        "states": states,
+        "source": np.concatenate(source),
+        "target": np.concatenate(target),
+        "rate": np.concatenate(rate).astype(np.float64),
+        "kind": np.concatenate(kind),
+    }
+
+
+def stationary_distribution(
+    source: np.ndarray,
+    target: np.ndarray,
+    rate: np.ndarray,
+    size: int,
+    tolerance: float = 1e-12,
+    max_iterations: int = 1_000_000,
+) -> np.ndarray:
+    """
+    Distribution stationnaire pi (pi·Q = 0, somme 1) d'une chaîne irréductible donnée par ses
+    transitions. Avec scipy : GMRES préconditionné par une factorisation LU incomplète sur le système
+    creux, la probabilité de l'état 0 étant fixée avant normalisation. Sans scipy : itérations de
+    puissance sur la chaîne uniformisée, par produits creux numpy.
+
+    :raise RuntimeError: si la méthode itérative ne converge pas.
+    """
+    # les boucles (source = target) ne changent pas la distribution
+    moving = source != target
+    source, target, rate = source[moving], target[moving], rate[moving]
+    outflow = np.bincount(source, weights=rate, minlength=size)
+
+    if scipy is not None:
+        # pi_0 fixé à 1 : le système Q^T privé de l'état 0 reste creux (normalisation à la fin)
+        transposed = scipy.sparse.csc_matrix(
+            (
+                np.concatenate([rate, -outflow]),
+                (np.concatenate([target, np.arange(size)]), np.concatenate([source, np.arange(size)])),
+            ),
+            shape=(size, size),
+        )
+        system = transposed[1:, 1:].tocsc()
+        rhs = -transposed[1:, 0].toarray().ravel()
+        ilu = scipy.sparse.linalg.spilu(system, drop_tol=1e-6, fill_factor=20)
+        preconditioner = scipy.sparse.linalg.LinearOperator(system.shape, ilu.solve)
+        rest, info = scipy.sparse.linalg.gmres(
+            system, rhs, M=preconditioner, rtol=tolerance, atol=0, maxiter=max_iterations
+        )
+        if info != 0:
+            raise RuntimeError(f"GMRES did not converge (info {info})")
+        pi = np.concatenate([[1.0], rest])
+    else:
+        # P = I + Q / L, L au-dessus du plus grand taux de sortie (chaîne apériodique)
+        uniformization = outflow.max() * 1.05
+        stay = 1 - outflow / uniformization
+        moves = rate / uniformization
+        pi = np.full(size, 1 / size)
+        for _ in range(max_iterations):
+            updated = pi * stay + np.bincount(target, weights=pi[source] * moves, minlength=size)
+            converged = np.max(np.abs(updated - pi)) < tolerance
+            pi = updated
+            if converged:
+                break
+        else:
+            raise RuntimeError("power iterations did not converge")
+
+    pi = np.maximum(pi, 0)
+    return pi / pi.sum()
+
+
+def tandem_metrics(
+    arrival_rate: float,
+    K: int,
+    process_time: float,
+    result_time: float,
+    ks: int,
+    kf: int,
+    backup: bool = False,
+    max_backup: int = DEFAULT_MAX_BACKUP,
+) -> dict:
+    """
+    Probabilités de blocage et longueurs moyennes exactes de WaterfallMoulinetteFinite (ou
+    WaterfallMoulinetteFiniteBackup) vue comme l'enchaînement M/M/K/ks -> M/M/1/kf alimenté par un flux
+    poissonnien de tentatives de commit, par résolution de la chaîne de Markov stationnaire.
+
+    Les services de la simulation sont constants et ses arrivées dépendent de la population : les
+    résultats sont ceux du modèle exponentiel équivalent.
+
+    :param arrival_rate: débit des tentatives de commit, nouvelles tentatives après refus comprises
+        (par unité de temps).
+    :param backup: les résultats refusés sont placés dans le backup (WaterfallMoulinetteFiniteBackup).
+    :param max_backup: taille du backup dans la chaîne tronquée (voir backup.truncation).
+    :return: métriques aux noms de QueueMetrics.calculate_metrics ; blocking_probability est la
+        probabilité qu'une tentative (un résultat) soit refusée, blocking_rate le rapport refus / commits
+        acceptés calculé par la simulation. Le séjour dans la file d'envoi commence à l'entrée dans la
+        file ; l'attente dans le backup est donnée par backup.avg_wait et comptée dans le séjour total.
+    """
+    chain = tandem_transitions(
+        arrival_rate,
+        K,
+        1 / process_time,
+        1 / result_time,
+        ks,
+        kf,
+        max_backup=max_backup if backup else 0,
+    )
+    states = chain["states"]
+    pi = stationary_distribution(chain["source"], chain["target"], chain["rate"], len(states))
+    n1, n2, b = states.T
+
+    def flow(*kinds) -> float:
+        selected = np.isin(chain["kind"], kinds)
+        return float(pi[chain["source"][selected]] @ chain["rate"][selected])
+
+    def moments(values: np.ndarray) -> Tuple[float, float]:
+        mean = float(pi @ values)
+        return mean, float(pi @ (values - mean) ** 2)
+
+    test_blocking = float(pi[n1 == ks].sum())
+    accepted = arrival_rate * (1 - test_blocking)
+    # résultats refusés par l'étage d'envoi (placés dans le backup ou perdus)
+    refused = flow("backed_up", "lost")
+    sent = flow("result", "backup")
+
+    test_length, test_var = moments(n1)
+    result_length, result_var = moments(n2)
+    backup_length, backup_var = moments(b)
+    test_sojourn = test_length / accepted if accepted > 0 else 0.0
+    # comme la simulation, le séjour dans la file d'envoi commence à l'entrée dans la file (après le
+    # backup) ; l'attente dans le backup compte dans le séjour total
+    result_sojourn = result_length / sent if sent > 0 else 0.0
+    backup_wait = backup_length / sent if sent > 0 else 0.0
+    backed_up = flow("backed_up")
+
+    metrics = {
+        "test_queue": {
+            "avg_length": test_length,
+            "var_length": test_var,
+            "avg_utilization": float(pi @ np.minimum(n1, K)) / K,
+            "blocking_probability": test_blocking,
+            "blocking_rate": test_blocking / (1 - test_blocking) if test_blocking < 1 else np.inf,
+        },
+        "result_queue": {
+            "avg_length": result_length,
+            "var_length": result_var,
+            "avg_utilization": float(pi[n2 > 0].sum()),
+            "blocking_probability": refused / (refused + flow("test")) if accepted > 0 else 0.0,
+            "blocking_rate": refused / accepted if accepted > 0 else 0.0,
+        },
+        "sojourn_times": {
+            "test_queue": {"avg": test_sojourn},
+            "result_queue": {"avg": result_sojourn},
+            "total": {"avg": test_sojourn + backup_wait + result_sojourn},
+        },
+        "throughput": sent,
+    }
+    if backup:
+        metrics["backup"] = {
+            "avg_length": backup_length,
+            "var_length": backup_var,
+            # probabilité que le backup soit plein : la troncature est négligeable si elle est proche de 0
+            "truncation": float(pi[b == max_backup].sum()),
+            # attente moyenne dans le backup d'un résultat qui y est placé
+            "avg_wait": backup_length / backed_up if backed_up > 0 else 0.0,
+        }
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Dimensionnement de ks et kf par la chaîne de Markov de l'enchaînement M/M/K/ks -> M/M/1/kf."
+    )
+    parser.add_argument("--K", type=int, default=2)
+    parser.add_argument("--process-time", type=float, default=2)
+    parser.add_argument("--result-time", type=float, default=1)
+    parser.add_argument("--ks", type=int, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--kf", type=int, nargs="+", default=[1, 2, 5, 10])
+    rate = parser.add_mutually_exclusive_group()
+    rate.add_argument("--arrival-rate", type=float, help="tentatives de commit par unité de temps")
+    rate.add_argument(
+        "--users",
+        type=int,
+        default=65,
+        help="population (débit des tentatives : population / temps de réflexion moyen)",
+    )
+    parser.add_argument("--backup", action="store_true", help="WaterfallMoulinetteFiniteBackup")
+    parser.add_argument("--max-backup", type=int, default=DEFAULT_MAX_BACKUP)
+    args = parser.parse_args()
+
+    arrival_rate = args.arrival_rate or args.users / mean_think_time()
+    for ks, kf in itertools.product(args.ks, args.kf):
+        metrics = tandem_metrics(
+            arrival_rate,
+            K=args.K,
+            process_time=args.process_time,
+            result_time=args.result_time,
+            ks=ks,
+            kf=kf,
+            backup=args.backup,
+            max_backup=args.max_backup,
+        )
+        print(
+            f"{json.dumps({'ks': ks, 'kf': kf})}:"
+            f" test blocking {metrics['test_queue']['blocking_probability']:.4g},"
+            f" result blocking {metrics['result_queue']['blocking_probability']:.4g},"
+            f" test length {metrics['test_queue']['avg_length']:.3f},"
+            f" result length {metrics['result_queue']['avg_length']:.3f},"
+            f" throughput {metrics['throughput']:.4g}"
+        )
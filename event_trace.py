@@ -0,0 +1,314 @@
+import json
+import string
+import struct
+import sys
+from array import array
+from enum import IntEnum
+from typing import Dict, Iterator, List, TextIO
+
+import numpy as np
+
+
+class TraceLevel(IntEnum):
+    """
+    Niveau de détail de la trace.
+    """
+
+    OFF = 0  # aucune trace (campagnes de simulations)
+    OUTCOME = 1  # refus, résultats des commits et régulation
+    FULL = 2  # toutes les transitions de file
+
+
+class EventCode(IntEnum):
+    """
+    Type d'un événement de la trace.
+    """
+
+    TEST_ENTER = 0
+    TEST_START = 1
+    TEST_FINISH = 2
+    TEST_REFUSED = 3
+    RESULT_ENTER = 4
+    RESULT_START = 5
+    RESULT_FINISH = 6
+    RESULT_REFUSED = 7
+    RESULT_BACKED_UP = 8
+    BACKUP_ENTER = 9
+    BACKUP_START = 10
+    BACKUP_FINISH = 11
+    BACKUP_PASSED = 12
+    PASSED = 13
+    FAILED = 14
+    ING_BLOCKED = 15
+    DAM_CLOSED = 16
+    DAM_OPENED = 17
+
+
+# code -> (niveau minimal, message au format texte historique)
+EVENTS = {
+    EventCode.TEST_ENTER: (TraceLevel.FULL, "{commit} : enters the test queue."),
+    EventCode.TEST_START: (TraceLevel.FULL, "{commit} : starts testing."),
+    EventCode.TEST_FINISH: (TraceLevel.FULL, "{commit} : finishes testing."),
+    EventCode.TEST_REFUSED: (
+        TraceLevel.OUTCOME,
+        "{commit} : refused at test queue (FULL).",
+    ),
+    EventCode.RESULT_ENTER: (TraceLevel.FULL, "{commit} : enters the result queue."),
+    EventCode.RESULT_START: (TraceLevel.FULL, "{commit} : starts result processing."),
+    EventCode.RESULT_FINISH: (
+        TraceLevel.FULL,
+        "{commit} : finishes result processing.",
+    ),
+    EventCode.RESULT_REFUSED: (
+        TraceLevel.OUTCOME,
+        "{commit} : refused at result queue (FULL).",
+    ),
+    EventCode.RESULT_BACKED_UP: (
+        TraceLevel.OUTCOME,
+        "{commit} : refused at result queue (FULL). The result is backed up.",
+    ),
+    EventCode.BACKUP_ENTER: (
+        TraceLevel.FULL,
+        "{commit} : enters the result queue. [BACKUP]",
+    ),
+    EventCode.BACKUP_START: (
+        TraceLevel.FULL,
+        "{commit} : starts result processing. [BACKUP]",
+    ),
+    EventCode.BACKUP_FINISH: (
+        TraceLevel.FULL,
+        "{commit} : finishes result processing. [BACKUP]",
+    ),
+    EventCode.BACKUP_PASSED: (
+        TraceLevel.OUTCOME,
+        "{commit} : commit passed for exo {exo} ! [BACKUP]",
+    ),
+    EventCode.PASSED: (TraceLevel.OUTCOME, "{commit} : commit passed for exo {exo} !"),
+    EventCode.FAILED: (
+        TraceLevel.OUTCOME,
+        "{commit} : commit failed for exo {exo}... Increasing chance to pass for next commit.",
+    ),
+    EventCode.ING_BLOCKED: (TraceLevel.OUTCOME, "{user} : blocked by ING regulation."),
+    EventCode.DAM_CLOSED: (
+        TraceLevel.OUTCOME,
+        "Moulinette blocked for ING population at {time}",
+    ),
+    EventCode.DAM_OPENED: (
+        TraceLevel.OUTCOME,
+        "Moulinette unblocked for ING population at {time}",
+    ),
+}
+
+_MAGIC = b"MTRACE1\n"
+_CHUNK_HEADER = struct.Struct("<cI")
+# colonnes d'un bloc d'événements : (nom, typecode array, dtype numpy)
+_COLUMNS = [
+    ("time", "d", "<f8"),
+    ("commit", "q", "<i8"),
+    ("user", "i", "<i4"),
+    ("exo", "h", "<i2"),
+    ("code", "B", "u1"),
+]
+_ID_ALPHABET = string.digits + string.ascii_lowercase
+
+
+class EventTrace:
+    """
+    Trace des événements de la moulinette.
+
+    Sans fichier, chaque événement est affiché immédiatement au format texte historique.
+    Avec un fichier, les événements sont stockés en colonnes typées (temps, commit, utilisateur,
+    exo, code) par blocs dans un fichier binaire, le rendu texte n'étant fait qu'à la demande
+    (voir render_trace).
+
+    :param path: Fichier binaire de la trace (None pour un affichage sur la sortie standard).
+    :param level: Niveau de détail de la trace.
+    :param chunk_size: Nombre d'événements gardés en mémoire avant écriture d'un bloc.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        level: TraceLevel = TraceLevel.FULL,
+        chunk_size: int = 65536,
+    ):
+        self.path = path
+        self.level = level
+        self.chunk_size = chunk_size
+        self.users: List[tuple] = []  # index -> (name, promo)
+        self._columns = [array(typecode) for _, typecode, _ in _COLUMNS]
+        self._file = None
+        if path is not None and level > TraceLevel.OFF:
+            self._file = open(path, "wb", buffering=1 << 20)
+            self._file.write(_MAGIC)
+
+    def register_user(self, user) -> int:
+        """
+        Enregistre un utilisateur dans la table de la trace et retourne son index.
+        """
+        self.users.append((user.name, user.promo))
+        return len(self.users) - 1
+
+    def log(self, code: EventCode, time: float, commit: int, user: int, exo: int):
+        """
+        Ajoute un enregistrement typé dans la trace binaire.
+        """
+        for column, value in zip(self._columns, (time, commit, user, exo, code)):
+            column.append(value)
+        if len(self._columns[0]) >= self.chunk_size:
+            self._flush()
+
+    def commit(self, code: EventCode, time: float, commit):
+        """
+        Trace un événement concernant un commit.
+        """
+        level, message = EVENTS[code]
+        if self.level < level:
+            return
+        if self._file is None:
+            print(message.format(commit=commit, exo=commit.exo))
+        else:
+            self.log(code, time, commit.number, commit.user.index, commit.exo)
+
+    def user(self, code: EventCode, time: float, user):
+        """
+        Trace un événement concernant un utilisateur.
+        """
+        level, message = EVENTS[code]
+        if self.level < level:
+            return
+        if self._file is None:
+            print(message.format(user=user))
+        else:
+            self.log(code, time, -1, user.index, user.current_exo)
+
+    def event(self, code: EventCode, time: float):
+        """
+        Trace un événement global de la moulinette.
+        """
+        level, message = EVENTS[code]
+        if self.level < level:
+            return
+        if self._file is None:
+            print(message.format(time=time))
+        else:
+            self.log(code, time, -1, -1, 0)
+
+    def _flush(self):
+        count = len(self._columns[0])
+        if self._file is None or count == 0:
+            return
+        self._file.write(_CHUNK_HEADER.pack(b"E", count))
+        for column in self._columns:
+            self._file.write(column.tobytes())
+        self._columns = [array(typecode) for _, typecode, _ in _COLUMNS]
+
+    def close(self):
+        """
+        Écrit les derniers événements et la table des utilisateurs, puis ferme le fichier.
+        """
+        if self._file is None:
+            return
+        self._flush()
+        users = json.dumps(self.users).encode()
+        self._file.write(_CHUNK_HEADER.pack(b"U", len(users)))
+        self._file.write(users)
+        self._file.close()
+        self._file = None
+
+
+def read_trace(path: str) -> Dict[str, np.ndarray | list]:
+    """
+    Charge une trace binaire en colonnes numpy (time, commit, user, exo, code) et sa table d'utilisateurs.
+
+    :param path: Fichier binaire de la trace.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(_MAGIC):
+        raise ValueError(f"{path} is not an event trace")
+
+    chunks = {name: [] for name, _, _ in _COLUMNS}
+    users = []
+    offset = len(_MAGIC)
+    while offset < len(data):
+        kind, count = _CHUNK_HEADER.unpack_from(data, offset)
+        offset += _CHUNK_HEADER.size
+        if kind == b"U":
+            users = [tuple(user) for user in json.loads(data[offset : offset + count])]
+            offset += count
+            continue
+        for name, _, dtype in _COLUMNS:
+            column = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            chunks[name].append(column)
+            offset += column.nbytes
+
+    trace = {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        for (name, _, dtype), parts in zip(_COLUMNS, chunks.values())
+    }
+    trace["users"] = users
+    return trace
+
+
+def format_commit_id(number: int) -> str:
+    """
+    Identifiant à 6 caractères d'un commit, tel qu'affiché dans les logs.
+    """
+    digits = []
+    for _ in range(6):
+        number, digit = divmod(number, len(_ID_ALPHABET))
+        digits.append(_ID_ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+def _format_time(time: float) -> str:
+    return str(int(time)) if float(time).is_integer() else str(time)
+
+
+def render_trace(path: str) -> Iterator[str]:
+    """
+    Rend une trace binaire, ligne par ligne, au format texte historique.
+
+    :param path: Fichier binaire de la trace.
+    """
+    trace = read_trace(path)
+    users = trace["users"]
+    commit_dates = {}  # date d'un commit = instant de son premier événement
+
+    for time, commit, user, exo, code in zip(
+        trace["time"].tolist(),
+        trace["commit"].tolist(),
+        trace["user"].tolist(),
+        trace["exo"].tolist(),
+        trace["code"].tolist(),
+    ):
+        message = EVENTS[EventCode(code)][1]
+        if commit >= 0:
+            date = commit_dates.setdefault(commit, time)
+            name, promo = users[user]
+            commit_str = (
+                f"[{format_commit_id(commit)} - exo {exo} - time {_format_time(date)}]"
+                f" by [{name} - {promo}]"
+            )
+            yield message.format(commit=commit_str, exo=exo)
+        elif user >= 0:
+            name, promo = users[user]
+            yield message.format(user=f"[{name} - {promo}]")
+        else:
+            yield message.format(time=_format_time(time))
+
+
+def write_rendered_trace(path: str, out: TextIO = sys.stdout):
+    """
+    Écrit le rendu texte d'une trace binaire.
+
+    :param path: Fichier binaire de la trace.
+    :param out: Flux de sortie du texte.
+    """
+    for line in render_trace(path):
+        out.write(line + "\n")
+
+
+if __name__ == "__main__":
+    write_rendered_trace(sys.argv[1])
@@ -0,0 +1,210 @@
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from queue_metrics import QueueMetrics
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # export .npy seul
+    pyarrow = None
+
+MANIFEST = "manifest.json"
+
+
+def _to_json(value):
+    # scalaires numpy des métriques
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _parquet_tables(arrays: Dict[str, np.ndarray]) -> Dict[str, Dict[str, np.ndarray]]:
+    # séries d'état (une valeur par instant) et table des commits : colonnes de même longueur
+    return {
+        "series": {name: arrays[name] for name in QueueMetrics.state_series_names()},
+        "commits": {
+            name[len("commits.") :]: column
+            for name, column in arrays.items()
+            if name.startswith("commits.")
+        },
+    }
+
+
+def export_run(
+    path: str,
+    identity: dict,
+    metrics: QueueMetrics,
+    results: dict | None = None,
+    name: str | None = None,
+    parquet: bool = True,
+) -> str:
+    """
+    Écrit les enregistrements bruts d'une simulation en colonnes : un fichier .npy par série et par colonne
+    de la table des commits, les tables "series" et "commits" en Parquet (si pyarrow est installé) et un
+    manifeste JSON (modèle, configuration, graine, métriques, colonnes, compteurs).
+    Le manifeste est écrit en dernier : un dossier sans manifeste est un export incomplet.
+
+    :param path: dossier de l'export.
+    :param identity: description de la simulation (voir cache.cache_identity).
+    :param results: métriques calculées (QueueMetrics.calculate_metrics).
+    :param name: nom de la simulation (par exemple U65_base).
+    :param parquet: écrit aussi les tables Parquet si pyarrow est disponible.
+    :return: dossier de l'export.
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest_path = os.path.join(path, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    arrays = metrics.to_arrays()
+    columns = {}
+    scalars = {}
+    for column_name, values in arrays.items():
+        if values.ndim == 0:
+            # compteurs et options : dans le manifeste
+            scalars[column_name] = values.item()
+            continue
+        filename = f"{column_name}.npy"
+        # .npy non compressé : relu en mmap sans copie
+        np.save(os.path.join(path, filename), values)
+        columns[column_name] = {
+            "file": filename,
+            "dtype": values.dtype.str,
+            "shape": list(values.shape),
+        }
+
+    tables = {}
+    if parquet and pyarrow is not None:
+        for table, table_columns in _parquet_tables(arrays).items():
+            filename = f"{table}.parquet"
+            pyarrow.parquet.write_table(
+                pyarrow.table(table_columns), os.path.join(path, filename)
+            )
+            tables[table] = filename
+
+    manifest = {
+        **identity,
+        "name": name,
+        "event_driven": metrics.event_driven,
+        "created": time.time(),
+        "metrics": results,
+        "columns": columns,
+        "scalars": scalars,
+        "parquet": tables,
+    }
+    temp = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp, "w") as file:
+        json.dump(manifest, file, default=_to_json)
+    os.replace(temp, manifest_path)
+    return path
+
+
+class RunExport:
+    """
+    Export d'une simulation (voir export_run). Les colonnes sont lues à la demande, en mmap par défaut :
+    une analyse sur des centaines de simulations ne charge que les colonnes et les pages qu'elle lit.
+
+    :param path: dossier de l'export.
+    :param mmap: colonnes en lecture seule projetées en mémoire (False : chargées en entier).
+    """
+
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = path
+        self.mmap_mode = "r" if mmap else None
+        with open(os.path.join(path, MANIFEST)) as file:
+            self.manifest = json.load(file)
+
+    @property
+    def model(self) -> str:
+        return self.manifest["model"]
+
+    @property
+    def config(self) -> dict:
+        return self.manifest["config"]
+
+    @property
+    def nb_user(self) -> int:
+        return self.manifest["nb_user"]
+
+    @property
+    def seed(self) -> int:
+        return self.manifest["seed"]
+
+    @property
+    def metrics(self) -> dict | None:
+        """Métriques calculées de la simulation."""
+        return self.manifest["metrics"]
+
+    @property
+    def names(self) -> List[str]:
+        """Colonnes de l'export ("timestamps", "commits.test_enter", ...)."""
+        return list(self.manifest["columns"])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.manifest["columns"] or name in self.manifest["scalars"]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.column(name)
+
+    def column(self, name: str) -> np.ndarray:
+        if name in self.manifest["scalars"]:
+            return np.asarray(self.manifest["scalars"][name])
+        filename = self.manifest["columns"][name]["file"]
+        return np.load(os.path.join(self.path, filename), mmap_mode=self.mmap_mode)
+
+    def columns(self, names: Iterable[str]) -> Dict[str, np.ndarray]:
+        return {name: self.column(name) for name in names}
+
+    def load_metrics(self) -> QueueMetrics:
+        """
+        Reconstruit le QueueMetrics de la simulation (toutes les colonnes sont lues).
+        """
+        return QueueMetrics.from_arrays(self, event_driven=self.manifest["event_driven"])
+
+    def __repr__(self) -> str:
+        return f"RunExport({self.path!r})"
+
+
+def find_runs(
+    root: str = "output",
+    model: str | None = None,
+    nb_user: int | None = None,
+    mmap: bool = True,
+    **config,
+) -> List[RunExport]:
+    """
+    Exports complets sous root (output/<Model>/runs/<simulation>), filtrés par modèle,
+    population et valeurs de paramètres (par exemple K=3).
+    """
+    runs = []
+    pattern = os.path.join(root, model or "*", "runs", "*", MANIFEST)
+    for manifest in sorted(glob.glob(pattern)):
+        run = RunExport(os.path.dirname(manifest), mmap=mmap)
+        if nb_user is not None and run.nb_user != nb_user:
+            continue
+        if any(run.config.get(key) != value for key, value in config.items()):
+            continue
+        runs.append(run)
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Liste les exports en colonnes des simulations.")
+    parser.add_argument("--root", default="output")
+    parser.add_argument("--model")
+    parser.add_argument("--users", type=int)
+    args = parser.parse_args()
+
+    for run in find_runs(args.root, model=args.model, nb_user=args.users):
+        commits = len(run.column("commits.user")) if "commits.user" in run else 0
+        print(
+            f"{run.path} {run.model} U{run.nb_user} seed {run.seed}"
+            f" {json.dumps(run.config, sort_keys=True)}: {commits} commits"
+        )
@@ -0,0 +1,301 @@
+import heapq
+import itertools
+from collections import deque
+
+from basics import MINUTE_UNIT, Moulinette
+from event_trace import EventCode
+
+# types d'événements du calendrier
+ATTEMPT = 0  # un utilisateur tente un commit (tête de boucle de handle_commit)
+TEST_DONE = 1  # fin de test d'un commit
+RESULT_DONE = 2  # fin d'envoi du résultat d'un commit
+DAM_CLOSE = 3  # fermeture du barrage ING
+DAM_OPEN = 4  # ouverture du barrage ING
+BACKUP_DRAIN = 5  # vidage du backup dans la file des résultats
+TEST_RELEASED = 6  # orientation d'un commit testé vers la file des résultats
+
+
+class FastKernel:
+    """
+    Moteur de simulation natif : un calendrier d'événements (heapq) typés et un état entier,
+    sans objets Event, callbacks ni générateurs simpy. Reproduit les quatre variantes de moulinette
+    (files infinies/finies, backup, barrage ING) à partir des attributs du modèle et donne des métriques
+    statistiquement équivalentes à celles du moteur simpy. Les états des files sont toujours relevés
+    à chaque changement (mode "event").
+
+    :param model: Moulinette à simuler (utilisateurs déjà ajoutés).
+    """
+
+    def __init__(self, model: Moulinette):
+        self.model = model
+        self.users = model.users
+        self.metrics = model.metrics
+        self.metrics.event_driven = True
+        self.trace = model.trace
+        self.variates = model.variates
+        self.rate_limiter = model.rate_limiter
+        self._exo_key = model._exo_key
+
+        self.nb_exos = model.nb_exos
+        self.K = model.test_server.capacity
+        self.process_time = model.process_time
+        self.result_time = model.result_time
+        self.ks = getattr(model, "ks", None)
+        self.kf = getattr(model, "kf", None)
+        self.uses_backup = model.uses_backup
+        self.prepa_test_coeff = model.prepa_test_coeff
+        self.tb = getattr(model, "tb", None)
+        self.block_option = getattr(model, "block_option", False)
+        self.ing_jitter = getattr(model, "ing_jitter", None)
+
+        self.now = 0
+        self._calendar = []
+        self._seq = itertools.count()
+
+        # état des files : commits en service, commits en attente, backup
+        self.test_busy = 0
+        self.test_waiting = deque()
+        self.result_busy = 0
+        self.result_waiting = deque()
+        self.backup = deque()
+        self.drain_scheduled = False
+
+        # état des utilisateurs
+        self.last_chance = [None] * len(self.users)
+        self.nb_users_done = 0
+        self.dam_closed = False
+        self.dam_waiters = []  # (utilisateur, début du blocage)
+
+    def _schedule(self, time: float, kind: int, arg=None):
+        heapq.heappush(self._calendar, (time, next(self._seq), kind, arg))
+
+    def _record_state(self):
+        test_queue_length = self.test_busy + len(self.test_waiting)
+        result_queue_length = self.result_busy + len(self.result_waiting)
+        self.metrics.record_state(
+            self.now,
+            test_agents=self.test_busy,
+            test_queue_length=test_queue_length,
+            backup_length=len(self.backup),
+            result_agents=self.result_busy,
+            result_queue_length=result_queue_length,
+            test_server_utilization=self.test_busy / self.K,
+            result_server_utilization=self.result_busy,
+        )
+
+    def _all_done(self) -> bool:
+        return self.nb_users_done >= len(self.users) and not self.backup
+
+    def run(self, until: float | None = None) -> int:
+        """
+        Exécute la simulation.
+
+        :param until: Limite de temps de la simulation.
+        :return: Nombre d'événements traités.
+        """
+        # comme les processus de contrôle simpy, lancés avant ceux des utilisateurs : le barrage est
+        # déjà fermé pour les tentatives de l'instant 0
+        if self.tb is not None:
+            self._schedule(0, DAM_CLOSE)
+        for index, user in enumerate(self.users):
+            delay = (
+                self.variates.exo_think(self._exo_key(user)) * MINUTE_UNIT
+                if self.model.initial_think
+                else 0
+            )
+            self._schedule(delay, ATTEMPT, index)
+        self._record_state()
+
+        handlers = {
+            ATTEMPT: self._attempt,
+            TEST_DONE: self._test_done,
+            RESULT_DONE: self._result_done,
+            DAM_CLOSE: self._dam_close,
+            DAM_OPEN: self._dam_open,
+            BACKUP_DRAIN: self._drain_backup,
+            TEST_RELEASED: self._test_released,
+        }
+        end = float("inf") if until is None else until
+        calendar = self._calendar
+        events = 0
+        while calendar and calendar[0][0] < end:
+            self.now, _, kind, arg = heapq.heappop(calendar)
+            handlers[kind](arg)
+            self._record_state()
+            events += 1
+        if until is not None:
+            self.now = until
+        self.model.nb_users_done = self.nb_users_done
+        return events
+
+    # === utilisateurs
+
+    def _attempt(self, index: int):
+        user = self.users[index]
+        now = self.now
+
+        # dernier exercice validé entre-temps par le backup : tentative périmée, comme la sortie
+        # de la boucle while de handle_commit
+        if user.current_exo > self.nb_exos:
+            return
+
+        # barrage ING
+        if self.block_option and self.dam_closed and user.promo == "ING":
+            self.trace.user(EventCode.ING_BLOCKED, now, user)
+            self.dam_waiters.append((index, now))
+            return
+
+        # limite de tags
+        next_tag_time = self.rate_limiter.next_allowed(user.index, now)
+        if next_tag_time > now:
+            self._schedule(next_tag_time, ATTEMPT, index)
+            return
+
+        exo = user.current_exo
+        commit = self.model._new_commit(user, now, exo, self.last_chance[index])
+
+        # file de test pleine, refus
+        if self.ks is not None and self.test_busy + len(self.test_waiting) >= self.ks:
+            self.metrics.record_test_queue_blocked(now)
+            self.trace.commit(EventCode.TEST_REFUSED, now, commit)
+            delay = self.variates.retry_delay(commit.draw_key) * MINUTE_UNIT
+            self._schedule(now + delay, ATTEMPT, index)
+            return
+
+        commit_id = self.metrics.record_test_queue_entry(user.index, user.promo, exo, now)
+        job = (index, commit, commit_id)
+        self.trace.commit(EventCode.TEST_ENTER, now, commit)
+        if self.test_busy < self.K:
+            self._start_test(job)
+        else:
+            self.test_waiting.append(job)
+
+    def _outcome(self, index: int, commit):
+        user = self.users[index]
+        now = self.now
+        if self.variates.pass_draw(commit.draw_key) <= commit.chance_to_pass:
+            self.trace.commit(EventCode.PASSED, now, commit)
+            self._pass_exo(user)
+            self.last_chance[index] = None
+            if user.current_exo <= self.nb_exos:
+                delay = self.variates.exo_think(self._exo_key(user)) * MINUTE_UNIT
+                self._schedule(now + delay, ATTEMPT, index)
+        else:
+            self.trace.commit(EventCode.FAILED, now, commit)
+            self.last_chance[index] = min(
+                commit.chance_to_pass + self.variates.improvement(commit.draw_key), 1
+            )
+            self.rate_limiter.record(user.index, commit.date)
+            delay = self.variates.retry_think(commit.draw_key) * MINUTE_UNIT
+            self._schedule(now + delay, ATTEMPT, index)
+
+    def _pass_exo(self, user):
+        user.current_exo += 1
+        self.rate_limiter.reset(user.index)
+        if user.current_exo == self.nb_exos + 1:
+            self.nb_users_done += 1
+
+    # === file de test
+
+    def _start_test(self, job):
+        index, commit, _ = job
+        self.test_busy += 1
+        self.trace.commit(EventCode.TEST_START, self.now, commit)
+        coeff = self.prepa_test_coeff if self.users[index].promo == "PREPA" else 1
+        self._schedule(self.now + self.process_time * coeff, TEST_DONE, job)
+
+    def _test_done(self, job):
+        index, commit, commit_id = job
+        now = self.now
+        self.trace.commit(EventCode.TEST_FINISH, now, commit)
+        self.test_busy -= 1
+        if self.test_waiting:
+            self._start_test(self.test_waiting.popleft())
+        # comme le processus simpy (yield test_queue.release()), l'orientation vers la file des
+        # résultats se fait après les libérations de places du même instant
+        self._schedule(now, TEST_RELEASED, job)
+
+    def _test_released(self, job):
+        index, commit, commit_id = job
+        now = self.now
+        self.metrics.record_test_queue_exit(commit_id, now)
+
+        # file des résultats pleine, refus (et backup éventuel)
+        if self.kf is not None and self.result_busy + len(self.result_waiting) >= self.kf:
+            if self.uses_backup:
+                self.metrics.record_result_queue_blocked(now)
+                self.trace.commit(EventCode.RESULT_BACKED_UP, now, commit)
+                self.backup.append(job)
+            else:
+                self.metrics.record_result_queue_blocked(now, commit_id)
+                self.trace.commit(EventCode.RESULT_REFUSED, now, commit)
+            delay = self.variates.retry_delay(commit.draw_key) * MINUTE_UNIT
+            self._schedule(now + delay, ATTEMPT, index)
+            return
+
+        self._enter_result(job, backup=False)
+
+    # === file des résultats
+
+    def _enter_result(self, job, backup: bool):
+        self.metrics.record_result_queue_entry(job[2], self.now, backup=backup)
+        code = EventCode.BACKUP_ENTER if backup else EventCode.RESULT_ENTER
+        self.trace.commit(code, self.now, job[1])
+        job = job + (backup,)
+        if self.result_busy == 0:
+            self._start_result(job)
+        else:
+            self.result_waiting.append(job)
+
+    def _start_result(self, job):
+        self.result_busy = 1
+        code = EventCode.BACKUP_START if job[3] else EventCode.RESULT_START
+        self.trace.commit(code, self.now, job[1])
+        self._schedule(self.now + self.result_time, RESULT_DONE, job)
+
+    def _result_done(self, job):
+        index, commit, commit_id, backup = job
+        now = self.now
+        code = EventCode.BACKUP_FINISH if backup else EventCode.RESULT_FINISH
+        self.trace.commit(code, now, commit)
+        self.result_busy = 0
+        if self.result_waiting:
+            self._start_result(self.result_waiting.popleft())
+        self.metrics.record_result_queue_exit(commit_id, now)
+
+        # comme free_backup, le backup ne prend la place libérée qu'après les autres
+        # événements du même instant
+        if self.backup and not self.drain_scheduled:
+            self.drain_scheduled = True
+            self._schedule(now, BACKUP_DRAIN)
+
+        if not backup:
+            self._outcome(index, commit)
+        elif self.variates.pass_draw(commit.draw_key) <= commit.chance_to_pass:
+            self.trace.commit(EventCode.BACKUP_PASSED, now, commit)
+            if commit.exo == commit.user.current_exo:
+                self._pass_exo(commit.user)
+
+    def _drain_backup(self, _):
+        self.drain_scheduled = False
+        while self.backup and self.result_busy + len(self.result_waiting) < self.kf:
+            self._enter_result(self.backup.popleft(), backup=True)
+
+    # === barrage ING
+
+    def _dam_close(self, _):
+        if self._all_done():
+            return
+        self.dam_closed = True
+        self.trace.event(EventCode.DAM_CLOSED, self.now)
+        self._schedule(self.now + self.tb, DAM_OPEN)
+
+    def _dam_open(self, _):
+        self.dam_closed = False
+        self.trace.event(EventCode.DAM_OPENED, self.now)
+        for index, blocked_since in self.dam_waiters:
+            self.metrics.record_ing_blocked(blocked_since, self.now)
+            delay = self.ing_jitter() if self.ing_jitter is not None else 0
+            self._schedule(self.now + delay, ATTEMPT, index)
+        self.dam_waiters = []
+        self._schedule(self.now + self.tb // 2, DAM_CLOSE)
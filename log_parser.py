@@ -0,0 +1,481 @@
+import argparse
+import json
+import mmap
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from event_trace import EVENTS, EventCode
+from queue_metrics import CommitTable, QueueMetrics
+
+# version du format de l'index : un index d'une autre version est ignoré
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".index.npz"
+
+
+def _line_pattern() -> re.Pattern:
+    """
+    Motif unique des lignes d'événements, construit à partir des messages de event_trace.EVENTS :
+    le groupe nommé e<code> du message reconnu est le dernier groupe fermé (match.lastgroup).
+    """
+    messages = []
+    dams = []
+    for code, (_, message) in EVENTS.items():
+        text = re.escape(message.split(" : ", 1)[-1]).replace(r"\{exo\}", r"\d+")
+        if "{time}" in message:
+            group = f"(?P<e{code.value}>[0-9.]+)"
+            dams.append(text.replace(r"\{time\}", group))
+        else:
+            messages.append(f"(?P<e{code.value}>{text})")
+    commit = r"(?:\[(?P<id>\w+) - exo (?P<exo>\d+) - time (?P<date>[0-9.]+)\] by )?"
+    user = r"\[(?P<user>[^\]]+?) - (?P<promo>\w+)\] : "
+    return re.compile(
+        f"^(?:{commit}{user}(?:{'|'.join(messages)})|{'|'.join(dams)})$".encode(),
+        re.MULTILINE,
+    )
+
+
+LINE_PATTERN = _line_pattern()
+
+# événements dont l'instant est exact dans le log (date du commit, instant de la régulation)
+_DATED = {EventCode.TEST_ENTER, EventCode.TEST_REFUSED}
+_DAMS = {EventCode.DAM_CLOSED, EventCode.DAM_OPENED}
+_STARTS = {
+    EventCode.TEST_START: "test",
+    EventCode.RESULT_START: "result",
+    EventCode.BACKUP_START: "result",
+}
+_FINISHES = {
+    EventCode.TEST_FINISH: "test",
+    EventCode.RESULT_FINISH: "result",
+    EventCode.BACKUP_FINISH: "result",
+}
+
+
+def tokenize(path: str) -> Dict[str, np.ndarray | list]:
+    """
+    Découpe un log texte (format historique de la trace) en colonnes, en une passe sur le fichier
+    projeté en mémoire. Les lignes qui ne sont pas des événements (résumé des métriques) sont ignorées.
+
+    Les commits sont numérotés dans l'ordre d'apparition : un identifiant revu à une nouvelle entrée
+    (ou à un nouveau refus) est un nouveau commit, les identifiants historiques étant tirés au hasard.
+
+    :return: colonnes commit, user, exo, code, date (date du commit ou instant de la régulation,
+        NaN sinon) et table des utilisateurs [(nom, promo), ...].
+    """
+    codes = []
+    commits = []
+    users = []
+    exos = []
+    dates = []
+    user_index: Dict[Tuple[str, str], int] = {}
+    commit_index: Dict[bytes, int] = {}
+    group_codes = {f"e{code.value}": code.value for code in EVENTS}
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            data = b""
+        else:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        for match in LINE_PATTERN.finditer(data):
+            code = group_codes[match.lastgroup]
+            codes.append(code)
+            if code in _DAMS:
+                commits.append(-1)
+                users.append(-1)
+                exos.append(0)
+                dates.append(float(match.group(match.lastgroup)))
+                continue
+
+            key = (match.group("user").decode(), match.group("promo").decode())
+            users.append(user_index.setdefault(key, len(user_index)))
+            commit_id = match.group("id")
+            if commit_id is None:  # événement d'un utilisateur (régulation ING)
+                commits.append(-1)
+                exos.append(0)
+                dates.append(np.nan)
+                continue
+            if code in _DATED or commit_id not in commit_index:
+                commit_index[commit_id] = len(commit_index)
+            commits.append(commit_index[commit_id])
+            exos.append(int(match.group("exo")))
+            dates.append(float(match.group("date")) if code in _DATED else np.nan)
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+    return {
+        "commit": np.array(commits, dtype=np.int64),
+        "user": np.array(users, dtype=np.int32),
+        "exo": np.array(exos, dtype=np.int16),
+        "code": np.array(codes, dtype=np.uint8),
+        "date": np.array(dates, dtype=np.float64),
+        "users": list(user_index),
+    }
+
+
+def _line_promos(tokens: Dict[str, np.ndarray | list]) -> np.ndarray:
+    # promo de l'auteur de chaque ligne ("" pour la régulation)
+    promos = np.array([promo for _, promo in tokens["users"]] + [""])
+    return promos[tokens["user"]]
+
+
+def reconstruct_times(
+    tokens: Dict[str, np.ndarray | list], service_times: Dict[str, float]
+) -> Tuple[np.ndarray, int]:
+    """
+    Instant de chaque événement d'un log. Le log ne date que les commits (instant de leur entrée ou
+    de leur refus) et la régulation ; les événements sont dans l'ordre de la simulation, donc :
+
+    - une fin de service a lieu une durée de service après son début ;
+    - les autres événements (début de service, entrée dans la file des résultats, issue du commit)
+      ont lieu à l'instant du dernier événement daté qui les précède.
+
+    Avec les modèles actuels l'instant reconstruit est exact, sauf pour les blocages ING (non datés) :
+    leur durée est alors un majorant. Dans les logs historiques, les commits du backup n'étaient repris
+    qu'au pas de temps suivant : l'instant reconstruit de leur envoi est un minorant.
+
+    :param service_times: "<étape>.<promo>" -> durée de service, par exemple "test.PREPA" -> 4.
+    :return: instants et nombre d'incohérences (instant exact antérieur à l'instant reconstruit
+        précédent, fin de service antérieure à l'instant reconstruit précédent) : aucune si les
+        durées de service sont les bonnes.
+    """
+    times = tokens["date"].tolist()
+    started = {}  # (étape, commit) -> début du service
+    clock = -np.inf
+    inconsistencies = 0
+    for position, (code, commit, promo) in enumerate(
+        zip(tokens["code"].tolist(), tokens["commit"].tolist(), _line_promos(tokens).tolist())
+    ):
+        if code in _DATED or code in _DAMS:
+            instant = times[position]
+        elif code in _FINISHES:
+            stage = _FINISHES[code]
+            instant = started.pop((stage, commit), clock) + service_times[f"{stage}.{promo}"]
+        else:
+            instant = clock
+        # les lignes sont dans l'ordre de la simulation : le temps ne recule pas
+        if instant < clock:
+            inconsistencies += 1
+            instant = clock
+        clock = instant
+        times[position] = clock
+        if code in _STARTS:
+            started[(_STARTS[code], commit)] = clock
+    return np.array(times, dtype=np.float64), inconsistencies
+
+
+def _time_bounds(dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # bornes de l'instant de chaque ligne : instants exacts des lignes précédentes et suivantes
+    lower = np.fmax.accumulate(np.nan_to_num(dates, nan=-np.inf))
+    upper = np.fmin.accumulate(np.nan_to_num(dates, nan=np.inf)[::-1])[::-1]
+    return lower, upper
+
+
+def _service_bounds(tokens: Dict[str, np.ndarray | list]) -> Dict[str, Tuple[float, float]]:
+    """
+    Bornes de la durée de service de chaque étape et promo ("test.ING", ...) : le début et la fin de chaque service sont
+    encadrés par les instants exacts des lignes qui les entourent.
+    """
+    codes = tokens["code"]
+    commits = tokens["commit"]
+    promos = _line_promos(tokens)
+    lower, upper = _time_bounds(tokens["date"])
+    bounds = {}
+    for stage in ("test", "result"):
+        starts = np.flatnonzero(np.isin(codes, [c for c, s in _STARTS.items() if s == stage]))
+        finishes = np.flatnonzero(np.isin(codes, [c for c, s in _FINISHES.items() if s == stage]))
+        if len(starts) == 0 or len(finishes) == 0:
+            continue
+        # position du début de service de chaque commit (un seul service par étape et par commit)
+        start_of = np.full(commits.max() + 1, -1)
+        start_of[commits[starts]] = starts
+        finishes = finishes[start_of[commits[finishes]] >= 0]
+        starts = start_of[commits[finishes]]
+        for promo in np.unique(promos[finishes]).tolist():
+            selected = promos[finishes] == promo
+            bounds[f"{stage}.{promo}"] = (
+                max(float(np.max(lower[finishes[selected]] - upper[starts[selected]])), 0),
+                float(np.min(upper[finishes[selected]] - lower[starts[selected]])),
+            )
+    return bounds
+
+
+def _given_time(service_times: Dict[str, float], key: str) -> float | None:
+    # "test.PREPA" prime sur "test" (toutes les promos)
+    stage = key.split(".")[0]
+    return service_times.get(key, service_times.get(stage))
+
+
+def infer_service_times(
+    tokens: Dict[str, np.ndarray | list], service_times: Dict[str, float] | None = None
+) -> Dict[str, float]:
+    """
+    Durées de service (constantes) de chaque étape et promo, déduites de l'ordre des lignes : parmi les
+    durées entières compatibles avec les instants exacts du log, celles dont la reconstruction des instants
+    (reconstruct_times) est la plus cohérente, choisies une étape et une promo à la fois.
+
+    :param service_times: durées connues ("test", "result" ou "test.PREPA", ...), non déduites.
+    :return: "<étape>.<promo>" -> durée de service.
+    :raise ValueError: si aucune durée n'est compatible avec le log (durées aléatoires ou non entières).
+    """
+    service_times = service_times or {}
+    candidates = {}
+    for key, (low, high) in _service_bounds(tokens).items():
+        given = _given_time(service_times, key)
+        if given is not None:
+            candidates[key] = [given]
+            continue
+        values = list(range(int(np.ceil(low)), int(np.floor(min(high, low + 64))) + 1))
+        if not values:
+            raise ValueError(f"no constant {key} service time matches the log, give it explicitly")
+        candidates[key] = values
+
+    service_times = {key: values[0] for key, values in candidates.items()}
+    best = reconstruct_times(tokens, service_times)[1]
+    changed = True
+    while changed and best > 0:
+        changed = False
+        for key, values in candidates.items():
+            for value in values:
+                trial = {**service_times, key: value}
+                inconsistencies = reconstruct_times(tokens, trial)[1]
+                if inconsistencies < best:
+                    service_times, best, changed = trial, inconsistencies, True
+    return {key: float(value) for key, value in service_times.items()}
+
+
+def trace_metrics(trace: Dict[str, np.ndarray | list], servers: int | None = None) -> QueueMetrics:
+    """
+    Reconstruit un QueueMetrics (mode "event") à partir d'événements datés : la table des commits,
+    les refus, les blocages ING et les séries d'état (un état par instant de changement).
+    Accepte une trace binaire relue par event_trace.read_trace comme un log analysé par parse_log.
+
+    :param trace: colonnes time, commit, user, exo, code et table des utilisateurs.
+    :param servers: nombre de serveurs de test (par défaut, le nombre maximal de tests simultanés).
+    """
+    codes = trace["code"]
+    times = trace["time"]
+    commits = trace["commit"]
+
+    def events(*event_codes) -> np.ndarray:
+        return np.isin(codes, event_codes)
+
+    metrics = QueueMetrics(event_driven=True, promo_breakdown=bool(events(*_DAMS).any()))
+
+    # table des commits : une ligne par entrée dans la file de test
+    entries = np.flatnonzero(events(EventCode.TEST_ENTER))
+    promo_codes = np.array(
+        [CommitTable.PROMO_CODES[promo] for _, promo in trace["users"]], dtype=np.int8
+    )
+    size = len(entries)
+    columns = {
+        name: np.full(size, np.nan) if np.dtype(dtype).kind == "f" else np.zeros(size, dtype=dtype)
+        for name, dtype in CommitTable.COLUMNS.items()
+    }
+    columns["user"] = trace["user"][entries]
+    columns["promo"] = promo_codes[trace["user"][entries]] if size else columns["promo"]
+    columns["exo"] = trace["exo"][entries]
+    columns["test_enter"] = times[entries]
+    row_of = np.full(commits.max(initial=-1) + 1, -1)
+    row_of[commits[entries]] = np.arange(size)
+    for column, event_codes in (
+        ("test_exit", (EventCode.TEST_FINISH,)),
+        ("result_enter", (EventCode.RESULT_ENTER, EventCode.BACKUP_ENTER)),
+        ("result_exit", (EventCode.RESULT_FINISH, EventCode.BACKUP_FINISH)),
+    ):
+        selected = np.flatnonzero(events(*event_codes))
+        columns[column][row_of[commits[selected]]] = times[selected]
+    columns["backup"][row_of[commits[events(EventCode.BACKUP_ENTER)]]] = True
+    metrics.commits = CommitTable.from_columns(columns)
+
+    # refus et blocages
+    metrics.total_requests = size
+    metrics.test_queue_blocked_times.extend(times[events(EventCode.TEST_REFUSED)])
+    metrics.result_queue_blocked_times.extend(
+        times[events(EventCode.RESULT_REFUSED, EventCode.RESULT_BACKED_UP)]
+    )
+    metrics.test_queue_blocked = len(metrics.test_queue_blocked_times)
+    metrics.result_queue_blocked = len(metrics.result_queue_blocked_times)
+    # un ING bloqué repart à l'ouverture suivante du barrage
+    blocked = np.flatnonzero(events(EventCode.ING_BLOCKED))
+    opened = np.flatnonzero(events(EventCode.DAM_OPENED))
+    following = np.searchsorted(opened, blocked)
+    released = following < len(opened)
+    metrics.ing_blocked_durations.extend(
+        times[opened[following[released]]] - times[blocked[released]]
+    )
+
+    # séries d'état : compteurs cumulés des entrées et sorties, dernier état de chaque instant
+    def count(increments, decrements) -> np.ndarray:
+        return np.cumsum(events(*increments).astype(np.int32) - events(*decrements))
+
+    test_agents = count((EventCode.TEST_START,), (EventCode.TEST_FINISH,))
+    test_length = count((EventCode.TEST_ENTER,), (EventCode.TEST_FINISH,))
+    result_agents = count(
+        (EventCode.RESULT_START, EventCode.BACKUP_START),
+        (EventCode.RESULT_FINISH, EventCode.BACKUP_FINISH),
+    )
+    result_length = count(
+        (EventCode.RESULT_ENTER, EventCode.BACKUP_ENTER),
+        (EventCode.RESULT_FINISH, EventCode.BACKUP_FINISH),
+    )
+    backup = count((EventCode.RESULT_BACKED_UP,), (EventCode.BACKUP_ENTER,))
+    states = np.stack([test_agents, test_length, backup, result_agents, result_length])
+
+    # état initial vide, enregistré par la simulation à son lancement (instant 0)
+    times = np.append(min(0.0, times.min(initial=0.0)), times)
+    states = np.hstack([np.zeros((len(states), 1), dtype=states.dtype), states])
+    last = np.append(times[1:] != times[:-1], True)
+    times, states = times[last], states[:, last]
+    # comme QueueMetrics.record_state : un état identique au précédent n'est pas enregistré
+    changed = np.append(True, np.any(states[:, 1:] != states[:, :-1], axis=0))[: len(times)]
+    times, states = times[changed], states[:, changed]
+    test_agents, test_length, backup, result_agents, result_length = states
+
+    capacity = servers or max(int(test_agents.max(initial=0)), 1)
+    metrics.timestamps.extend(times)
+    metrics.test_server_count.extend(test_agents)
+    metrics.test_queue_lengths.extend(test_length)
+    metrics.test_server_utilization.extend(test_agents / capacity)
+    metrics.backup_length.extend(backup)
+    metrics.result_server_count.extend(result_agents)
+    metrics.result_queue_lengths.extend(result_length)
+    # un seul serveur d'envoi
+    metrics.result_server_utilization.extend(result_agents.astype(float))
+    metrics.system_clients.extend(test_agents + result_agents + test_length + result_length)
+    return metrics
+
+
+@dataclass
+class ParsedLog:
+    """
+    Log texte analysé : événements datés (colonnes de event_trace.read_trace) et durées de service
+    ("<étape>.<promo>" -> durée) utilisées pour dater les fins de service.
+    """
+
+    path: str
+    trace: Dict[str, np.ndarray | list] = field(repr=False)
+    service_times: Dict[str, float]
+    servers: int | None = None
+
+    def metrics(self) -> QueueMetrics:
+        """QueueMetrics équivalent à celui de la simulation (voir trace_metrics)."""
+        return trace_metrics(self.trace, self.servers)
+
+
+def index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+def _source_stamp(path: str) -> List[float]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def _load_index(path: str) -> ParsedLog | None:
+    index = index_path(path)
+    if not os.path.exists(index):
+        return None
+    with np.load(index) as arrays:
+        header = json.loads(arrays["header"].item())
+        if header["version"] != INDEX_VERSION or header["source"] != _source_stamp(path):
+            return None
+        trace = {name: arrays[name] for name in ("time", "commit", "user", "exo", "code")}
+    trace["users"] = [tuple(user) for user in header["users"]]
+    return ParsedLog(path, trace, header["service_times"])
+
+
+def _write_index(parsed: ParsedLog):
+    header = {
+        "version": INDEX_VERSION,
+        "source": _source_stamp(parsed.path),
+        "service_times": parsed.service_times,
+        "users": parsed.trace["users"],
+    }
+    arrays = {
+        name: parsed.trace[name] for name in ("time", "commit", "user", "exo", "code")
+    }
+    temp = f"{index_path(parsed.path)}.{os.getpid()}.tmp"
+    with open(temp, "wb") as file:
+        np.savez(file, header=np.array(json.dumps(header)), **arrays)
+    os.replace(temp, index_path(parsed.path))
+
+
+def parse_log(
+    path: str,
+    service_times: Dict[str, float] | None = None,
+    servers: int | None = None,
+    index: bool = True,
+) -> ParsedLog:
+    """
+    Analyse un log texte de simulation (output/<Model>/files/U*_*.txt) : découpage des lignes
+    (tokenize), durées de service (infer_service_times pour celles qui ne sont pas données) et instants
+    des événements (reconstruct_times).
+
+    :param service_times: durées de service connues, par étape ("test", "result") ou par étape et promo
+        ("test.PREPA"), par exemple {"test": 2, "test.PREPA": 4, "result": 1}.
+    :param servers: nombre de serveurs de test (voir trace_metrics).
+    :param index: relit l'index <log>.index.npz s'il est à jour, l'écrit sinon : une nouvelle
+        ouverture ne relit pas le texte. Les durées de service données explicitement priment sur l'index.
+    """
+    if index and not service_times:
+        parsed = _load_index(path)
+        if parsed is not None:
+            parsed.servers = servers
+            return parsed
+
+    tokens = tokenize(path)
+    service_times = infer_service_times(tokens, service_times)
+    tokens["time"], _ = reconstruct_times(tokens, service_times)
+    trace = {name: tokens[name] for name in ("time", "commit", "user", "exo", "code", "users")}
+    parsed = ParsedLog(path, trace, service_times, servers)
+    if index:
+        _write_index(parsed)
+    return parsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recalcule les métriques de logs texte de simulation sans resimuler."
+    )
+    parser.add_argument("logs", nargs="+", help="logs texte (output/<Model>/files/U*_*.txt)")
+    parser.add_argument(
+        "--service-time",
+        action="append",
+        default=[],
+        metavar="STAGE[.PROMO]=TIME",
+        help="durée de service connue, par exemple test=2 ou test.PREPA=4 (déduite par défaut)",
+    )
+    parser.add_argument("--servers", type=int, help="nombre de serveurs de test")
+    parser.add_argument("--no-index", action="store_true", help="n'utilise pas d'index")
+    args = parser.parse_args()
+
+    service_times = {}
+    for value in args.service_time:
+        key, duration = value.split("=")
+        service_times[key] = float(duration)
+
+    for path in args.logs:
+        start = time.perf_counter()
+        parsed = parse_log(
+            path,
+            service_times=service_times,
+            servers=args.servers,
+            index=not args.no_index,
+        )
+        metrics = parsed.metrics().calculate_metrics()
+        print(
+            f"{path}: {len(parsed.trace['code'])} events,"
+            f" service times {json.dumps(parsed.service_times, sort_keys=True)}"
+            f" ({time.perf_counter() - start:.2f}s)"
+        )
+        print(
+            f"  sojourn {metrics['sojourn_times']['total']['avg']:.4g},"
+            f" throughput {metrics['throughput']:.4g},"
+            f" test blocking {metrics['test_queue']['blocking_rate']:.4g},"
+            f" result blocking {metrics['result_queue']['blocking_rate']:.4g}"
+        )
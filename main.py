@@ -1,39 +1,29 @@
-import random
-import sys
+import argparse
 import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
 import numpy as np
 
-from basics import Utilisateur
+from basics import Utilisateur, TableUser
+from cache import DEFAULT_CACHE_DIR, ResultCache, cache_identity, cache_key
+from event_trace import EventTrace, TraceLevel
+from export import MANIFEST, export_run
+from population import (
+    create_user_list,
+    create_user_table,
+    generate_users_names,
+    make_variates,
+    set_random_seed,
+)
+from report import render_report, render_reports
 from waterfall.infinite import WaterfallMoulinetteInfinite
 from waterfall.finite import WaterfallMoulinetteFinite
 from waterfall.backup import WaterfallMoulinetteFiniteBackup
 from channels_dams.channelsdams import ChannelsAndDams
-from typing import List, Callable
-
-
-def generate_users_names(n: int):
-    """
-    Génère une liste de nom d'utilisateur.
-
-    :param n: nombre de nom à générer.
-    """
-
-    return ["USER" + str(i) for i in range(n)]
-
-
-def create_user_list(names: List[str], promo_ratio=0.5) -> List[Utilisateur]:
-    """
-    Génère une liste de Utilisateur à partir de names avec une proportion (basée sur tirage aléatoire) de promo_ratio d'ING, et 1 - promo_ratio de PREPA
-
-    :param names: liste de nom d'utilisateur.
-    :param promo_ratio: proportion d'ING dans les utilisateurs
-    """
-
-    users = []
-    for name in names:
-        promo = "ING" if random.random() < promo_ratio else "PREPA"
-        users.append(Utilisateur(name=name, promo=promo))
-    return users
+from typing import Callable, Iterator, List, TextIO
 
 
 def launch_test(
@@ -43,70 +33,349 @@ def launch_test(
         | WaterfallMoulinetteFiniteBackup
         | ChannelsAndDams
     ),
-    user_list: list[Utilisateur],
+    user_list: list[Utilisateur] | list[TableUser],
     until: int | None = None,
     save_filename: str = "metrics.png",
-):
+    log: TextIO | None = None,
+    plot: bool = True,
+) -> dict:
     """
     Charge test la moulinette avec une liste d'utilisateurs.
 
     :param moulinette: type de moulinette.
     :param user_list: liste d'utilisateurs.
     :param until: nombre de secondes de la simulation.
+    :param log: flux du résumé des métriques (par défaut, la sortie standard).
+    :param plot: trace le graphe des métriques (False : rendu différé, voir report.py).
     """
 
     for user in user_list:
         moulinette.add_user(user)
 
-    # process de régulation de moulinette pour les ING dans le cas de Channels&Dams
-    if isinstance(moulinette, ChannelsAndDams):
-        moulinette.env.process(moulinette.regulate_ing())
+    # les process de régulation des ING (Channels&Dams) et de vidage du backup
+    # sont lancés par la moulinette elle-même (Moulinette._control_processes)
+    return moulinette.start_simulation(
+        until=until, save_filename=save_filename, log=log, plot=plot
+    )
 
-    # process d'utilisation du backup quand le serveur back est libre dans le cas de Waterfall avec backup
-    if isinstance(moulinette, WaterfallMoulinetteFiniteBackup) or isinstance(
-        moulinette, ChannelsAndDams
-    ):
-        moulinette.env.process(moulinette.free_backup())
 
-    moulinette.start_simulation(until=until, save_filename=save_filename)
+@dataclass
+class SimulationJob:
+    """
+    Une simulation d'une campagne : un modèle, une configuration et un nombre d'utilisateurs.
+    """
 
+    nb_user: int
+    module: Callable
+    key: str
+    config: dict
+    promo_ratio: float = 0.7
+    trace_level: TraceLevel = TraceLevel.FULL
+    compact: bool = False
+    block_variates: bool = False
+    crn: bool = False
+    seed: int = 42
+    cache_dir: str | None = None
+    render: bool = True
+    export: bool = True
 
-def exec_simulations(
-    nb_user: int, module: Callable, configs: dict, promo_ratio: float = 0.7
-):
-    for key in configs.keys():
-        user_list = create_user_list(generate_users_names(nb_user), promo_ratio)
-        m_config = module(**configs[key])
-        if not os.path.exists(os.path.join("output", m_config.__class__.__name__)):
-            os.mkdir(os.path.join("output", m_config.__class__.__name__))
-            os.mkdir(os.path.join("output", m_config.__class__.__name__, "files"))
-            os.mkdir(os.path.join("output", m_config.__class__.__name__, "graphs"))
-
-        with open(
-            f"output/{m_config.__class__.__name__}/files/U{len(user_list)}_{key}.txt",
-            "w",
-        ) as sys.stdout:
-            launch_test(
-                m_config,
-                user_list,
-                until=None,
-                save_filename=f"output/{m_config.__class__.__name__}/graphs/U{len(user_list)}_{key}.png",
-            )
-        sys.stdout = sys.__stdout__
-
-def set_random_seed(seed: int = 42):
+    @property
+    def name(self) -> str:
+        return f"U{self.nb_user}_{self.key}"
+
+    @property
+    def cache_identity(self) -> dict:
+        """Description de la simulation dans le cache des résultats (voir cache.ResultCache)."""
+        return cache_identity(
+            self.module,
+            self.config,
+            self.nb_user,
+            self.promo_ratio,
+            self.seed,
+            compact=self.compact,
+            block_variates=self.block_variates,
+            crn=self.crn,
+        )
+
+    @property
+    def cache_key(self) -> str:
+        return cache_key(self.cache_identity)
+
+
+def job_seed(master_seed: int, module: Callable, key: str, nb_user: int) -> int:
+    """
+    Graine d'une simulation, dérivée de la graine maître et de l'identité de la simulation :
+    les résultats ne dépendent ni de l'ordre d'exécution ni du nombre de workers.
+    """
+    identity = zlib.crc32(f"{module.__name__}/{key}/U{nb_user}".encode())
+    return int(np.random.SeedSequence([master_seed, identity]).generate_state(1)[0])
+
+
+def make_jobs(
+    nb_user: int,
+    module: Callable,
+    configs: dict,
+    promo_ratio: float = 0.7,
+    trace_level: TraceLevel = TraceLevel.FULL,
+    compact: bool = False,
+    block_variates: bool = False,
+    crn: bool = False,
+    seed: int = 42,
+    cache_dir: str | None = None,
+    render: bool = True,
+    export: bool = True,
+) -> List[SimulationJob]:
     """
-    Set random seeds for reproducibility across all random number generators used in the simulation.
+    Une simulation par configuration (voir exec_simulations pour les paramètres).
+    En mode CRN, toutes les configurations partagent la même graine, donc la même charge.
     """
-    random.seed(seed)
-    np.random.seed(seed)
-    return seed
+    return [
+        SimulationJob(
+            nb_user=nb_user,
+            module=module,
+            key=key,
+            config=config,
+            promo_ratio=promo_ratio,
+            trace_level=trace_level,
+            compact=compact,
+            block_variates=block_variates,
+            crn=crn,
+            seed=job_seed(seed, module, "crn" if crn else key, nb_user),
+            cache_dir=cache_dir,
+            render=render,
+            export=export,
+        )
+        for key, config in configs.items()
+    ]
 
 
+def _restore_job(job: SimulationJob, cache: ResultCache, entry: dict, start: float) -> dict:
+    """
+    Résultat d'une simulation trouvée dans le cache : le log est réécrit et le graphe retracé
+    à partir des séries brutes s'il est absent et que job.render est vrai, de même pour l'export en colonnes
+    (la trace des événements n'est pas conservée).
+    """
+    model_dir = os.path.join("output", job.module.__name__)
+    for sub_dir in ("files", "graphs"):
+        os.makedirs(os.path.join(model_dir, sub_dir), exist_ok=True)
+
+    if "summary" in entry:
+        with open(os.path.join(model_dir, "files", f"{job.name}.txt"), "w") as log:
+            log.write(entry["summary"])
+    graph = os.path.join(model_dir, "graphs", f"{job.name}.png")
+    if job.render and not os.path.exists(graph):
+        render_report(cache.root, job.cache_key, graph)
+    run_dir = os.path.join(model_dir, "runs", job.name)
+    if job.export and not os.path.exists(os.path.join(run_dir, MANIFEST)):
+        export_run(
+            run_dir,
+            job.cache_identity,
+            cache.load_metrics(job.cache_key),
+            entry["metrics"],
+            name=job.name,
+        )
+
+    return {
+        "model": job.module.__name__,
+        "config": job.key,
+        "nb_user": job.nb_user,
+        "seed": job.seed,
+        "seconds": time.perf_counter() - start,
+        "metrics": entry["metrics"],
+        "cached": True,
+    }
+
+
+def run_job(job: SimulationJob) -> dict:
+    """
+    Exécute une simulation. Le résumé des métriques est écrit dans output/<Model>/files,
+    le graphe dans output/<Model>/graphs, la trace binaire des événements dans output/<Model>/traces
+    et les enregistrements bruts en colonnes dans output/<Model>/runs (voir export.export_run).
+    Si job.cache_dir est donné, une simulation déjà faite (même modèle, configuration, population, graine
+    et code de simulation) n'est pas relancée. Si job.render est faux, le graphe n'est pas tracé : il l'est
+    plus tard à partir du cache, par report.render_reports.
+
+    :return: description de la simulation et métriques calculées.
+    """
+    start = time.perf_counter()
+    cache = ResultCache(job.cache_dir) if job.cache_dir is not None else None
+    if cache is not None:
+        entry = cache.get(job.cache_key)
+        if entry is not None:
+            return _restore_job(job, cache, entry, start)
+
+    set_random_seed(job.seed)
+    variates = make_variates(job.seed, crn=job.crn, block_variates=job.block_variates)
+    if job.compact:
+        user_list = create_user_table(job.nb_user, job.promo_ratio, variates)
+    else:
+        user_list = create_user_list(
+            generate_users_names(job.nb_user), job.promo_ratio, variates
+        )
+
+    model_dir = os.path.join("output", job.module.__name__)
+    for sub_dir in ("files", "graphs", "traces"):
+        os.makedirs(os.path.join(model_dir, sub_dir), exist_ok=True)
+
+    trace = EventTrace(
+        path=os.path.join(model_dir, "traces", f"{job.name}.trace"),
+        level=job.trace_level,
+    )
+    moulinette = job.module(
+        **job.config, trace=trace, compact=job.compact, variates=variates
+    )
+
+    # chaque simulation a son propre fichier de log (pas de sys.stdout partagé)
+    log_filename = os.path.join(model_dir, "files", f"{job.name}.txt")
+    with open(log_filename, "w") as log:
+        metrics = launch_test(
+            moulinette,
+            user_list,
+            until=None,
+            save_filename=os.path.join(model_dir, "graphs", f"{job.name}.png"),
+            log=log,
+            plot=job.render,
+        )
+
+    if cache is not None:
+        with open(log_filename) as log:
+            summary = log.read()
+        cache.put(
+            job.cache_key,
+            job.cache_identity,
+            moulinette.metrics,
+            metrics,
+            summary,
+            name=job.name,
+        )
+    if job.export:
+        export_run(
+            os.path.join(model_dir, "runs", job.name),
+            job.cache_identity,
+            moulinette.metrics,
+            metrics,
+            name=job.name,
+        )
+
+    return {
+        "model": job.module.__name__,
+        "config": job.key,
+        "nb_user": job.nb_user,
+        "seed": job.seed,
+        "seconds": time.perf_counter() - start,
+        "metrics": metrics,
+        "cached": False,
+    }
+
+
+def run_jobs(jobs: List[SimulationJob], workers: int = 1) -> Iterator[dict]:
+    """
+    Exécute des simulations, dans le processus courant (workers=1) ou réparties sur un pool de processus.
+    Les résultats sont rendus au fur et à mesure de la fin des simulations.
+
+    :param workers: nombre de processus.
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield run_job(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def exec_simulations(
+    nb_user: int,
+    module: Callable,
+    configs: dict,
+    promo_ratio: float = 0.7,
+    trace_level: TraceLevel = TraceLevel.FULL,
+    compact: bool = False,
+    block_variates: bool = False,
+    crn: bool = False,
+    seed: int = 42,
+    workers: int = 1,
+    cache_dir: str | None = None,
+    render: bool = True,
+    export: bool = True,
+) -> List[dict]:
+    """
+    Lance une simulation par configuration. Le résumé des métriques est écrit dans output/<Model>/files,
+    les graphes dans output/<Model>/graphs et la trace binaire des événements dans output/<Model>/traces
+    (rendu texte avec `python event_trace.py <fichier>.trace`).
+
+    :param trace_level: niveau de détail de la trace (TraceLevel.OFF pour ne rien tracer).
+    :param compact: utilisateurs en UserTable et commits à identifiants entiers (grandes populations).
+    :param block_variates: tirages par blocs numpy (BlockVariates) plutôt que le module random.
+    :param crn: nombres aléatoires communs (CommonRandomVariates) : toutes les configurations voient
+        les mêmes utilisateurs, temps de travail et résultats de commits.
+    :param seed: graine maître, dont est dérivée la graine de chaque simulation.
+    :param workers: nombre de processus pour exécuter les simulations.
+    :param cache_dir: dossier du cache des résultats (None : toujours simuler), voir cache.ResultCache.
+    :param render: trace les graphes dans les simulations (False : voir report.render_reports).
+    :param export: écrit les enregistrements bruts en colonnes dans output/<Model>/runs (voir export.find_runs).
+    """
+    jobs = make_jobs(
+        nb_user,
+        module,
+        configs,
+        promo_ratio=promo_ratio,
+        trace_level=trace_level,
+        compact=compact,
+        block_variates=block_variates,
+        crn=crn,
+        seed=seed,
+        cache_dir=cache_dir,
+        render=render,
+        export=export,
+    )
+    return list(run_jobs(jobs, workers=workers))
+
 
 if __name__ == "__main__":
-    used_seed = set_random_seed(42)
+    parser = argparse.ArgumentParser(
+        description="Lance la campagne de simulations des quatre moulinettes."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="nombre de processus (1 : en série)"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="graine maître")
+    parser.add_argument(
+        "--crn",
+        action="store_true",
+        help="nombres aléatoires communs : même charge pour toutes les configurations",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="dossier du cache des résultats",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="relance toutes les simulations"
+    )
+    parser.add_argument(
+        "--prune-cache",
+        action="store_true",
+        help="supprime du cache les entrées qui ne correspondent plus à la campagne",
+    )
+    parser.add_argument(
+        "--no-render",
+        action="store_true",
+        help="ne trace pas les graphes (à tracer ensuite avec report.py)",
+    )
+    parser.add_argument(
+        "--no-export",
+        action="store_true",
+        help="n'écrit pas les enregistrements bruts en colonnes (output/<Model>/runs)",
+    )
+    args = parser.parse_args()
+    cache_dir = None if args.no_cache else args.cache_dir
+    # avec le cache, les graphes sont tracés après les simulations (étape de rendu de report.py)
+    render = cache_dir is None and not args.no_render
 
+    jobs = []
     user_lists = {
         "normal": 65,
         "high_load": 130,
@@ -144,10 +413,17 @@ if __name__ == "__main__":
         },
     }
 
-    print("\n\n=== Waterfall Moulinette (Infinite Queues) ===\n")
-    for load_type, users in user_lists.items():
-        print(f"===== {load_type} config =====")
-        exec_simulations(users, WaterfallMoulinetteInfinite, config_infinite)
+    for users in user_lists.values():
+        jobs += make_jobs(
+            users,
+            WaterfallMoulinetteInfinite,
+            config_infinite,
+            seed=args.seed,
+            crn=args.crn,
+            cache_dir=cache_dir,
+            render=render,
+            export=not args.no_export,
+        )
 
     config_finite = {
         "small_queues": {
@@ -197,10 +473,17 @@ if __name__ == "__main__":
         },
     }
 
-    print("\n\n=== Waterfall Moulinette (Finite Queues) ===\n")
-    for load_type, users in user_lists.items():
-        print(f"===== {load_type} config =====")
-        exec_simulations(users, WaterfallMoulinetteFinite, config_finite)
+    for users in user_lists.values():
+        jobs += make_jobs(
+            users,
+            WaterfallMoulinetteFinite,
+            config_finite,
+            seed=args.seed,
+            crn=args.crn,
+            cache_dir=cache_dir,
+            render=render,
+            export=not args.no_export,
+        )
 
     config_finite_backup = {
         "conservative": {
@@ -240,10 +523,17 @@ if __name__ == "__main__":
             "kf": 15,
         },
     }
-    print("\n\n=== Waterfall Moulinette (Finite Queues with Backup) ===\n")
-    for load_type, users in user_lists.items():
-        print(f"===== {load_type} config =====")
-        exec_simulations(users, WaterfallMoulinetteFiniteBackup, config_finite_backup)
+    for users in user_lists.values():
+        jobs += make_jobs(
+            users,
+            WaterfallMoulinetteFiniteBackup,
+            config_finite_backup,
+            seed=args.seed,
+            crn=args.crn,
+            cache_dir=cache_dir,
+            render=render,
+            export=not args.no_export,
+        )
 
     config_channels_dams = {
         "no_regulation_balanced": {
@@ -283,7 +573,31 @@ if __name__ == "__main__":
             "block_option": True,
         },
     }
-    print("\n\n=== Channels & Dams Moulinette ===\n")
-    for load_type, users in user_lists.items():
-        print(f"===== {load_type} config =====")
-        exec_simulations(users, ChannelsAndDams, config_channels_dams)
+    for users in user_lists.values():
+        jobs += make_jobs(
+            users,
+            ChannelsAndDams,
+            config_channels_dams,
+            seed=args.seed,
+            crn=args.crn,
+            cache_dir=cache_dir,
+            render=render,
+            export=not args.no_export,
+        )
+
+    if args.prune_cache:
+        evicted = ResultCache(args.cache_dir).evict(keep=[job.cache_key for job in jobs])
+        print(f"{len(evicted)} cache entries evicted")
+
+    for done, result in enumerate(run_jobs(jobs, workers=args.workers), start=1):
+        cached = ", cached" if result["cached"] else ""
+        print(
+            f"[{done}/{len(jobs)}] {result['model']} U{result['nb_user']} {result['config']}"
+            f" ({result['seconds']:.1f}s{cached})"
+        )
+
+    if cache_dir is not None and not args.no_render:
+        graphs = render_reports(
+            cache_dir, keys=[job.cache_key for job in jobs], workers=args.workers
+        )
+        print(f"{len(graphs)} graphs rendered")
@@ -0,0 +1,248 @@
+import argparse
+import itertools
+import json
+from typing import Dict, Sequence
+
+import numpy as np
+
+from basics import MINUTE_UNIT, PROMOS
+
+# durée d'une unité de temps de la simulation, en millisecondes
+TIME_UNIT_MS = 60_000 / MINUTE_UNIT
+
+# stations à file d'attente du réseau : les K serveurs de test puis le serveur d'envoi
+STATIONS = ("test_queue", "result_queue")
+
+
+def mean_think_time(
+    intelligence: float = 0.6,
+    improvement: float = 0.1,
+    exo_think: float = 45,
+    retry_think: float = 15,
+) -> float:
+    """
+    Temps de réflexion moyen entre deux commits d'un utilisateur, en unités de temps, pour les valeurs
+    moyennes des tirages de variates.RandomVariates : un exercice est travaillé exo_think minutes puis
+    corrigé retry_think minutes après chaque commit raté, la chance de réussite croissant de improvement
+    à chaque échec.
+
+    :param intelligence: chance de réussite du premier commit d'un exercice.
+    """
+    # nombre moyen de commits par exercice : somme des probabilités d'échouer aux essais précédents
+    commits = 0.0
+    fail = 1.0
+    chance = intelligence
+    while fail > 1e-12:
+        commits += fail
+        fail *= 1 - min(chance, 1)
+        chance += improvement
+    return (exo_think + (commits - 1) * retry_think) / commits * MINUTE_UNIT
+
+
+def _seidmann(demands: np.ndarray, servers: np.ndarray):
+    # une station à K serveurs devient un serveur de demande D / K suivi d'un délai D·(K - 1) / K
+    return demands / servers, demands * (servers - 1) / servers
+
+
+def exact_mva(
+    populations: Sequence[int],
+    think_times: Sequence[float],
+    demands: np.ndarray,
+    servers: Sequence[int] | None = None,
+) -> Dict[str, np.ndarray]:
+    """
+    MVA exacte multi-classes d'un réseau fermé : une station de réflexion (délai) et des stations FIFO.
+    Les stations à plusieurs serveurs sont approchées par la transformation de Seidmann.
+    Récurrence sur tous les vecteurs de population : coût en produit des (N_c + 1).
+
+    :param populations: nombre d'utilisateurs de chaque classe.
+    :param think_times: temps de réflexion moyen de chaque classe.
+    :param demands: demande de service (classe, station).
+    :param servers: nombre de serveurs de chaque station (1 par défaut).
+    :return: throughput (classe), response (classe, station) et length (classe, station).
+    """
+    populations = np.asarray(populations, dtype=np.int64)
+    think_times = np.asarray(think_times, dtype=np.float64)
+    demands = np.asarray(demands, dtype=np.float64)
+    servers = np.ones(demands.shape[1]) if servers is None else np.asarray(servers, dtype=np.float64)
+    queueing, delay = _seidmann(demands, servers)
+
+    # longueur moyenne des files (hors délai) pour chaque vecteur de population
+    lengths = np.zeros((*(populations + 1), demands.shape[1]))
+    response = np.zeros(demands.shape)
+    throughput = np.zeros(len(populations))
+    for population in itertools.product(*(range(size + 1) for size in populations)):
+        present = np.flatnonzero(population)
+        if len(present) == 0:
+            continue
+        for c in present:
+            previous = list(population)
+            previous[c] -= 1
+            response[c] = queueing[c] * (1 + lengths[tuple(previous)])
+        throughput[:] = 0
+        throughput[present] = np.asarray(population)[present] / (
+            think_times[present] + (response[present] + delay[present]).sum(axis=1)
+        )
+        lengths[population] = throughput @ response
+
+    response = response + delay
+    return {
+        "throughput": throughput,
+        "response": response,
+        "length": throughput[:, None] * response,
+    }
+
+
+def schweitzer_mva(
+    populations: Sequence[int],
+    think_times: Sequence[float],
+    demands: np.ndarray,
+    servers: Sequence[int] | None = None,
+    tolerance: float = 1e-10,
+    max_iterations: int = 10_000,
+) -> Dict[str, np.ndarray]:
+    """
+    MVA approchée de Schweitzer (Bard-Schweitzer) : point fixe sur la seule population complète, la file
+    vue par un commit de la classe c étant Q(N) moins (1 / N_c) de sa propre classe. Coût indépendant
+    de la population : adaptée au criblage de nombreuses configurations.
+    Mêmes paramètres et résultat que exact_mva.
+    """
+    populations = np.asarray(populations, dtype=np.float64)
+    think_times = np.asarray(think_times, dtype=np.float64)
+    demands = np.asarray(demands, dtype=np.float64)
+    servers = np.ones(demands.shape[1]) if servers is None else np.asarray(servers, dtype=np.float64)
+    queueing, delay = _seidmann(demands, servers)
+
+    present = populations > 0
+    # part de sa propre classe qu'un commit ne voit pas dans la file
+    own = np.divide(1, populations, out=np.zeros_like(populations), where=present)
+    lengths = np.outer(populations, np.ones(demands.shape[1])) / demands.shape[1]
+    throughput = np.zeros(len(populations))
+    for _ in range(max_iterations):
+        seen = lengths.sum(axis=0) - own[:, None] * lengths
+        response = queueing * (1 + seen)
+        throughput = np.where(
+            present, populations / (think_times + (response + delay).sum(axis=1)), 0
+        )
+        updated = throughput[:, None] * response
+        converged = np.max(np.abs(updated - lengths)) < tolerance
+        lengths = updated
+        if converged:
+            break
+
+    response = response + delay
+    return {
+        "throughput": throughput,
+        "response": response,
+        "length": throughput[:, None] * response,
+    }
+
+
+def solve(
+    K: int,
+    process_time: float,
+    result_time: float,
+    nb_user: int,
+    promo_ratio: float = 0.7,
+    think_time: float | Dict[str, float] | None = None,
+    prepa_test_coeff: float = 1,
+    method: str = "schweitzer",
+) -> dict:
+    """
+    Métriques stationnaires de WaterfallMoulinetteInfinite vue comme un réseau fermé à deux classes
+    (ING, PREPA) : réflexion, K serveurs de test puis le serveur d'envoi.
+
+    Le modèle analytique suppose des services exponentiels (forme produit) et une population constante :
+    la simulation, à services constants et dont les utilisateurs partent après nb_exos exercices, s'en
+    écarte, surtout en fin de simulation. La limite de tags n'est pas modélisée.
+
+    :param promo_ratio: proportion d'ING (populations arrondies).
+    :param think_time: temps de réflexion moyen entre deux commits, commun ou par promo
+        (par défaut, mean_think_time()).
+    :param prepa_test_coeff: multiplicateur du temps de test des PREPA (2 pour ChannelsAndDams).
+    :param method: "exact" (exact_mva) ou "schweitzer" (schweitzer_mva).
+    :return: métriques aux noms de QueueMetrics.calculate_metrics (temps en unités de temps, avec
+        leur équivalent avg_ms en millisecondes, débit en commits par unité de temps).
+    """
+    if method not in ("exact", "schweitzer"):
+        raise ValueError(f"Unknown MVA method: {method}")
+    if think_time is None:
+        think_time = mean_think_time()
+    if not isinstance(think_time, dict):
+        think_time = {promo: think_time for promo in PROMOS}
+
+    ing = round(nb_user * promo_ratio)
+    populations = [ing, nb_user - ing]
+    think_times = [think_time[promo] for promo in PROMOS]
+    demands = np.array(
+        [[process_time, result_time], [process_time * prepa_test_coeff, result_time]]
+    )
+    mva = exact_mva if method == "exact" else schweitzer_mva
+    solution = mva(populations, think_times, demands, servers=[K, 1])
+
+    throughput = solution["throughput"]
+    response = solution["response"]
+    total = throughput.sum()
+    lengths = solution["length"].sum(axis=0)
+    utilization = throughput @ demands / np.array([K, 1])
+    # temps de séjour moyen d'un commit, toutes classes confondues (pondéré par les débits)
+    sojourns = throughput @ response / total if total > 0 else np.zeros(len(STATIONS))
+
+    def sojourn(value: float) -> dict:
+        return {"avg": float(value), "avg_ms": float(value * TIME_UNIT_MS)}
+
+    metrics = {
+        station: {
+            "avg_length": float(lengths[index]),
+            "avg_utilization": float(utilization[index]),
+        }
+        for index, station in enumerate(STATIONS)
+    }
+    metrics["sojourn_times"] = {
+        **{station: sojourn(sojourns[index]) for index, station in enumerate(STATIONS)},
+        "total": sojourn(sojourns.sum()),
+    }
+    metrics["sojourn_times_by_promo"] = {
+        promo: sojourn(response[index].sum()) for index, promo in enumerate(PROMOS)
+    }
+    metrics["throughput_by_promo"] = {
+        promo: float(throughput[index]) for index, promo in enumerate(PROMOS)
+    }
+    metrics["throughput"] = float(total)
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crible analytique (MVA) des configurations de WaterfallMoulinetteInfinite."
+    )
+    parser.add_argument("--K", type=int, nargs="+", default=[1, 2, 3, 5, 10])
+    parser.add_argument("--process-time", type=float, nargs="+", default=[1, 2])
+    parser.add_argument("--result-time", type=float, nargs="+", default=[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[65, 130, 300])
+    parser.add_argument("--promo-ratio", type=float, default=0.7)
+    parser.add_argument("--think-time", type=float, help="temps de réflexion moyen (unités de temps)")
+    parser.add_argument("--prepa-test-coeff", type=float, default=1)
+    parser.add_argument("--method", choices=("exact", "schweitzer"), default="schweitzer")
+    args = parser.parse_args()
+
+    for K, process_time, result_time, nb_user in itertools.product(
+        args.K, args.process_time, args.result_time, args.users
+    ):
+        metrics = solve(
+            K=K,
+            process_time=process_time,
+            result_time=result_time,
+            nb_user=nb_user,
+            promo_ratio=args.promo_ratio,
+            think_time=args.think_time,
+            prepa_test_coeff=args.prepa_test_coeff,
+            method=args.method,
+        )
+        config = {"K": K, "process_time": process_time, "result_time": result_time}
+        print(
+            f"U{nb_user} {json.dumps(config)}: throughput {metrics['throughput']:.4g},"
+            f" test utilization {metrics['test_queue']['avg_utilization']:.3f},"
+            f" result utilization {metrics['result_queue']['avg_utilization']:.3f},"
+            f" sojourn {metrics['sojourn_times']['total']['avg_ms']:.0f} ms"
+        )
@@ -0,0 +1,83 @@
+import random
+from typing import List
+
+import numpy as np
+
+from basics import Utilisateur, UserTable, TableUser
+from variates import BlockVariates, CommonRandomVariates, RandomVariates
+
+
+def generate_users_names(n: int):
+    """
+    Génère une liste de nom d'utilisateur.
+
+    :param n: nombre de nom à générer.
+    """
+
+    return ["USER" + str(i) for i in range(n)]
+
+
+def create_user_list(
+    names: List[str], promo_ratio=0.5, variates: RandomVariates | None = None
+) -> List[Utilisateur]:
+    """
+    Génère une liste de Utilisateur à partir de names avec une proportion (basée sur tirage aléatoire) de promo_ratio d'ING, et 1 - promo_ratio de PREPA
+
+    :param names: liste de nom d'utilisateur.
+    :param promo_ratio: proportion d'ING dans les utilisateurs
+    :param variates: source des tirages aléatoires (par défaut, le module random global).
+    """
+
+    variates = variates if variates is not None else RandomVariates()
+    users = []
+    for name in names:
+        promo = "ING" if variates.promo_draw() < promo_ratio else "PREPA"
+        users.append(
+            Utilisateur(name=name, promo=promo, intelligence=variates.intelligence())
+        )
+    return users
+
+
+def create_user_table(
+    nb_user: int, promo_ratio=0.5, variates: RandomVariates | None = None
+) -> List[TableUser]:
+    """
+    Équivalent compact de create_user_list : les utilisateurs USER0..USER{nb_user - 1} sont stockés
+    dans une UserTable (mêmes tirages aléatoires, dans le même ordre).
+
+    :param nb_user: nombre d'utilisateurs.
+    :param promo_ratio: proportion d'ING dans les utilisateurs
+    :param variates: source des tirages aléatoires (par défaut, le module random global).
+    """
+
+    variates = variates if variates is not None else RandomVariates()
+    table = UserTable(nb_user)
+    users = []
+    for _ in range(nb_user):
+        promo = "ING" if variates.promo_draw() < promo_ratio else "PREPA"
+        users.append(table.add(promo, intelligence=variates.intelligence()))
+    return users
+
+
+def make_variates(seed: int, crn: bool = False, block_variates: bool = False) -> RandomVariates:
+    """
+    Source des tirages aléatoires d'une simulation.
+
+    :param seed: graine de la simulation.
+    :param crn: nombres aléatoires communs (CommonRandomVariates).
+    :param block_variates: tirages par blocs numpy (BlockVariates) plutôt que le module random.
+    """
+    if crn:
+        return CommonRandomVariates(seed)
+    if block_variates:
+        return BlockVariates(seed)
+    return RandomVariates()
+
+
+def set_random_seed(seed: int = 42):
+    """
+    Set random seeds for reproducibility across all random number generators used in the simulation.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    return seed
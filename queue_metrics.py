@@ -1,55 +1,494 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from typing import Dict, List, Tuple
-from dataclasses import dataclass, field
+from typing import Dict, List, TextIO, Tuple
+from dataclasses import dataclass, field, fields
+
+
+class SeriesBuffer:
+    """
+    Growable typed series, read as a zero-copy NumPy view (amortized doubling).
+
+    Appended values are staged in a short list and copied to the array by
+    chunks, so appending costs about as much as a list append (`stage` skips
+    the chunk check: its caller flushes). With a
+    capacity, only the last `capacity` values are kept (ring mode): the
+    storage holds twice the capacity so the window stays contiguous, and it
+    is moved back to the front at most once every `capacity` values.
+    """
+
+    __slots__ = ("_data", "_start", "_end", "_pending", "capacity", "stage")
+
+    # staged values copied to the array at once
+    CHUNK = 256
+
+    def __init__(self, dtype=np.float64, capacity: int | None = None, size: int = 64):
+        self._data = np.empty(2 * capacity if capacity else size, dtype=dtype)
+        self._start = 0
+        self._end = 0
+        self._pending = []
+        self.capacity = capacity
+        self.stage = self._pending.append
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    @property
+    def array(self) -> np.ndarray:
+        """Read-only view of the stored values"""
+        self.flush()
+        view = self._data[self._start : self._end]
+        view.flags.writeable = False
+        return view
+
+    def _reserve(self, count: int):
+        """Make room for `count` more values at the end"""
+        if self._end + count <= len(self._data):
+            return
+        size = self._end - self._start
+        if self.capacity is None:
+            data = np.empty(max(2 * len(self._data), size + count), dtype=self.dtype)
+        else:
+            # ring: the window is moved back to the front of the same storage
+            data = self._data
+        data[:size] = self._data[self._start : self._end]
+        self._data, self._start, self._end = data, 0, size
+
+    def _store(self, values: np.ndarray):
+        if self.capacity is not None:
+            values = values[len(values) - min(len(values), self.capacity) :]
+        self._reserve(len(values))
+        self._data[self._end : self._end + len(values)] = values
+        self._end += len(values)
+        if self.capacity is not None:
+            self._start = max(self._start, self._end - self.capacity)
+
+    def flush(self):
+        """Copy the staged values to the array"""
+        if self._pending:
+            self._store(np.asarray(self._pending, dtype=self.dtype))
+            self._pending.clear()
+
+    def append(self, value):
+        self.stage(value)
+        if len(self._pending) >= self.CHUNK:
+            self.flush()
+
+    def extend(self, values):
+        self.flush()
+        self._store(np.asarray(values, dtype=self.dtype))
+
+    def pop(self):
+        if self._pending:
+            return self._pending.pop()
+        if self._end == self._start:
+            raise IndexError("pop from empty series")
+        self._end -= 1
+        return self._data[self._end]
+
+    def tolist(self) -> list:
+        return self.array.tolist()
+
+    def __len__(self) -> int:
+        size = self._end - self._start + len(self._pending)
+        return size if self.capacity is None else min(size, self.capacity)
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        view = self.array
+        if dtype is not None and dtype != view.dtype:
+            return view.astype(dtype)
+        return view.copy() if copy else view
+
+    def __repr__(self) -> str:
+        return f"SeriesBuffer({self.tolist()!r}, dtype={self.dtype})"
+
+
+class CommitTable:
+    """
+    One row per commit admitted to the test queue, with an integer commit id
+    (the row index) and fixed typed columns. Event times are NaN until the
+    event happens.
+    """
+
+    PROMOS = ("ING", "PREPA")
+    PROMO_CODES = {promo: code for code, promo in enumerate(PROMOS)}
+    COLUMNS = {
+        "user": np.int32,
+        "promo": np.int8,
+        "exo": np.int16,
+        "test_enter": np.float64,
+        "test_exit": np.float64,
+        "result_enter": np.float64,
+        "result_exit": np.float64,
+        "backup": np.bool_,
+    }
+
+    def __init__(self, size: int = 256):
+        self._data = {name: self._empty(name, size) for name in self.COLUMNS}
+        self.size = 0
+        # -> incremented on every change (cache of the derived arrays)
+        self.version = 0
+        self._cache = {}
+
+    def _empty(self, name: str, size: int) -> np.ndarray:
+        dtype = self.COLUMNS[name]
+        fill = np.nan if dtype is np.float64 else 0
+        return np.full(size, fill, dtype=dtype)
+
+    def _reserve(self, count: int):
+        capacity = len(self._data["user"])
+        if self.size + count <= capacity:
+            return
+        capacity = max(2 * capacity, self.size + count)
+        for name, column in self._data.items():
+            grown = self._empty(name, capacity)
+            grown[: self.size] = column[: self.size]
+            self._data[name] = grown
+
+    def add(self, user: int, promo: str, exo: int, time: float) -> int:
+        """Add a commit entering the test queue, return its id"""
+        self._reserve(1)
+        commit_id = self.size
+        data = self._data
+        data["user"][commit_id] = user
+        data["promo"][commit_id] = self.PROMO_CODES[promo]
+        data["exo"][commit_id] = exo
+        data["test_enter"][commit_id] = time
+        self.size += 1
+        self.version += 1
+        return commit_id
+
+    def add_many(self, users, promo_codes, exos, time: float) -> np.ndarray:
+        """Add several commits entering the test queue at once, return their ids"""
+        count = len(users)
+        self._reserve(count)
+        ids = np.arange(self.size, self.size + count)
+        data = self._data
+        data["user"][ids] = users
+        data["promo"][ids] = promo_codes
+        data["exo"][ids] = exos
+        data["test_enter"][ids] = time
+        self.size += count
+        self.version += 1
+        return ids
+
+    def set(self, name: str, commit_ids, value):
+        """Set a column for one commit id or an array of ids"""
+        self._data[name][commit_ids] = value
+        self.version += 1
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only view of a column"""
+        view = self._data[name][: self.size]
+        view.flags.writeable = False
+        return view
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {name: self.column(name) for name in self.COLUMNS}
+
+    def cached(self, name: str, compute):
+        """Value derived from the table by `compute()`, computed once per table version"""
+        version, value = self._cache.get(name, (None, None))
+        if version != self.version:
+            value = compute()
+            self._cache[name] = (self.version, value)
+        return value
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray]) -> "CommitTable":
+        size = len(columns["user"])
+        table = cls(max(size, 1))
+        for name in cls.COLUMNS:
+            table._data[name][:size] = columns[name]
+        table.size = size
+        return table
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class RunningStats:
+    """
+    Online mean, variance, min and max of a stream of values (weighted Welford
+    update), with an optional bounded histogram for the quantiles.
+    """
+
+    __slots__ = ("count", "weight", "mean", "m2", "min", "max", "histogram")
+
+    def __init__(self, histogram: bool = False):
+        self.count = 0
+        self.weight = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.histogram = StreamingHistogram() if histogram else None
+
+    def add(self, value: float, weight: float = 1.0):
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if self.histogram is not None:
+            self.histogram.add(value)
+        if weight <= 0:
+            return
+        self.weight += weight
+        delta = value - self.mean
+        self.mean += delta * weight / self.weight
+        self.m2 += weight * delta * (value - self.mean)
+
+    def copy(self) -> "RunningStats":
+        other = RunningStats()
+        for slot in self.__slots__:
+            setattr(other, slot, getattr(self, slot))
+        return other
+
+    @property
+    def var(self) -> float:
+        return self.m2 / self.weight if self.weight > 0 else 0.0
+
+    def distribution(self) -> dict:
+        """Same keys as QueueMetrics._distribution"""
+        if self.count == 0:
+            return {"avg": 0, "var": 0, "min": 0, "max": 0, "p95": 0}
+        return {
+            "avg": self.mean,
+            "var": self.var,
+            "min": self.min,
+            "max": self.max,
+            "p95": self.histogram.quantile(0.95) if self.histogram is not None else np.nan,
+        }
+
+
+class StreamingHistogram:
+    """
+    Histogram of non-negative values with a fixed number of bins: when a value
+    falls past the last bin, adjacent bins are merged and the width doubles.
+    Quantiles are exact for integer values while the width is 1.
+    """
+
+    __slots__ = ("counts", "width")
+
+    def __init__(self, bins: int = 2048, width: float = 1.0):
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.width = width
+
+    def add(self, value: float):
+        index = int(max(value, 0) // self.width)
+        while index >= len(self.counts):
+            half = len(self.counts) // 2
+            self.counts[:half] = self.counts.reshape(half, 2).sum(axis=1)
+            self.counts[half:] = 0
+            self.width *= 2
+            index = int(max(value, 0) // self.width)
+        self.counts[index] += 1
+
+    def quantile(self, q: float) -> float:
+        """Quantile with the linear interpolation of np.percentile (bins at their left edge)"""
+        cumulative = np.cumsum(self.counts)
+        total = cumulative[-1]
+        if total == 0:
+            return 0.0
+        rank = q * (total - 1)
+        low, high = np.searchsorted(cumulative, [np.floor(rank), np.ceil(rank)], side="right")
+        return float(low * self.width + (rank - np.floor(rank)) * (high - low) * self.width)
+
+
+class MetricsStream:
+    """
+    Constant-memory statistics of a run (QueueMetrics streaming mode): the
+    states and sojourn times are folded into running statistics instead of
+    being stored. Only the commits still in the system are kept.
+    """
+
+    # state series summarized (index in the values given to record_state)
+    STATE_SERIES = (
+        "test_queue_lengths",
+        "test_server_utilization",
+        "result_queue_lengths",
+        "result_server_utilization",
+        "backup_length",
+    )
+
+    def __init__(self):
+        self.states = {name: RunningStats() for name in self.STATE_SERIES}
+        # last state, weighted once the next one is known: (time, values)
+        self.pending = None
+        self.first_time = None
+        self.next_id = 0
+        # commit id -> [test entry time, result entry time, promo]
+        self.in_flight: Dict[int, list] = {}
+        self.sojourns = {
+            name: RunningStats(histogram=True)
+            for name in ("test_queue", "result_queue", "total") + CommitTable.PROMOS
+        }
+        self.ing_blocked = RunningStats()
+
+    def record_state(self, time: float, values: tuple, event_driven: bool):
+        if self.pending is not None:
+            self._add_state(self.pending[1], time - self.pending[0] if event_driven else 1)
+        elif self.first_time is None:
+            self.first_time = time
+        self.pending = (time, values)
+
+    def _add_state(self, values: tuple, weight: float):
+        for stats, value in zip(self.states.values(), values):
+            stats.add(value, weight)
+
+    def drop_state(self):
+        self.pending = None
+
+    def state_stats(self, event_driven: bool) -> Dict[str, RunningStats]:
+        """Statistics including the last state (which holds for no time in event-driven mode)"""
+        states = {}
+        for index, (name, stats) in enumerate(self.states.items()):
+            final = stats.copy()
+            if self.pending is not None:
+                final.add(self.pending[1][index], 0 if event_driven else 1)
+                if final.weight == 0:
+                    # run of null duration: plain mean of the states
+                    final.mean = self.pending[1][index]
+            states[name] = final
+        return states
+
+    @property
+    def last_time(self) -> float | None:
+        return self.pending[0] if self.pending is not None else None
+
+    # === commits
+
+    def enter_test(self, promo: str, time: float) -> int:
+        commit_id = self.next_id
+        self.next_id += 1
+        self.in_flight[commit_id] = [time, None, promo]
+        return commit_id
+
+    def exit_test(self, commit_id: int, time: float):
+        self.sojourns["test_queue"].add(time - self.in_flight[commit_id][0])
+
+    def enter_result(self, commit_id: int, time: float):
+        self.in_flight[commit_id][1] = time
+
+    def exit_result(self, commit_id: int, time: float):
+        test_enter, result_enter, promo = self.in_flight.pop(commit_id)
+        if result_enter is not None:
+            self.sojourns["result_queue"].add(time - result_enter)
+        self.sojourns["total"].add(time - test_enter)
+        self.sojourns[promo].add(time - test_enter)
+
+    def forget(self, commit_id: int):
+        self.in_flight.pop(commit_id, None)
+
+
+def _ids(commit_id) -> list:
+    """Commit ids of a record (one id or an array of ids)"""
+    return commit_id.tolist() if isinstance(commit_id, np.ndarray) else [commit_id]
+
+
+# samples drawn per curve by plot_metrics (the full-width panels are ~5000 px wide at 300 dpi)
+DEFAULT_MAX_POINTS = 4000
+
+
+def downsample(max_points: int | None, *series) -> np.ndarray | slice:
+    """
+    Indices of the samples to draw so that each series keeps its envelope:
+    the min and the max of each of max_points // 2 buckets (and both ends).
+    All the series of a plot share the indices (union of their extremes).
+    """
+    size = len(series[0])
+    if max_points is None or size <= max_points:
+        return slice(None)
+    bucket = -(-size // max(1, max_points // 2))
+    starts = np.arange(0, size, bucket)
+    keep = [np.array([0, size - 1])]
+    for values in series:
+        values = np.asarray(values, dtype=float)
+        # padded with the last value to reshape into (buckets, bucket)
+        padded = np.concatenate([values, np.full(len(starts) * bucket - size, values[-1])])
+        padded = padded.reshape(-1, bucket)
+        keep += [starts + padded.argmin(axis=1), starts + padded.argmax(axis=1)]
+    return np.unique(np.minimum(np.concatenate(keep), size - 1))
+
+
+def _series(dtype) -> SeriesBuffer:
+    return field(default_factory=lambda: SeriesBuffer(dtype))
+
 
 @dataclass
 class QueueMetrics:
     """Store metrics queue system with two queues"""
 
     # ===== Time series data =====
-    timestamps: List[float] = field(default_factory=list)
+    timestamps: SeriesBuffer = _series(np.float64)
 
     # ===== Test queue metrics =====
     # -> number of users waiting in the test queue at each timestamp
-    test_queue_lengths: List[int] = field(default_factory=list)
+    test_queue_lengths: SeriesBuffer = _series(np.int32)
     # -> percentage of test servers being used at each timestamp (0.0 to 1.0)
-    test_server_utilization: List[float] = field(default_factory=list)
+    test_server_utilization: SeriesBuffer = _series(np.float64)
     # -> number of users currently being processed by test servers
-    test_server_count: List[int] = field(default_factory=list)
+    test_server_count: SeriesBuffer = _series(np.int32)
     # -> number of blocked test request by test servers at each timestamp
-    test_queue_blocked_times: List[float] = field(default_factory=list)
+    test_queue_blocked_times: SeriesBuffer = _series(np.float64)
 
     # ===== Result queue metrics =====
     # -> number of users waiting in the result queue at each timestamp
-    result_queue_lengths: List[int] = field(default_factory=list)
+    result_queue_lengths: SeriesBuffer = _series(np.int32)
     # -> percentage of result servers being used at each timestamp (0.0 to 1.0)
-    result_server_utilization: List[float] = field(default_factory=list)
+    result_server_utilization: SeriesBuffer = _series(np.float64)
     # -> number of users currently being processed by result servers
-    result_server_count: List[int] = field(default_factory=list)
+    result_server_count: SeriesBuffer = _series(np.int32)
     # -> number of blocked result request by result servers at each timestamp
-    result_queue_blocked_times: List[float] = field(default_factory=list)
+    result_queue_blocked_times: SeriesBuffer = _series(np.float64)
 
     # ===== System-wide metrics =====
     # -> total number of users in the entire system at each timestamp
-    system_clients: List[int] = field(default_factory=list)
+    system_clients: SeriesBuffer = _series(np.int32)
     # -> backup length (results accumulation)
-    backup_length: List[int] = field(default_factory=list)
-
-    # ===== Timing tracking for each queue =====
-    # -> used to calculate time spent waiting for testing
-    test_queue_entry_times: Dict[str, float] = field(default_factory=dict)
-    # -> used with entry times to calculate test queue sojourn time
-    test_queue_exit_times: Dict[str, float] = field(default_factory=dict)
-    # -> used to calculate time spent waiting for results
-    result_queue_entry_times: Dict[str, float] = field(default_factory=dict)
-    # -> used with entry times to calculate results queue sojourn time
-    result_queue_exit_times: Dict[str, float] = field(default_factory=dict)
+    backup_length: SeriesBuffer = _series(np.int32)
+
+    # ===== ING regulation (Channels & Dams) =====
+    # -> time each blocked ING user waited for the dam to open
+    ing_blocked_durations: SeriesBuffer = _series(np.float64)
+
+    # ===== Timing tracking for each commit =====
+    # -> test/result queue entry and exit times, indexed by commit id
+    commits: CommitTable = field(default_factory=CommitTable)
 
     # ===== General =====
     test_queue_blocked: int = 0
     result_queue_blocked: int = 0
     total_requests: int = 0
+    # -> if True, series only hold the instants where the state changed
+    #    (each value holds until the next timestamp)
+    event_driven: bool = False
+    # -> if set, the state series only keep their last `series_capacity` records
+    #    (ring buffers, for long runs); the summary then covers that window only
+    series_capacity: int | None = None
+    # -> if True, the total sojourn time histogram is split by promo
+    promo_breakdown: bool = False
+    # -> if True, only running statistics are kept (constant memory, no plots):
+    #    the series and the commit table stay empty
+    streaming: bool = False
+
+    def __post_init__(self):
+        # last recorded state (time and counts), compared in event-driven mode
+        self._last_state = None
+        self._stream = MetricsStream() if self.streaming else None
+        self._staged = 0
+        if self.series_capacity is not None:
+            for name in self.state_series_names():
+                series = getattr(self, name)
+                ring = SeriesBuffer(series.dtype, capacity=self.series_capacity)
+                ring.extend(series)
+                setattr(self, name, ring)
 
     def record_state(
         self,
@@ -63,43 +502,265 @@ class QueueMetrics:
         result_server_utilization: float,
     ):
         """Record system state at a given time"""
-        self.timestamps.append(env_time)
+        state = (test_agents, test_queue_length, backup_length, result_agents, result_queue_length)
+        if self.event_driven and self._last_state is not None:
+            last_time, last_state = self._last_state
+            # only the last state of an instant is kept
+            if last_time == env_time:
+                self._pop_state()
+            elif last_state == state:
+                return
+        self._last_state = (env_time, state)
+
+        if self._stream is not None:
+            self._stream.record_state(
+                env_time,
+                (
+                    test_queue_length,
+                    test_server_utilization,
+                    result_queue_length,
+                    result_server_utilization,
+                    backup_length,
+                ),
+                self.event_driven,
+            )
+            return
+
+        # values are staged, then copied to the arrays by chunks
+        self.timestamps.stage(env_time)
 
         # test queue
-        self.test_server_count.append(test_agents)
-        self.test_queue_lengths.append(test_queue_length)
-        self.test_server_utilization.append(test_server_utilization)
+        self.test_server_count.stage(test_agents)
+        self.test_queue_lengths.stage(test_queue_length)
+        self.test_server_utilization.stage(test_server_utilization)
 
         # backup
-        self.backup_length.append(backup_length)
+        self.backup_length.stage(backup_length)
 
         # result queue
-        self.result_server_count.append(result_agents)
-        self.result_queue_lengths.append(result_queue_length)
-        self.result_server_utilization.append(result_server_utilization)
+        self.result_server_count.stage(result_agents)
+        self.result_queue_lengths.stage(result_queue_length)
+        self.result_server_utilization.stage(result_server_utilization)
 
         # Total users in the system
-        self.system_clients.append(
+        self.system_clients.stage(
             test_agents + result_agents + test_queue_length + result_queue_length
         )
 
+        self._staged += 1
+        if self._staged >= SeriesBuffer.CHUNK:
+            self._staged = 0
+            for series in self._state_series():
+                series.flush()
+
+    def _pop_state(self):
+        """Remove the last recorded state"""
+        if self._stream is not None:
+            return self._stream.drop_state()
+        for series in self._state_series():
+            series.pop()
+
+    @staticmethod
+    def state_series_names() -> List[str]:
+        """Names of the series filled by record_state (one value per timestamp)"""
+        return [
+            "timestamps",
+            "test_server_count",
+            "test_queue_lengths",
+            "test_server_utilization",
+            "backup_length",
+            "result_server_count",
+            "result_queue_lengths",
+            "result_server_utilization",
+            "system_clients",
+        ]
+
+    def _state_series(self) -> List[SeriesBuffer]:
+        """All series filled by record_state"""
+        return [getattr(self, name) for name in self.state_series_names()]
+
+    def _time_weights(self) -> np.ndarray | None:
+        """Duration each recorded state holds (event-driven mode only)"""
+        if not self.event_driven or len(self.timestamps) < 2:
+            return None
+        weights = np.diff(self.timestamps.array, append=self.timestamps[-1])
+        return weights if weights.sum() > 0 else None
+
+    def _series_mean_var(self, values: list) -> Tuple[float, float]:
+        """Mean and variance of a series, time-weighted in event-driven mode"""
+        weights = self._time_weights()
+        if weights is None:
+            return np.mean(values), np.var(values)
+        values = np.asarray(values, dtype=float)
+        mean = np.average(values, weights=weights)
+        return mean, np.average((values - mean) ** 2, weights=weights)
+
+    def resample(self, step: float = 1) -> "QueueMetrics":
+        """
+        Rebuild the regularly sampled series (one state every `step` time units)
+        from event-driven records. Entry/exit and blocking records are shared.
+        """
+        if not self.event_driven or not self.timestamps:
+            return self
+
+        timestamps = self.timestamps.array
+        sample_times = np.arange(timestamps[0], max(timestamps[-1], timestamps[0] + step), step)
+        # index of the state in force at each sample time
+        idx = np.searchsorted(timestamps, sample_times, side="right") - 1
+
+        sampled = QueueMetrics(
+            test_queue_blocked_times=self.test_queue_blocked_times,
+            result_queue_blocked_times=self.result_queue_blocked_times,
+            ing_blocked_durations=self.ing_blocked_durations,
+            commits=self.commits,
+            test_queue_blocked=self.test_queue_blocked,
+            result_queue_blocked=self.result_queue_blocked,
+            total_requests=self.total_requests,
+            series_capacity=self.series_capacity,
+            promo_breakdown=self.promo_breakdown,
+        )
+        sampled.timestamps.extend(sample_times)
+        for source, target in zip(self._state_series()[1:], sampled._state_series()[1:]):
+            target.extend(source.array[idx])
+        return sampled
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Raw records as flat arrays: one per series and scalar field, and one
+        per commit table column ("commits.<column>"). See from_arrays.
+        """
+        arrays = {}
+        for item in fields(self):
+            value = getattr(self, item.name)
+            if isinstance(value, CommitTable):
+                for name, column in value.columns().items():
+                    arrays[f"{item.name}.{name}"] = column
+            elif item.name not in ("event_driven", "series_capacity"):
+                arrays[item.name] = np.asarray(value)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, event_driven: bool = False) -> "QueueMetrics":
+        """
+        Rebuild the metrics from the arrays of to_arrays (any mapping, e.g. an
+        NpzFile); missing arrays are left empty.
+        """
+        metrics = cls(event_driven=event_driven)
+        for item in fields(cls):
+            value = getattr(metrics, item.name)
+            if isinstance(value, CommitTable):
+                columns = {
+                    name: arrays[f"{item.name}.{name}"] for name in CommitTable.COLUMNS
+                }
+                setattr(metrics, item.name, CommitTable.from_columns(columns))
+            elif item.name not in arrays:
+                continue
+            elif isinstance(value, SeriesBuffer):
+                value.extend(arrays[item.name])
+            else:
+                setattr(metrics, item.name, np.asarray(arrays[item.name]).item())
+        return metrics
+
     # === entry / exit
-    def record_test_queue_entry(self, user_id: str, time: float):
-        """Record entry to test queue"""
-        self.test_queue_entry_times[user_id] = time
+    def record_test_queue_entry(self, user: int, promo: str, exo: int, time: float) -> int:
+        """Record entry to test queue, return the commit id used by the other records"""
         self.total_requests += 1
+        if self._stream is not None:
+            return self._stream.enter_test(promo, time)
+        return self.commits.add(user, promo, exo, time)
+
+    def record_test_queue_entries(self, users, promo_codes, exos, time: float) -> np.ndarray:
+        """Record entries to test queue of several commits at once (see CommitTable.PROMO_CODES)"""
+        self.total_requests += len(users)
+        if self._stream is not None:
+            return np.array(
+                [self._stream.enter_test(CommitTable.PROMOS[code], time) for code in promo_codes],
+                dtype=np.int64,
+            )
+        return self.commits.add_many(users, promo_codes, exos, time)
 
-    def record_test_queue_exit(self, user_id: str, time: float):
-        """Record exit from test queue"""
-        self.test_queue_exit_times[user_id] = time
-
-    def record_result_queue_entry(self, user_id: str, time: float):
-        """Record entry to result queue"""
-        self.result_queue_entry_times[user_id] = time
+    # the exit/entry records below take a commit id or an array of ids
 
-    def record_result_queue_exit(self, user_id: str, time: float):
+    def record_test_queue_exit(self, commit_id, time: float):
+        """Record exit from test queue"""
+        if self._stream is not None:
+            for commit in _ids(commit_id):
+                self._stream.exit_test(commit, time)
+            return
+        self.commits.set("test_exit", commit_id, time)
+
+    def record_result_queue_entry(self, commit_id, time: float, backup: bool = False):
+        """Record entry to result queue (from the backup if `backup`)"""
+        if self._stream is not None:
+            for commit in _ids(commit_id):
+                self._stream.enter_result(commit, time)
+            return
+        self.commits.set("result_enter", commit_id, time)
+        if backup:
+            self.commits.set("backup", commit_id, True)
+
+    def record_result_queue_exit(self, commit_id, time: float):
         """Record exit from result queue"""
-        self.result_queue_exit_times[user_id] = time
+        if self._stream is not None:
+            for commit in _ids(commit_id):
+                self._stream.exit_result(commit, time)
+            return
+        self.commits.set("result_exit", commit_id, time)
+
+    def sojourn_times(self) -> Dict[str, np.ndarray]:
+        """
+        Sojourn times of the commits, in commit order: "test_queue",
+        "result_queue", "total" and the total time of each promo ("ING", ...).
+        Computed once per state of the commit table.
+        """
+        return self.commits.cached("sojourns", self._compute_sojourn_times)
+
+    def _compute_sojourn_times(self) -> Dict[str, np.ndarray]:
+        columns = self.commits.columns()
+        test = columns["test_exit"] - columns["test_enter"]
+        result = columns["result_exit"] - columns["result_enter"]
+        total = columns["result_exit"] - columns["test_enter"]
+        done = ~np.isnan(total)
+        sojourns = {
+            "test_queue": test[~np.isnan(test)],
+            "result_queue": result[~np.isnan(result)],
+            "total": total[done],
+        }
+        for code, promo in enumerate(CommitTable.PROMOS):
+            sojourns[promo] = total[done & (columns["promo"] == code)]
+        return sojourns
+
+    def job_counts(self, times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Number of commits that entered the test queue (attempted) and left the
+        result queue (completed) up to each time, by binary search in the
+        sorted entry and exit times (sorted once per state of the commit table).
+        """
+        entries, exits = self.commits.cached("sorted_times", self._sorted_times)
+        attempted = np.searchsorted(entries, times, side="right")
+        completed = np.searchsorted(exits, times, side="right")
+        return attempted, completed
+
+    def _sorted_times(self) -> Tuple[np.ndarray, np.ndarray]:
+        exits = self.commits.column("result_exit")
+        return np.sort(self.commits.column("test_enter")), np.sort(exits[~np.isnan(exits)])
+
+    @staticmethod
+    def blocked_counts(blocked_times, times: np.ndarray, window: int) -> np.ndarray:
+        """
+        Number of distinct integer instants with a blocking in [t - window, t)
+        for each (integer) time t, from the cumulative count of those instants.
+        """
+        times = np.asarray(times).astype(np.int64)
+        blocked = np.asarray(blocked_times, dtype=float)
+        blocked = blocked[(blocked >= 0) & (blocked == np.floor(blocked))].astype(np.int64)
+        size = max(int(times.max(initial=0)), int(blocked.max(initial=0))) + 1
+        # cumulative[i]: number of blocking instants before i
+        cumulative = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(blocked, minlength=size) > 0, out=cumulative[1:])
+        ends = np.clip(times, 0, size)
+        starts = np.clip(times - window, 0, size)
+        return np.maximum(cumulative[ends] - cumulative[starts], 0)
 
     # ===
 
@@ -107,26 +768,107 @@ class QueueMetrics:
     def record_test_queue_blocked(self, time: float):
         """Record blocked request in test queue"""
         self.test_queue_blocked += 1
-        self.test_queue_blocked_times.append(time)
+        if self._stream is None:
+            self.test_queue_blocked_times.append(time)
+
+    def record_result_queue_blocked(self, time: float, commit_id=None):
+        """Record blocked request in result queue
 
-    def record_result_queue_blocked(self, time: float):
-        """Record blocked request in result queue"""
+        commit_id: id of the refused commit when it leaves the system (not kept
+        in a backup), forgotten in streaming mode
+        """
         self.result_queue_blocked += 1
+        if self._stream is not None:
+            if commit_id is not None:
+                self._stream.forget(commit_id)
+            return
         self.result_queue_blocked_times.append(time)
 
+    def record_ing_blocked(self, start: float, end: float):
+        """Record the time an ING user was held by the dam"""
+        if self._stream is not None:
+            return self._stream.ing_blocked.add(end - start)
+        self.ing_blocked_durations.append(end - start)
+
     # ===
 
+    @staticmethod
+    def _distribution(values: np.ndarray) -> dict:
+        """Summary statistics of sojourn times"""
+        if len(values) == 0:
+            return {"avg": 0, "var": 0, "min": 0, "max": 0, "p95": 0}
+        return {
+            "avg": np.mean(values),
+            "var": np.var(values),
+            "min": np.min(values),
+            "max": np.max(values),
+            "p95": np.percentile(values, 95),
+        }
+
+    def _streaming_metrics(self) -> dict:
+        """calculate_metrics from the running statistics (streaming mode)"""
+        stream = self._stream
+        states = stream.state_stats(self.event_driven)
+        blocking_rates = [
+            blocked / self.total_requests if self.total_requests > 0 else 0
+            for blocked in (self.test_queue_blocked, self.result_queue_blocked)
+        ]
+        metrics = {}
+        for queue, blocking_rate in zip(("test_queue", "result_queue"), blocking_rates):
+            lengths = states[f"{queue}_lengths"]
+            utilization = states[f"{queue[: -len('_queue')]}_server_utilization"]
+            metrics[queue] = {
+                "avg_length": lengths.mean,
+                "var_length": lengths.var,
+                "max_length": lengths.max,
+                "avg_utilization": utilization.mean,
+                "var_utilization": utilization.var,
+                "blocking_rate": blocking_rate,
+            }
+        backup = states["backup_length"]
+        metrics["backup"] = {
+            "avg_length": backup.mean,
+            "var_length": backup.var,
+            "max_length": backup.max,
+        }
+        ing = stream.ing_blocked
+        metrics["ing_regulation"] = {
+            "blocked_count": ing.count,
+            "total_blocked_time": ing.mean * ing.weight,
+            "avg_blocked_time": ing.mean,
+        }
+        metrics["sojourn_times"] = {
+            queue: stream.sojourns[queue].distribution()
+            for queue in ("test_queue", "result_queue", "total")
+        }
+        metrics["sojourn_times_by_promo"] = {
+            promo: {"count": stream.sojourns[promo].count, **stream.sojourns[promo].distribution()}
+            for promo in CommitTable.PROMOS
+        }
+        total_time = (
+            stream.last_time - stream.first_time if stream.first_time is not None else 0
+        )
+        completed_requests = stream.sojourns["total"].count
+        metrics["throughput"] = completed_requests / total_time if total_time > 0 else 0
+        return metrics
+
     def calculate_metrics(self) -> dict:
         """Calculate all metrics"""
+        if self._stream is not None:
+            return self._streaming_metrics()
         metrics = {}
 
         # Test queue metrics
+        avg_length, var_length = self._series_mean_var(self.test_queue_lengths)
+        avg_utilization, var_utilization = self._series_mean_var(
+            self.test_server_utilization
+        )
         metrics["test_queue"] = {
-            "avg_length": np.mean(self.test_queue_lengths),
-            "var_length": np.var(self.test_queue_lengths),
+            "avg_length": avg_length,
+            "var_length": var_length,
             "max_length": np.max(self.test_queue_lengths),
-            "avg_utilization": np.mean(self.test_server_utilization),
-            "var_utilization": np.var(self.test_server_utilization),
+            "avg_utilization": avg_utilization,
+            "var_utilization": var_utilization,
             "blocking_rate": (
                 self.test_queue_blocked / self.total_requests
                 if self.total_requests > 0
@@ -135,12 +877,16 @@ class QueueMetrics:
         }
 
         # Result queue metrics
+        avg_length, var_length = self._series_mean_var(self.result_queue_lengths)
+        avg_utilization, var_utilization = self._series_mean_var(
+            self.result_server_utilization
+        )
         metrics["result_queue"] = {
-            "avg_length": np.mean(self.result_queue_lengths),
-            "var_length": np.var(self.result_queue_lengths),
+            "avg_length": avg_length,
+            "var_length": var_length,
             "max_length": np.max(self.result_queue_lengths),
-            "avg_utilization": np.mean(self.result_server_utilization),
-            "var_utilization": np.var(self.result_server_utilization),
+            "avg_utilization": avg_utilization,
+            "var_utilization": var_utilization,
             "blocking_rate": (
                 self.result_queue_blocked / self.total_requests
                 if self.total_requests > 0
@@ -148,71 +894,40 @@ class QueueMetrics:
             ),
         }
 
-        # Calculate sojourn times for each queue
-        test_sojourn_times = []
-        result_sojourn_times = []
-        total_sojourn_times = []
-
-        for user_id in self.test_queue_entry_times:
-            # test-queue sojourn time
-            if user_id in self.test_queue_exit_times:
-                test_time = (
-                    self.test_queue_exit_times[user_id]
-                    - self.test_queue_entry_times[user_id]
-                )
-                test_sojourn_times.append(test_time)
-
-            # result-queue sojourn time
-            if (
-                user_id in self.result_queue_entry_times
-                and user_id in self.result_queue_exit_times
-            ):
-                result_time = (
-                    self.result_queue_exit_times[user_id]
-                    - self.result_queue_entry_times[user_id]
-                )
-                result_sojourn_times.append(result_time)
-
-            # total system sojourn time
-            if user_id in self.result_queue_exit_times:
-                total_time = (
-                    self.result_queue_exit_times[user_id]
-                    - self.test_queue_entry_times[user_id]
-                )
-                total_sojourn_times.append(total_time)
+        # Backup metrics
+        avg_backup, var_backup = self._series_mean_var(self.backup_length)
+        metrics["backup"] = {
+            "avg_length": avg_backup,
+            "var_length": var_backup,
+            "max_length": np.max(self.backup_length),
+        }
+
+        # ING regulation metrics
+        metrics["ing_regulation"] = {
+            "blocked_count": len(self.ing_blocked_durations),
+            "total_blocked_time": np.sum(self.ing_blocked_durations),
+            "avg_blocked_time": (
+                np.mean(self.ing_blocked_durations) if self.ing_blocked_durations else 0
+            ),
+        }
+
+        # Sojourn times for each queue
+        sojourns = self.sojourn_times()
 
         # Add sojourn time metrics
         metrics["sojourn_times"] = {
-            "test_queue": {
-                "avg": np.mean(test_sojourn_times) if test_sojourn_times else 0,
-                "var": np.var(test_sojourn_times) if test_sojourn_times else 0,
-                "min": np.min(test_sojourn_times) if test_sojourn_times else 0,
-                "max": np.max(test_sojourn_times) if test_sojourn_times else 0,
-            },
-            "result_queue": {
-                "avg": np.mean(result_sojourn_times) if result_sojourn_times else 0,
-                "var": np.var(result_sojourn_times) if result_sojourn_times else 0,
-                "min": np.min(result_sojourn_times) if result_sojourn_times else 0,
-                "max": np.max(result_sojourn_times) if result_sojourn_times else 0,
-            },
-            "total": {
-                "avg": np.mean(total_sojourn_times) if total_sojourn_times else 0,
-                "var": np.var(total_sojourn_times) if total_sojourn_times else 0,
-                "min": np.min(total_sojourn_times) if total_sojourn_times else 0,
-                "max": np.max(total_sojourn_times) if total_sojourn_times else 0,
-            },
+            queue: self._distribution(sojourns[queue])
+            for queue in ("test_queue", "result_queue", "total")
+        }
+        metrics["sojourn_times_by_promo"] = {
+            promo: {"count": len(sojourns[promo]), **self._distribution(sojourns[promo])}
+            for promo in CommitTable.PROMOS
         }
 
         # /!\ effective throughput
         if self.timestamps:
             total_time = self.timestamps[-1] - self.timestamps[0]
-            completed_requests = len(
-                [
-                    uid
-                    for uid in self.test_queue_entry_times
-                    if uid in self.result_queue_exit_times
-                ]
-            )
+            completed_requests = len(sojourns["total"])
             metrics["throughput"] = (
                 completed_requests / total_time if total_time > 0 else 0
             )
@@ -221,26 +936,53 @@ class QueueMetrics:
 
         return metrics
 
-    def plot_metrics(self, save_filename: str = "metrics.png"):
-        """Generate improved plots for all metrics with better visual separation"""
-        fig = plt.figure(figsize=(20, 15))
+    def plot_metrics(
+        self,
+        save_filename: str = "metrics.png",
+        log: TextIO | None = None,
+        max_points: int | None = DEFAULT_MAX_POINTS,
+    ):
+        """Generate improved plots for all metrics with better visual separation
+
+        log: stream for the progress messages (default: standard output)
+        max_points: samples drawn per curve, longer series are downsampled
+            (min/max per bucket, see downsample); None draws every sample
+        """
+        if self._stream is not None:
+            print(f"\n=== PLOTS: {save_filename} skipped (streaming mode keeps no series) ===", file=log)
+            return
+        if self.event_driven:
+            return self.resample().plot_metrics(
+                save_filename=save_filename, log=log, max_points=max_points
+            )
+
+        # imported here: simulations that do not plot never load matplotlib,
+        # and the figure does not depend on the pyplot backend (headless)
+        from matplotlib.figure import Figure
+
+        timestamps = self.timestamps.array
+        test_lengths = self.test_queue_lengths.array
+        result_lengths = self.result_queue_lengths.array
+
+        fig = Figure(figsize=(20, 15))
         gs = fig.add_gridspec(6, 2, hspace=0.6, wspace=0.3)
-        print(f"\n=== PLOTS: {save_filename} ===")
+        print(f"\n=== PLOTS: {save_filename} ===", file=log)
 
         color_test = "#2ecc71"
         color_result = "#e74c3c"
 
         # 1
         ax1 = fig.add_subplot(gs[0, :])
+        idx = downsample(max_points, test_lengths, result_lengths)
         ax1.plot(
-            self.timestamps,
-            self.test_queue_lengths,
+            timestamps[idx],
+            test_lengths[idx],
             label="Test q.",
             color=color_test,
         )
         ax1.plot(
-            self.timestamps,
-            self.result_queue_lengths,
+            timestamps[idx],
+            result_lengths[idx],
             label="Result q.",
             color=color_result,
         )
@@ -252,66 +994,41 @@ class QueueMetrics:
         ax1.grid(True, alpha=0.3)
         ax1.set_ylim(0)
         ax1.legend(loc="upper right")
-        print("- #1 Done: Queue lengths over time")
+        print("- #1 Done: Queue lengths over time", file=log)
 
         # 2
         ax2 = fig.add_subplot(gs[1, 0])
-        ax2.fill_between(self.timestamps, self.test_server_utilization, color=color_test)
+        utilization = self.test_server_utilization.array
+        idx = downsample(max_points, utilization)
+        ax2.fill_between(timestamps[idx], utilization[idx], color=color_test)
         ax2.set_title("Test server utilization over time")
         ax2.set_xlabel("Time")
         ax2.set_ylabel("Utilization rate")
         ax2.grid(True, alpha=0.3)
         ax2.set_ylim(0, 1.0)
-        print("- #2 Done: Test server utilization over time")
+        print("- #2 Done: Test server utilization over time", file=log)
 
         # 3
         ax3 = fig.add_subplot(gs[1, 1])
-        ax3.fill_between(self.timestamps, self.result_server_utilization, color=color_result)
+        utilization = self.result_server_utilization.array
+        idx = downsample(max_points, utilization)
+        ax3.fill_between(timestamps[idx], utilization[idx], color=color_result)
         ax3.set_title("Result server utilization over time")
         ax3.set_xlabel("Time")
         ax3.set_ylabel("Utilization rate")
         ax3.grid(True, alpha=0.3)
         ax3.set_ylim(0, 1.0)
-        print("- #3 Done: Result server utilization over time")
+        print("- #3 Done: Result server utilization over time", file=log)
 
         # Sojourn times distribution
         ax4 = fig.add_subplot(gs[2, 0])
-        test_sojourn_times = []
-        result_sojourn_times = []
-        total_sojourn_times = []
-        total_prepa_sojourn_times = []
-        total_ing_sojourn_times = []
-
-        for user_id in self.test_queue_entry_times:
-            if user_id in self.test_queue_exit_times:
-                test_time = (
-                    self.test_queue_exit_times[user_id]
-                    - self.test_queue_entry_times[user_id]
-                )
-                test_sojourn_times.append(test_time)
-
-            if (
-                user_id in self.result_queue_entry_times
-                and user_id in self.result_queue_exit_times
-            ):
-                result_time = (
-                    self.result_queue_exit_times[user_id]
-                    - self.result_queue_entry_times[user_id]
-                )
-                result_sojourn_times.append(result_time)
-
-            if user_id in self.result_queue_exit_times:
-                total_time = (
-                    self.result_queue_exit_times[user_id]
-                    - self.test_queue_entry_times[user_id]
-                )
-
-                if 'PREPA' in user_id[:5]:
-                    total_prepa_sojourn_times.append(total_time)
-                elif 'ING' in user_id[:3]:
-                    total_ing_sojourn_times.append(total_time)
-                else:
-                    total_sojourn_times.append(total_time)
+        sojourns = self.sojourn_times()
+        test_sojourn_times = sojourns["test_queue"]
+        result_sojourn_times = sojourns["result_queue"]
+        # total times split by promo when the model regulates one of them
+        total_sojourn_times = [] if self.promo_breakdown else sojourns["total"]
+        total_prepa_sojourn_times = sojourns["PREPA"]
+        total_ing_sojourn_times = sojourns["ING"]
 
         # 4
         ax4.hist(
@@ -327,7 +1044,7 @@ class QueueMetrics:
         ax4.set_yscale("log")
         ax4.set_ylim(1)
         ax4.legend(loc="upper right")
-        print("- #4 Done: Distribution of sojourn times")
+        print("- #4 Done: Distribution of sojourn times", file=log)
 
         # 5
         ax5 = fig.add_subplot(gs[2, 1])
@@ -348,25 +1065,27 @@ class QueueMetrics:
         ax5.set_yscale("log")
         ax5.set_ylim(1)
         ax5.grid(True, alpha=0.3)
-        print("- #5 Done: Distribution of total system time")
+        print("- #5 Done: Distribution of total system time", file=log)
 
         # 6
         ax6 = fig.add_subplot(gs[3, 0])
-        window_size = max(1, len(self.timestamps) // 40)
+        window_size = max(1, len(timestamps) // 40)
 
-        if test_sojourn_times:
+        if len(test_sojourn_times):
             cumsum = np.cumsum(np.insert(test_sojourn_times, 0, 0))
             test_ma = (cumsum[window_size:] - cumsum[:-window_size]) / window_size
+            idx = downsample(max_points, test_ma)
             ax6.plot(
-                np.arange(len(test_ma)), test_ma, label="Test q.", color=color_test
+                np.arange(len(test_ma))[idx], test_ma[idx], label="Test q.", color=color_test
             )
 
-        if result_sojourn_times:
+        if len(result_sojourn_times):
             cumsum = np.cumsum(np.insert(result_sojourn_times, 0, 0))
             result_ma = (cumsum[window_size:] - cumsum[:-window_size]) / window_size
+            idx = downsample(max_points, result_ma)
             ax6.plot(
-                range(len(result_ma)),
-                result_ma,
+                np.arange(len(result_ma))[idx],
+                result_ma[idx],
                 label="Result q.",
                 color=color_result,
             )
@@ -377,36 +1096,19 @@ class QueueMetrics:
         ax6.grid(True, alpha=0.3)
         ax6.set_ylim(0)
         ax6.legend(loc="upper right")
-        print(f"- #6 Done: Moving average wait times (with window_size = {window_size})")
+        print(f"- #6 Done: Moving average wait times (with window_size = {window_size})", file=log)
 
         # 7
         ax7 = fig.add_subplot(gs[3, 1])
 
-        completed_jobs = []
-        attempted_jobs = []
-        timestamps_after_warmup = []
-
         # warmup
-        timestamps = np.array(self.timestamps)
         warmup_period = timestamps[-1] * 0.1
         window_size = max(1, len(timestamps) // 40)
 
         mask = timestamps >= warmup_period
         timestamps_after_warmup = timestamps[mask]
 
-        # convert dictionaries to arrays -> faster processing
-        entry_times = np.array([self.test_queue_entry_times[uid] for uid in self.test_queue_entry_times])
-        exit_times = np.array([
-            self.result_queue_exit_times.get(uid, np.inf)
-            for uid in self.test_queue_entry_times
-        ])
-
-        completed_jobs = np.zeros(len(timestamps_after_warmup))
-        attempted_jobs = np.zeros(len(timestamps_after_warmup))
-
-        for i, t in enumerate(timestamps_after_warmup):
-            completed_jobs[i] = np.sum((exit_times <= t) & (entry_times <= t))
-            attempted_jobs[i] = np.sum(entry_times <= t)
+        attempted_jobs, completed_jobs = self.job_counts(timestamps_after_warmup)
 
         # sliding window throughput computation
         if len(completed_jobs) > window_size:
@@ -416,17 +1118,18 @@ class QueueMetrics:
 
             completed_rates = completed_diffs / time_diffs
             attempted_rates = attempted_diffs / time_diffs
-
+            rate_times = timestamps_after_warmup[window_size:]
+            idx = downsample(max_points, completed_rates, attempted_rates)
 
             ax7.plot(
-                timestamps_after_warmup[window_size:],
-                completed_rates,
+                rate_times[idx],
+                completed_rates[idx],
                 label="Full throughput",
                 color="#177E89"
             )
             ax7.plot(
-                timestamps_after_warmup[window_size:],
-                attempted_rates,
+                rate_times[idx],
+                attempted_rates[idx],
                 label="'Test' throughput",
                 color="#FFC857",
                 linestyle="--"
@@ -438,66 +1141,59 @@ class QueueMetrics:
         ax7.grid(True, alpha=0.3)
         ax7.set_ylim(0)
         ax7.legend(loc="upper right")
-        print("- #7 Done: System throughput rates")
+        print("- #7 Done: System throughput rates", file=log)
 
 
         # 8
         ax8 = fig.add_subplot(gs[4, 0])
 
-        test_blocked_times_set = set(self.test_queue_blocked_times)
-        result_blocked_times_set = set(self.result_queue_blocked_times)
-        window_size = max(1, len(self.timestamps) // 40)
-        block_window = max(1, len(self.timestamps) // window_size)
-
-        if block_window > 0:
-            test_blocks = np.zeros(len(self.timestamps))
-            result_blocks = np.zeros(len(self.timestamps))
-
-            for idx, t in enumerate(self.timestamps):
-                # Use a slice of the timestamp range to find blocked times
-                test_blocked = sum(1 for time in range(max(0, t - block_window), t) if time in test_blocked_times_set)
-                result_blocked = sum(1 for time in range(max(0, t - block_window), t) if time in result_blocked_times_set)
+        window_size = max(1, len(timestamps) // 40)
+        block_window = max(1, len(timestamps) // window_size)
 
-                test_blocks[idx] = test_blocked / block_window
-                result_blocks[idx] = result_blocked / block_window
-        else:
-            # Edge case: If block_window is 0, set blocking probabilities to 0
-            test_blocks = np.zeros(len(self.timestamps))
-            result_blocks = np.zeros(len(self.timestamps))
+        test_blocks = (
+            self.blocked_counts(self.test_queue_blocked_times, timestamps, block_window)
+            / block_window
+        )
+        result_blocks = (
+            self.blocked_counts(self.result_queue_blocked_times, timestamps, block_window)
+            / block_window
+        )
 
-        ax8.plot(self.timestamps, test_blocks, label="Test q.", color=color_test)
-        ax8.plot(self.timestamps, result_blocks, label="Result q.", color=color_result)
+        idx = downsample(max_points, test_blocks, result_blocks)
+        ax8.plot(timestamps[idx], test_blocks[idx], label="Test q.", color=color_test)
+        ax8.plot(timestamps[idx], result_blocks[idx], label="Result q.", color=color_result)
         ax8.set_title("Blocking probability over time")
         ax8.set_xlabel("Time")
         ax8.set_ylabel("Blocking probability")
         ax8.grid(True, alpha=0.3)
         ax8.set_ylim(0, 1.0)
         ax8.legend(loc="upper right")
-        print("- #8 Done: Blocking probability over time")
+        print("- #8 Done: Blocking probability over time", file=log)
 
 
         # 9
         ax9 = fig.add_subplot(gs[4, 1])
-        ax9.plot(self.timestamps, self.backup_length, color="#3498db")
+        backup_length = self.backup_length.array
+        idx = downsample(max_points, backup_length)
+        ax9.plot(timestamps[idx], backup_length[idx], color="#3498db")
         ax9.set_title("Result backup length over time")
         ax9.set_xlabel("Time")
         ax9.set_ylabel("Backup length")
         ax9.grid(True, alpha=0.3)
         ax9.set_ylim(0)
-        print("- #9 Done: Result backup length over time")
+        print("- #9 Done: Result backup length over time", file=log)
 
 
         # 10
         ax10 = fig.add_subplot(gs[5, :])
-        total_load = np.array(self.test_queue_lengths) + np.array(
-            self.result_queue_lengths
-        )
-        test_proportion = np.array(self.test_queue_lengths) / (total_load + 1e-10)
-        result_proportion = np.array(self.result_queue_lengths) / (total_load + 1e-10)
+        total_load = test_lengths + result_lengths
+        test_proportion = test_lengths / (total_load + 1e-10)
+        result_proportion = result_lengths / (total_load + 1e-10)
+        idx = downsample(max_points, test_proportion, result_proportion)
 
         ax10.stackplot(
-            self.timestamps,
-            [test_proportion, result_proportion],
+            timestamps[idx],
+            [test_proportion[idx], result_proportion[idx]],
             labels=["Test q.", "Result q."],
             colors=[color_test, color_result],
             alpha=0.7,
@@ -508,9 +1204,8 @@ class QueueMetrics:
         ax10.grid(True, alpha=0.3)
         ax10.set_ylim(0, 1.0)
         ax10.legend(loc="upper right")
-        print("- #10 Done: Queue load balance over time")
+        print("- #10 Done: Queue load balance over time", file=log)
 
         fig.suptitle("Moulinette queue system metrics", fontsize=16, y=0.95)
-        print("\n################################################\n\n")
-        plt.savefig(save_filename, dpi=300, bbox_inches="tight")
-        plt.close()
\ No newline at end of file
+        print("\n################################################\n\n", file=log)
+        fig.savefig(save_filename, dpi=300, bbox_inches="tight")
\ No newline at end of file
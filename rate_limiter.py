@@ -0,0 +1,136 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, Hashable
+
+
+class RateLimiter(ABC):
+    """
+    Limite le nombre de tags d'un utilisateur. Chaque politique calcule l'instant exact
+    du prochain tag autorisé, ce qui permet à un utilisateur bloqué de n'attendre qu'une fois.
+
+    :param limit: Nombre de tags autorisés par fenêtre.
+    :param window: Durée de la fenêtre (en unités de temps).
+    """
+
+    def __init__(self, limit: int, window: int):
+        self.limit = limit
+        self.window = window
+
+    @abstractmethod
+    def next_allowed(self, key: Hashable, now: float) -> float:
+        """
+        Instant (>= now) à partir duquel le prochain tag de key est autorisé.
+        """
+
+    @abstractmethod
+    def record(self, key: Hashable, now: float):
+        """
+        Comptabilise un tag de key à l'instant now.
+        """
+
+    @abstractmethod
+    def reset(self, key: Hashable):
+        """
+        Oublie l'historique de key (exercice validé).
+        """
+
+
+class SlidingWindowLimiter(RateLimiter):
+    """
+    Au plus limit tags sur toute fenêtre glissante de durée window.
+    """
+
+    def __init__(self, limit: int, window: int):
+        super().__init__(limit, window)
+        self.tags: Dict[Hashable, deque] = {}  # key -> [timestep, ...] (maxlen limit)
+
+    def next_allowed(self, key: Hashable, now: float) -> float:
+        tags = self.tags.get(key)
+        if tags is None or len(tags) < self.limit:
+            return now
+        return max(now, tags[0] + self.window)
+
+    def record(self, key: Hashable, now: float):
+        if key not in self.tags:
+            self.tags[key] = deque(maxlen=self.limit)
+        # le plus ancien tag sort de la fenêtre automatiquement (maxlen)
+        self.tags[key].append(now)
+
+    def reset(self, key: Hashable):
+        self.tags.pop(key, None)
+
+
+class TokenBucketLimiter(RateLimiter):
+    """
+    Seau de limit jetons, rechargé à raison de limit jetons par window. Un tag consomme un jeton.
+    """
+
+    def __init__(self, limit: int, window: int):
+        super().__init__(limit, window)
+        self.rate = limit / window
+        self.buckets: Dict[Hashable, tuple] = {}  # key -> (jetons, dernière mise à jour)
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        tokens, last = self.buckets.get(key, (self.limit, now))
+        return min(self.limit, tokens + (now - last) * self.rate)
+
+    def next_allowed(self, key: Hashable, now: float) -> float:
+        tokens = self._tokens(key, now)
+        if tokens >= 1:
+            return now
+        return now + math.ceil((1 - tokens) / self.rate)
+
+    def record(self, key: Hashable, now: float):
+        self.buckets[key] = (self._tokens(key, now) - 1, now)
+
+    def reset(self, key: Hashable):
+        self.buckets.pop(key, None)
+
+
+class LeakyBucketLimiter(RateLimiter):
+    """
+    Seau de capacité limit qui se vide à raison de limit tags par window. Un tag ajoute une unité,
+    il est autorisé tant que le seau ne déborde pas.
+    """
+
+    def __init__(self, limit: int, window: int):
+        super().__init__(limit, window)
+        self.rate = limit / window
+        self.buckets: Dict[Hashable, tuple] = {}  # key -> (niveau, dernière mise à jour)
+
+    def _level(self, key: Hashable, now: float) -> float:
+        level, last = self.buckets.get(key, (0, now))
+        return max(0, level - (now - last) * self.rate)
+
+    def next_allowed(self, key: Hashable, now: float) -> float:
+        overflow = self._level(key, now) + 1 - self.limit
+        if overflow <= 0:
+            return now
+        return now + math.ceil(overflow / self.rate)
+
+    def record(self, key: Hashable, now: float):
+        self.buckets[key] = (self._level(key, now) + 1, now)
+
+    def reset(self, key: Hashable):
+        self.buckets.pop(key, None)
+
+
+RATE_LIMITERS = {
+    "sliding_window": SlidingWindowLimiter,
+    "token_bucket": TokenBucketLimiter,
+    "leaky_bucket": LeakyBucketLimiter,
+}
+
+
+def make_rate_limiter(policy: str, limit: int, window: int) -> RateLimiter:
+    """
+    Instancie la politique de limitation de tags demandée.
+
+    :param policy: "sliding_window", "token_bucket" ou "leaky_bucket".
+    :param limit: Nombre de tags autorisés par fenêtre.
+    :param window: Durée de la fenêtre.
+    """
+    if policy not in RATE_LIMITERS:
+        raise ValueError(f"Unknown rate limit policy: {policy}")
+    return RATE_LIMITERS[policy](limit, window)
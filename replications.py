@@ -0,0 +1,339 @@
+import argparse
+import json
+import math
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from event_trace import EventTrace, TraceLevel
+from main import job_seed
+from population import create_user_list, generate_users_names, set_random_seed
+from variates import CommonRandomVariates, RandomVariates
+from waterfall.infinite import WaterfallMoulinetteInfinite
+from waterfall.finite import WaterfallMoulinetteFinite
+from waterfall.backup import WaterfallMoulinetteFiniteBackup
+from channels_dams.channelsdams import ChannelsAndDams
+
+try:
+    from scipy import stats
+except ImportError:  # quantiles de la loi normale à la place de ceux de Student
+    stats = None
+
+# métriques dont la précision décide de l'arrêt des réplications
+DEFAULT_TARGETS = (
+    "test_queue.avg_length",
+    "result_queue.avg_length",
+    "sojourn_times.total.avg",
+    "throughput",
+)
+
+MODELS = {
+    "infinite": WaterfallMoulinetteInfinite,
+    "finite": WaterfallMoulinetteFinite,
+    "backup": WaterfallMoulinetteFiniteBackup,
+    "channels": ChannelsAndDams,
+}
+
+
+@dataclass
+class MetricEstimate:
+    """
+    Estimation d'une métrique sur n réplications : moyenne et demi-largeur de l'intervalle de confiance.
+    """
+
+    mean: float
+    half_width: float
+    std: float
+    n: int
+
+    @property
+    def relative_half_width(self) -> float:
+        if self.mean == 0:
+            return 0 if self.half_width == 0 else math.inf
+        return self.half_width / abs(self.mean)
+
+    def __str__(self):
+        return f"{self.mean:.6g} ± {self.half_width:.3g}"
+
+
+@dataclass
+class ReplicationResult:
+    """
+    Réplications d'une configuration : métriques de chaque réplication et estimations.
+    """
+
+    model: str
+    config: str
+    nb_user: int
+    confidence: float
+    samples: List[Dict[str, float]] = field(default_factory=list)
+    estimates: Dict[str, MetricEstimate] = field(default_factory=dict)
+    converged: bool = False
+
+    def report(self) -> str:
+        """
+        Résumé texte des estimations (moyenne ± demi-largeur).
+        """
+        status = "converged" if self.converged else "max replications reached"
+        lines = [
+            f"=== {self.model} U{self.nb_user} {self.config}: {len(self.samples)} replications"
+            f" ({status}, {self.confidence:.0%} CI) ==="
+        ]
+        lines += [f"- {name}: {estimate}" for name, estimate in self.estimates.items()]
+        return "\n".join(lines)
+
+
+def flatten_metrics(metrics: dict, prefix: str = "") -> Dict[str, float]:
+    """
+    Aplatit le dictionnaire de QueueMetrics.calculate_metrics ("test_queue.avg_length", ...).
+    """
+    flat = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, prefix=f"{prefix}{name}."))
+        else:
+            flat[f"{prefix}{name}"] = float(value)
+    return flat
+
+
+def t_quantile(p: float, df: int) -> float:
+    """
+    Quantile p de la loi de Student à df degrés de liberté (loi normale si scipy est absent).
+    """
+    if stats is not None:
+        return float(stats.t.ppf(p, df))
+    return NormalDist().inv_cdf(p)
+
+
+def estimate(
+    samples: Sequence[Dict[str, float]], confidence: float = 0.95
+) -> Dict[str, MetricEstimate]:
+    """
+    Moyenne et intervalle de confiance de chaque métrique des réplications.
+    """
+    n = len(samples)
+    quantile = t_quantile((1 + confidence) / 2, n - 1) if n > 1 else math.inf
+    estimates = {}
+    for name in samples[0]:
+        values = np.array([sample[name] for sample in samples])
+        std = float(values.std(ddof=1)) if n > 1 else 0.0
+        half_width = quantile * std / math.sqrt(n) if std > 0 else 0.0
+        estimates[name] = MetricEstimate(float(values.mean()), half_width, std, n)
+    return estimates
+
+
+def replication_seed(
+    seed: int, module: Callable, key: str, index: int, nb_user: int, crn: bool = False
+) -> int:
+    """
+    Graine de la réplication index d'une configuration. En mode CRN, elle ne dépend pas de la configuration.
+    """
+    identity = f"crn/{index}" if crn else f"{key}/{index}"
+    return job_seed(seed, module, identity, nb_user)
+
+
+def run_replication(
+    module: Callable,
+    config: dict,
+    nb_user: int,
+    promo_ratio: float,
+    seed: int,
+    crn: bool = False,
+) -> Dict[str, float]:
+    """
+    Exécute une réplication (sans trace ni graphe) et retourne ses métriques aplaties.
+
+    :param crn: tirages CommonRandomVariates (sinon, module random global).
+    """
+    set_random_seed(seed)
+    variates = CommonRandomVariates(seed) if crn else RandomVariates()
+    user_list = create_user_list(generate_users_names(nb_user), promo_ratio, variates)
+    moulinette = module(
+        **{"metrics_mode": "event", **config},
+        trace=EventTrace(level=TraceLevel.OFF),
+        variates=variates,
+    )
+    for user in user_list:
+        moulinette.add_user(user)
+    moulinette.run_simulation()
+    return flatten_metrics(moulinette.metrics.calculate_metrics())
+
+
+class _ConfigReplications:
+    """
+    Suivi des réplications d'une configuration. L'arrêt est décidé sur les réplications
+    d'indices consécutifs 0..n-1 : le résultat ne dépend pas de l'ordre de fin des réplications.
+    """
+
+    def __init__(self, result: ReplicationResult, targets, rel_precision, min_n, max_n):
+        self.result = result
+        self.targets = targets
+        self.rel_precision = rel_precision
+        self.min_n = min_n
+        self.max_n = max_n
+        self.submitted = 0
+        self.samples: Dict[int, Dict[str, float]] = {}
+        self.done = False
+
+    def add(self, index: int, sample: Dict[str, float]):
+        if self.done:
+            return  # réplication lancée avant la convergence, ignorée
+        self.samples[index] = sample
+        n = len(self.result.samples)
+        while not self.done and n in self.samples:
+            self.result.samples.append(self.samples.pop(n))
+            n += 1
+            if n < self.min_n:
+                continue
+            estimates = estimate(self.result.samples, self.result.confidence)
+            converged = all(
+                estimates[name].relative_half_width <= self.rel_precision
+                for name in self.targets
+            )
+            if converged or n >= self.max_n:
+                self.result.estimates = estimates
+                self.result.converged = converged
+                self.done = True
+
+    @property
+    def can_submit(self) -> bool:
+        return not self.done and self.submitted < self.max_n
+
+
+def replicate(
+    module: Callable,
+    configs: dict,
+    nb_user: int,
+    promo_ratio: float = 0.7,
+    seed: int = 42,
+    rel_precision: float = 0.05,
+    confidence: float = 0.95,
+    min_replications: int = 5,
+    max_replications: int = 100,
+    targets: Sequence[str] = DEFAULT_TARGETS,
+    workers: int = 1,
+    crn: bool = False,
+) -> Dict[str, ReplicationResult]:
+    """
+    Réplique chaque configuration jusqu'à ce que la demi-largeur relative de l'intervalle de confiance
+    de chaque métrique de targets soit au plus rel_precision. Les réplications sont réparties sur un pool
+    de processus, en priorité vers les configurations qui n'ont pas encore convergé.
+
+    :param configs: configurations du modèle (nom -> paramètres).
+    :param seed: graine maître ; la graine de chaque réplication en est dérivée.
+    :param rel_precision: demi-largeur relative visée (0.05 : ± 5 % de la moyenne).
+    :param confidence: niveau de confiance des intervalles.
+    :param min_replications: nombre minimal de réplications avant le test d'arrêt.
+    :param max_replications: nombre maximal de réplications d'une configuration.
+    :param targets: métriques aplaties (voir flatten_metrics) qui décident de l'arrêt.
+    :param workers: nombre de processus (1 : en série).
+    :param crn: nombres aléatoires communs : la réplication i de chaque configuration voit la même charge
+        (mêmes utilisateurs, temps de travail et résultats de commits), voir paired_differences.
+    """
+    states = {
+        key: _ConfigReplications(
+            ReplicationResult(module.__name__, key, nb_user, confidence),
+            targets,
+            rel_precision,
+            max(min_replications, 2),
+            max_replications,
+        )
+        for key in configs
+    }
+
+    def next_job():
+        candidates = [key for key, state in states.items() if state.can_submit]
+        if not candidates:
+            return None
+        key = min(candidates, key=lambda key: states[key].submitted)
+        index = states[key].submitted
+        states[key].submitted += 1
+        args = (
+            module,
+            configs[key],
+            nb_user,
+            promo_ratio,
+            replication_seed(seed, module, key, index, nb_user, crn),
+            crn,
+        )
+        return key, index, args
+
+    if workers <= 1:
+        while (job := next_job()) is not None:
+            key, index, args = job
+            states[key].add(index, run_replication(*args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+            while True:
+                while len(pending) < workers and (job := next_job()) is not None:
+                    key, index, args = job
+                    pending[pool.submit(run_replication, *args)] = (key, index)
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key, index = pending.pop(future)
+                    states[key].add(index, future.result())
+
+    return {key: state.result for key, state in states.items()}
+
+
+def paired_differences(
+    results: Dict[str, ReplicationResult], baseline: str, confidence: float = 0.95
+) -> Dict[str, Dict[str, MetricEstimate]]:
+    """
+    Différences appariées (configuration - baseline) des métriques, réplication par réplication,
+    avec leur intervalle de confiance. Les paires n'ont de sens qu'avec replicate(..., crn=True) :
+    la réplication i de chaque configuration a alors vu la même charge, et le bruit commun s'annule.
+
+    :param results: résultats de replicate.
+    :param baseline: configuration de référence.
+    """
+    reference = results[baseline].samples
+    differences = {}
+    for key, result in results.items():
+        if key == baseline:
+            continue
+        n = min(len(reference), len(result.samples))
+        differences[key] = estimate(
+            [
+                {name: sample[name] - base[name] for name in base}
+                for sample, base in zip(result.samples[:n], reference[:n])
+            ],
+            confidence,
+        )
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Réplique une configuration jusqu'à la précision visée et affiche moyenne ± IC."
+    )
+    parser.add_argument("model", choices=MODELS)
+    parser.add_argument("config", help='paramètres du modèle en JSON, ex. \'{"K": 3}\'')
+    parser.add_argument("--users", type=int, default=65)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--precision", type=float, default=0.05)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--min", type=int, default=5)
+    parser.add_argument("--max", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    results = replicate(
+        MODELS[args.model],
+        {"config": json.loads(args.config)},
+        args.users,
+        seed=args.seed,
+        rel_precision=args.precision,
+        confidence=args.confidence,
+        min_replications=args.min,
+        max_replications=args.max,
+        workers=args.workers,
+    )
+    for result in results.values():
+        print(result.report())
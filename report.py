@@ -0,0 +1,137 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List
+
+from cache import DEFAULT_CACHE_DIR, ResultCache
+from queue_metrics import DEFAULT_MAX_POINTS
+
+
+def graph_filename(entry: dict, key: str, output_dir: str = "output") -> str:
+    """
+    Graphe d'une entrée du cache : output/<Model>/graphs/<nom de la simulation>.png
+    (la clé de l'entrée si son nom est inconnu).
+    """
+    name = entry.get("name") or key
+    return os.path.join(output_dir, entry["identity"]["model"], "graphs", f"{name}.png")
+
+
+def render_report(
+    cache_dir: str,
+    key: str,
+    filename: str,
+    max_points: int | None = DEFAULT_MAX_POINTS,
+) -> str:
+    """
+    Trace le graphe d'une entrée du cache à partir de ses séries brutes.
+
+    :param filename: fichier du graphe.
+    :param max_points: points tracés par courbe (voir queue_metrics.downsample).
+    :return: fichier du graphe.
+    """
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    metrics = ResultCache(cache_dir).load_metrics(key)
+    with open(os.devnull, "w") as log:
+        metrics.plot_metrics(save_filename=filename, log=log, max_points=max_points)
+    return filename
+
+
+def pending_reports(
+    cache: ResultCache,
+    keys: Iterable[str] | None = None,
+    model: str | None = None,
+    nb_user: int | None = None,
+    force: bool = False,
+    output_dir: str = "output",
+) -> Dict[str, str]:
+    """
+    Entrées du cache dont le graphe est absent ou plus ancien que l'entrée (clé -> fichier du graphe).
+
+    :param keys: entrées à considérer (par défaut, tout le cache), par exemple celles d'une campagne.
+    :param model: ne considère que les entrées de ce modèle.
+    :param nb_user: ne considère que les entrées de cette population.
+    :param force: retrace aussi les graphes à jour.
+    """
+    pending = {}
+    for key in cache.keys() if keys is None else keys:
+        entry = cache.get(key)
+        if entry is None:
+            continue
+        identity = entry["identity"]
+        if model is not None and identity["model"] != model:
+            continue
+        if nb_user is not None and identity["nb_user"] != nb_user:
+            continue
+        filename = graph_filename(entry, key, output_dir)
+        up_to_date = (
+            os.path.exists(filename) and os.path.getmtime(filename) >= entry["created"]
+        )
+        if force or not up_to_date:
+            pending[key] = filename
+    return pending
+
+
+def render_reports(
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    keys: Iterable[str] | None = None,
+    model: str | None = None,
+    nb_user: int | None = None,
+    force: bool = False,
+    workers: int = 1,
+    max_points: int | None = DEFAULT_MAX_POINTS,
+    output_dir: str = "output",
+) -> List[str]:
+    """
+    Étape de rendu, découplée des simulations : trace les graphes des entrées du cache
+    (voir pending_reports pour la sélection), dans un pool de processus.
+
+    :param workers: nombre de processus (1 : en série).
+    :param max_points: points tracés par courbe (None : tous les échantillons).
+    :return: fichiers des graphes tracés.
+    """
+    cache = ResultCache(cache_dir)
+    pending = pending_reports(cache, keys, model, nb_user, force, output_dir)
+    if workers <= 1:
+        return [
+            render_report(cache_dir, key, filename, max_points)
+            for key, filename in pending.items()
+        ]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(render_report, cache_dir, key, filename, max_points)
+            for key, filename in pending.items()
+        ]
+        return [future.result() for future in as_completed(futures)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Trace les graphes des simulations enregistrées dans le cache des résultats."
+    )
+    parser.add_argument("--dir", default=DEFAULT_CACHE_DIR, help="dossier du cache")
+    parser.add_argument("--model", help="ne trace que les simulations de ce modèle")
+    parser.add_argument("--users", type=int, help="ne trace que les simulations de cette population")
+    parser.add_argument("--key", action="append", help="ne trace que ces entrées du cache")
+    parser.add_argument("--force", action="store_true", help="retrace les graphes à jour")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=DEFAULT_MAX_POINTS,
+        help="points tracés par courbe (0 : tous les échantillons)",
+    )
+    args = parser.parse_args()
+
+    filenames = render_reports(
+        args.dir,
+        keys=args.key,
+        model=args.model,
+        nb_user=args.users,
+        force=args.force,
+        workers=args.workers,
+        max_points=args.max_points or None,
+    )
+    for filename in filenames:
+        print(filename)
+    print(f"{len(filenames)} graphs rendered")
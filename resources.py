@@ -0,0 +1,110 @@
+from typing import Callable
+import simpy
+
+
+class MonitoredResource(simpy.Resource):
+    """
+    Resource simpy qui notifie chaque changement d'état (entrée dans la file, début et fin de service).
+
+    :param env: Environnement simpy.
+    :param capacity: Nombre de serveurs.
+    :param on_change: Fonction appelée après chaque changement d'état.
+    """
+
+    def __init__(
+        self,
+        env: simpy.Environment,
+        capacity: int = 1,
+        on_change: Callable[[], None] | None = None,
+    ):
+        super().__init__(env, capacity=capacity)
+        self.on_change = on_change
+
+    def _trigger_put(self, get_event):
+        super()._trigger_put(get_event)
+        if self.on_change is not None:
+            self.on_change()
+
+    def _trigger_get(self, put_event):
+        super()._trigger_get(put_event)
+        if self.on_change is not None:
+            self.on_change()
+
+
+class MonitoredFilterStore(simpy.FilterStore):
+    """
+    FilterStore simpy qui notifie chaque ajout ou retrait d'élément.
+
+    :param env: Environnement simpy.
+    :param capacity: Nombre maximal d'éléments.
+    :param on_change: Fonction appelée après chaque changement d'état.
+    """
+
+    def __init__(
+        self,
+        env: simpy.Environment,
+        capacity: float = float("inf"),
+        on_change: Callable[[], None] | None = None,
+    ):
+        super().__init__(env, capacity=capacity)
+        self.on_change = on_change
+
+    def _trigger_put(self, get_event):
+        super()._trigger_put(get_event)
+        if self.on_change is not None:
+            self.on_change()
+
+    def _trigger_get(self, put_event):
+        super()._trigger_get(put_event)
+        if self.on_change is not None:
+            self.on_change()
+
+
+class BoundedQueue(simpy.Container):
+    """
+    File FIFO bornée dont seule l'occupation est suivie : admission, libération et test de remplissage en O(1).
+    Une admission sur une file pleine attend, dans l'ordre d'arrivée, qu'une place se libère.
+
+    :param env: Environnement simpy.
+    :param capacity: Nombre de places de la file.
+    """
+
+    def __init__(self, env: simpy.Environment, capacity: int = 1):
+        super().__init__(env, capacity=capacity, init=0)
+        self._slot_released = None
+
+    def _do_get(self, event):
+        proceed = super()._do_get(event)
+        if (
+            event.triggered
+            and self._slot_released is not None
+            and not self._slot_released.triggered
+        ):
+            self._slot_released.succeed()
+        return proceed
+
+    def __len__(self) -> int:
+        return self.level
+
+    def is_full(self) -> bool:
+        return self.level >= self.capacity
+
+    def admit(self):
+        """
+        Réserve une place dans la file (événement déclenché une fois la place obtenue).
+        """
+        return self.put(1)
+
+    def release(self):
+        """
+        Libère une place de la file.
+        """
+        return self.get(1)
+
+    def slot_released(self):
+        """
+        Événement déclenché à la prochaine libération d'une place.
+        """
+        if self._slot_released is None or self._slot_released.triggered:
+            self._slot_released = self._env.event()
+        return self._slot_released
@@ -0,0 +1,325 @@
+import argparse
+import itertools
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from replications import MODELS, replication_seed, run_replication
+
+
+def objective_weights(weights: Dict[str, float]) -> Callable[[dict, dict], float]:
+    """
+    Objectif linéaire sur les paramètres, par exemple {"K": 1, "kf": 0.5} pour K + 0.5·kf.
+    """
+
+    def objective(config: dict, metrics: dict) -> float:
+        return sum(weight * config[name] for name, weight in weights.items())
+
+    return objective
+
+
+def servers(config: dict, metrics: dict) -> float:
+    """Nombre de serveurs (K serveurs de test et le serveur d'envoi)."""
+    return config["K"] + 1
+
+
+def latency(config: dict, metrics: dict) -> float:
+    """95e centile du temps de séjour total."""
+    return metrics["sojourn_times.total.p95"]
+
+
+def blocking(config: dict, metrics: dict) -> float:
+    """Taux de refus des deux files."""
+    return metrics["test_queue.blocking_rate"] + metrics["result_queue.blocking_rate"]
+
+
+# axes (à minimiser) du front de Pareto
+DEFAULT_AXES = (servers, latency, blocking)
+
+
+@dataclass
+class Candidate:
+    """
+    Une configuration évaluée, avec les métriques (aplaties) de ses réplications.
+    """
+
+    config: dict
+    samples: List[Dict[str, float]] = field(default_factory=list)
+    cost: float = math.inf
+    violation: float = math.inf
+    rung: int = 0
+
+    @property
+    def name(self) -> str:
+        return json.dumps(self.config, sort_keys=True)
+
+    @property
+    def metrics(self) -> Dict[str, float]:
+        """Moyenne des métriques sur les réplications."""
+        return {
+            name: float(np.mean([sample[name] for sample in self.samples]))
+            for name in self.samples[0]
+        }
+
+    @property
+    def feasible(self) -> bool:
+        return self.violation == 0
+
+    def rank_key(self) -> tuple:
+        # configurations admissibles d'abord (par coût), puis les autres par violation croissante
+        return (not self.feasible, self.violation, self.cost)
+
+
+@dataclass
+class SearchResult:
+    """
+    Résultat d'une recherche : toutes les configurations évaluées, les survivantes du dernier palier
+    et le front de Pareto.
+    """
+
+    candidates: List[Candidate]
+    survivors: List[Candidate]
+    front: List[Candidate]
+    axes: Sequence[Callable]
+
+    @property
+    def best(self) -> Candidate | None:
+        """Meilleure configuration admissible du dernier palier."""
+        feasible = [candidate for candidate in self.survivors if candidate.feasible]
+        return min(feasible, key=Candidate.rank_key) if feasible else None
+
+    def report(self) -> str:
+        """
+        Résumé texte : meilleure configuration et front de Pareto.
+        """
+        lines = [f"=== {len(self.candidates)} configurations evaluated ==="]
+        best = self.best
+        if best is None:
+            lines.append("No configuration satisfies the constraints.")
+        else:
+            lines.append(
+                f"Best: {best.name} (cost {best.cost:.4g}, {len(best.samples)} replications)"
+            )
+        names = ", ".join(axis.__name__ for axis in self.axes)
+        lines.append(f"\nPareto front ({names}):")
+        for candidate in self.front:
+            metrics = candidate.metrics
+            values = ", ".join(
+                f"{axis(candidate.config, metrics):.4g}" for axis in self.axes
+            )
+            flag = "" if candidate.feasible else " [violates constraints]"
+            lines.append(
+                f"- {candidate.name}: ({values}), {len(candidate.samples)} replications{flag}"
+            )
+        return "\n".join(lines)
+
+
+def grid(space: Dict[str, Sequence], fixed: dict | None = None) -> List[dict]:
+    """
+    Produit cartésien des valeurs des paramètres, complété par les paramètres fixes.
+
+    :param space: paramètre -> valeurs possibles.
+    :param fixed: paramètres communs à toutes les configurations.
+    """
+    names = list(space)
+    return [
+        {**(fixed or {}), **dict(zip(names, values))}
+        for values in itertools.product(*(space[name] for name in names))
+    ]
+
+
+def constraint_violation(metrics: dict, constraints: Dict[str, float]) -> float:
+    """
+    Somme des dépassements relatifs des bornes supérieures (0 si toutes les contraintes sont respectées).
+
+    :param constraints: métrique aplatie -> borne supérieure.
+    """
+    return sum(
+        max(metrics[name] - bound, 0) / (abs(bound) or 1)
+        for name, bound in constraints.items()
+    )
+
+
+def pareto_front(
+    candidates: Sequence[Candidate], axes: Sequence[Callable] = DEFAULT_AXES
+) -> List[Candidate]:
+    """
+    Configurations non dominées selon les axes (tous à minimiser).
+    """
+    points = [
+        (candidate, [axis(candidate.config, candidate.metrics) for axis in axes])
+        for candidate in candidates
+    ]
+    front = []
+    for candidate, values in points:
+        dominated = any(
+            all(o <= v for o, v in zip(other, values))
+            and any(o < v for o, v in zip(other, values))
+            for _, other in points
+        )
+        if not dominated:
+            front.append(candidate)
+    return sorted(front, key=lambda candidate: axes[0](candidate.config, candidate.metrics))
+
+
+def successive_halving(
+    module: Callable,
+    space: Dict[str, Sequence],
+    objective: Callable[[dict, dict], float],
+    constraints: Dict[str, float],
+    nb_user: int,
+    fixed: dict | None = None,
+    budgets: Sequence[int] = (1, 2, 4, 8),
+    eta: int = 2,
+    promo_ratio: float = 0.7,
+    seed: int = 42,
+    crn: bool = True,
+    axes: Sequence[Callable] = DEFAULT_AXES,
+    workers: int = 1,
+) -> SearchResult:
+    """
+    Recherche d'une configuration de coût minimal sous contraintes, par élimination successive : à chaque
+    palier, les configurations restantes sont évaluées sur budgets[palier] réplications (les réplications
+    déjà faites sont gardées), puis seule la meilleure fraction 1/eta passe au palier suivant.
+
+    :param space: paramètre -> valeurs possibles (voir grid).
+    :param objective: coût d'une configuration, fonction (paramètres, métriques moyennes).
+    :param constraints: métrique aplatie -> borne supérieure, par exemple
+        {"sojourn_times.total.p95": 30, "test_queue.blocking_rate": 0.05}.
+    :param fixed: paramètres communs à toutes les configurations.
+    :param budgets: nombre (croissant) de réplications de chaque palier.
+    :param eta: facteur de réduction entre deux paliers.
+    :param crn: nombres aléatoires communs : la réplication i voit la même charge pour toutes les
+        configurations, ce qui fiabilise le classement à faible budget.
+    :param axes: axes du front de Pareto (à minimiser).
+    :param workers: nombre de processus (1 : en série).
+    """
+    candidates = [Candidate(config) for config in grid(space, fixed)]
+    survivors = list(candidates)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else _Serial()
+    with pool:
+        for rung, budget in enumerate(budgets):
+            # seules les réplications manquantes des configurations restantes sont lancées
+            jobs = [
+                (candidate, index)
+                for candidate in survivors
+                for index in range(len(candidate.samples), budget)
+            ]
+            arguments = [
+                (
+                    module,
+                    candidate.config,
+                    nb_user,
+                    promo_ratio,
+                    replication_seed(seed, module, candidate.name, index, nb_user, crn),
+                    crn,
+                )
+                for candidate, index in jobs
+            ]
+            for (candidate, _), sample in zip(jobs, pool.map(_evaluate, arguments)):
+                candidate.samples.append(sample)
+
+            for candidate in survivors:
+                metrics = candidate.metrics
+                candidate.cost = objective(candidate.config, metrics)
+                candidate.violation = constraint_violation(metrics, constraints)
+                candidate.rung = rung
+
+            survivors.sort(key=Candidate.rank_key)
+            if rung < len(budgets) - 1:
+                survivors = survivors[: max(1, math.ceil(len(survivors) / eta))]
+
+    return SearchResult(
+        candidates=candidates,
+        survivors=survivors,
+        front=pareto_front(candidates, axes),
+        axes=axes,
+    )
+
+
+def _evaluate(arguments: tuple) -> Dict[str, float]:
+    return run_replication(*arguments)
+
+
+class _Serial:
+    """
+    Exécution en série avec l'interface de ProcessPoolExecutor utilisée ici (map).
+    """
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _parse_values(text: str) -> list:
+    # "2:6" -> [2, 3, 4, 5, 6] ; "5,10,20" -> [5, 10, 20] ; "true,false" -> [True, False]
+    if ":" in text:
+        start, stop = text.split(":")
+        return list(range(int(start), int(stop) + 1))
+    return [json.loads(value) for value in text.split(",")]
+
+
+def _parse_assignments(items: Sequence[str], parse: Callable) -> dict:
+    return {
+        name: parse(value) for name, value in (item.split("=", 1) for item in items)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recherche de configuration sous contraintes (élimination successive) et front de Pareto."
+    )
+    parser.add_argument("model", choices=MODELS)
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        help="plage d'un paramètre : K=2:6 ou kf=5,10,20",
+    )
+    parser.add_argument(
+        "--fixed", action="append", default=[], help="paramètre fixe : process_time=2"
+    )
+    parser.add_argument(
+        "--cost",
+        action="append",
+        default=[],
+        help="poids d'un paramètre dans le coût : K=1 kf=0.5 (défaut : K=1)",
+    )
+    parser.add_argument(
+        "--max",
+        action="append",
+        default=[],
+        help="borne supérieure d'une métrique : sojourn_times.total.p95=30",
+    )
+    parser.add_argument("--users", type=int, default=65)
+    parser.add_argument("--budgets", default="1,2,4,8", help="réplications par palier")
+    parser.add_argument("--eta", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    result = successive_halving(
+        MODELS[args.model],
+        space=_parse_assignments(args.param, _parse_values),
+        objective=objective_weights(
+            _parse_assignments(args.cost, float) if args.cost else {"K": 1}
+        ),
+        constraints=_parse_assignments(args.max, float),
+        nb_user=args.users,
+        fixed=_parse_assignments(args.fixed, json.loads),
+        budgets=[int(budget) for budget in args.budgets.split(",")],
+        eta=args.eta,
+        seed=args.seed,
+        workers=args.workers,
+    )
+    print(result.report())
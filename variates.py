@@ -0,0 +1,185 @@
+import random
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+class RandomVariates:
+    """
+    Tirages aléatoires de la simulation, un à un via le module random global (comportement historique).
+
+    Les tirages liés à un commit reçoivent sa clé (utilisateur, exo, essai) (voir Commit.draw_key),
+    ignorée ici et utilisée par CommonRandomVariates.
+    """
+
+    def intelligence(self) -> float:
+        """Intelligence d'un utilisateur (chance de réussite de son premier commit)."""
+        return max(min(random.gauss(mu=0.6, sigma=0.075), 0.75), 0.2)
+
+    def promo_draw(self) -> float:
+        """Tirage uniforme sur [0, 1) de la promotion d'un utilisateur."""
+        return random.random()
+
+    def exo_think(self, key: tuple | None = None) -> int:
+        """Temps de travail sur un nouvel exercice (en minutes)."""
+        return round(max(random.gauss(mu=45, sigma=15), 1))
+
+    def retry_think(self, key: tuple | None = None) -> int:
+        """Temps de correction après un commit raté (en minutes)."""
+        return round(max(random.gauss(mu=15, sigma=5), 1))
+
+    def retry_delay(self, key: tuple | None = None) -> int:
+        """Délai avant un nouvel essai après un refus d'une file pleine (en minutes)."""
+        return random.randint(4, 10)
+
+    def pass_draw(self, key: tuple | None = None) -> float:
+        """Tirage uniforme sur [0, 1) comparé à la chance de réussite d'un commit."""
+        return random.random()
+
+    def improvement(self, key: tuple | None = None) -> float:
+        """Gain de chance de réussite après un commit raté."""
+        return max(min(random.gauss(mu=0.1, sigma=0.015), 0.2), 0.05)
+
+    def draw(self, name: str, size: int, keys: tuple | None = None) -> np.ndarray:
+        """
+        Tire size valeurs d'un usage (moteurs vectorisés), dans l'ordre des tirages unitaires.
+
+        :param name: Usage (nom d'une méthode de tirage, par exemple "exo_think").
+        :param size: Nombre de valeurs.
+        :param keys: Tableaux (utilisateurs, exos, essais) des clés des tirages.
+        """
+        draw = getattr(self, name)
+        if keys is None:
+            return np.array([draw() for _ in range(size)])
+        return np.array([draw(key) for key in zip(*(column.tolist() for column in keys))])
+
+
+# usage -> tirage vectorisé d'un bloc de variables
+_BLOCK_DRAWS: Dict[str, Callable[[np.random.Generator, int], np.ndarray]] = {
+    "intelligence": lambda rng, size: np.clip(rng.normal(0.6, 0.075, size), 0.2, 0.75),
+    "promo_draw": lambda rng, size: rng.random(size),
+    "exo_think": lambda rng, size: np.rint(np.maximum(rng.normal(45, 15, size), 1)).astype(np.int64),
+    "retry_think": lambda rng, size: np.rint(np.maximum(rng.normal(15, 5, size), 1)).astype(np.int64),
+    "retry_delay": lambda rng, size: rng.integers(4, 11, size),
+    "pass_draw": lambda rng, size: rng.random(size),
+    "improvement": lambda rng, size: np.clip(rng.normal(0.1, 0.015, size), 0.05, 0.2),
+}
+
+
+class BlockVariates(RandomVariates):
+    """
+    Tirages par blocs numpy, avec un flux numpy.random.Generator indépendant par usage, tous issus
+    d'une même graine. Chaque flux est reproductible indépendamment du nombre de tirages des autres.
+
+    :param seed: Graine commune des flux.
+    :param block_size: Nombre de valeurs tirées à la fois par flux.
+    """
+
+    STREAMS = tuple(_BLOCK_DRAWS)
+
+    def __init__(self, seed: int | None = None, block_size: int = 4096):
+        self.seed = seed
+        self.block_size = block_size
+        seeds = np.random.SeedSequence(seed).spawn(len(self.STREAMS))
+        self._generators = {
+            name: np.random.default_rng(stream_seed)
+            for name, stream_seed in zip(self.STREAMS, seeds)
+        }
+        self._blocks: Dict[str, List] = {name: [] for name in self.STREAMS}
+
+    def _next(self, name: str):
+        block = self._blocks[name]
+        if not block:
+            # bloc converti en liste (inversée) : un pop() par tirage
+            block.extend(
+                _BLOCK_DRAWS[name](self._generators[name], self.block_size)[::-1].tolist()
+            )
+        return block.pop()
+
+    def draw(self, name: str, size: int, keys: tuple | None = None) -> np.ndarray:
+        if size == 0:
+            return _BLOCK_DRAWS[name](self._generators[name], 0)
+        block = self._blocks[name]
+        if len(block) < size:
+            # les nouvelles valeurs suivent celles du bloc courant (dépilé par la fin)
+            count = max(self.block_size, size - len(block))
+            block[:0] = _BLOCK_DRAWS[name](self._generators[name], count)[::-1].tolist()
+        values = block[-size:]
+        del block[-size:]
+        return np.array(values[::-1])
+
+    def intelligence(self) -> float:
+        return self._next("intelligence")
+
+    def promo_draw(self) -> float:
+        return self._next("promo_draw")
+
+    def exo_think(self, key: tuple | None = None) -> int:
+        return self._next("exo_think")
+
+    def retry_think(self, key: tuple | None = None) -> int:
+        return self._next("retry_think")
+
+    def retry_delay(self, key: tuple | None = None) -> int:
+        return self._next("retry_delay")
+
+    def pass_draw(self, key: tuple | None = None) -> float:
+        return self._next("pass_draw")
+
+    def improvement(self, key: tuple | None = None) -> float:
+        return self._next("improvement")
+
+
+class CommonRandomVariates(BlockVariates):
+    """
+    Nombres aléatoires communs (CRN) : chaque tirage lié à un commit ne dépend que de la graine et de
+    sa clé (utilisateur, exo, essai), pas de l'ordre des événements. Deux configurations simulées avec
+    la même graine voient donc les mêmes étudiants (population tirée comme BlockVariates), les mêmes
+    temps de travail et les mêmes résultats de commits, ce qui rend leurs différences appariées.
+
+    :param seed: Graine commune des tirages.
+    :param block_size: Nombre de valeurs tirées à la fois pour la population.
+    :param chunk: Nombre d'essais tirés à la fois pour un couple (utilisateur, exo).
+    """
+
+    KEYED = ("exo_think", "retry_think", "retry_delay", "pass_draw", "improvement")
+
+    def __init__(self, seed: int | None = None, block_size: int = 4096, chunk: int = 8):
+        super().__init__(seed, block_size)
+        self.chunk = chunk
+        self._entropy = np.random.SeedSequence(seed).entropy
+        # (utilisateur, exo) -> (générateur, {usage: [valeur de l'essai 0, 1, ...]})
+        self._tables: Dict[tuple, tuple] = {}
+
+    def _keyed(self, name: str, key: tuple):
+        user, exo, attempt = key
+        table = self._tables.get((user, exo))
+        if table is None:
+            generator = np.random.default_rng([self._entropy, user, exo])
+            table = self._tables[(user, exo)] = (generator, {usage: [] for usage in self.KEYED})
+        generator, values = table
+        # les essais sont tirés par paquets, tous usages confondus et dans un ordre fixe
+        while len(values[name]) <= attempt:
+            for usage in self.KEYED:
+                values[usage].extend(_BLOCK_DRAWS[usage](generator, self.chunk).tolist())
+        return values[name][attempt]
+
+    def draw(self, name: str, size: int, keys: tuple | None = None) -> np.ndarray:
+        if keys is None:
+            return super().draw(name, size)
+        return RandomVariates.draw(self, name, size, keys)
+
+    def exo_think(self, key: tuple | None = None) -> int:
+        return self._next("exo_think") if key is None else self._keyed("exo_think", key)
+
+    def retry_think(self, key: tuple | None = None) -> int:
+        return self._next("retry_think") if key is None else self._keyed("retry_think", key)
+
+    def retry_delay(self, key: tuple | None = None) -> int:
+        return self._next("retry_delay") if key is None else self._keyed("retry_delay", key)
+
+    def pass_draw(self, key: tuple | None = None) -> float:
+        return self._next("pass_draw") if key is None else self._keyed("pass_draw", key)
+
+    def improvement(self, key: tuple | None = None) -> float:
+        return self._next("improvement") if key is None else self._keyed("improvement", key)
@@ -0,0 +1,287 @@
+import numpy as np
+
+from basics import MINUTE_UNIT, Moulinette
+from queue_metrics import CommitTable
+from rate_limiter import SlidingWindowLimiter
+
+# phases d'un utilisateur
+THINK = 0  # travail sur un exercice ou attente avant un nouvel essai (jusqu'à due)
+TEST_QUEUE = 1  # commit en attente d'un serveur de test
+TESTING = 2  # commit en test (jusqu'à due)
+RESULT_QUEUE = 3  # commit en attente du serveur d'envoi
+RESULT = 4  # résultat en envoi (jusqu'à due)
+DONE = 5  # tous les exercices validés
+
+_NEVER = np.iinfo(np.int64).max
+
+
+class VectorKernel:
+    """
+    Moteur de simulation à pas de temps : l'état de tous les utilisateurs est gardé dans des tableaux
+    numpy (phase, fin de la phase, exo courant, chance de réussite, fenêtre des tags) et chaque unité
+    de temps fait avancer tous les utilisateurs par opérations vectorisées. Les temps des modèles étant
+    entiers, les résultats sont statistiquement équivalents à ceux du moteur simpy.
+
+    Ne gère que les variantes waterfall infinie et finie (ni backup, ni barrage), avec la limite de tags
+    en fenêtre glissante. Les événements ne sont pas tracés.
+
+    :param model: Moulinette à simuler (utilisateurs déjà ajoutés).
+    """
+
+    def __init__(self, model: Moulinette):
+        if model.uses_backup or getattr(model, "tb", None) is not None:
+            raise ValueError(
+                f"{type(model).__name__} is not supported by the vector engine"
+            )
+        if not isinstance(model.rate_limiter, SlidingWindowLimiter):
+            raise ValueError("The vector engine only supports the sliding_window rate limit")
+
+        self.model = model
+        self.users = model.users
+        self.metrics = model.metrics
+        self.variates = model.variates
+
+        self.nb_exos = model.nb_exos
+        self.K = model.test_server.capacity
+        self.process_time = model.process_time
+        self.result_time = model.result_time
+        # taille des files (None : file infinie)
+        self.ks = getattr(model, "ks", None)
+        self.kf = getattr(model, "kf", None)
+        self.tag_limit = model.rate_limiter.limit
+        self.tag_window = model.rate_limiter.window
+
+        size = len(self.users)
+        self.phase = np.full(size, THINK, dtype=np.int8)
+        self.due = np.zeros(size, dtype=np.int64)  # fin de la phase en cours (_NEVER en file)
+        # ordre d'arrivée dans la file en cours, ou de programmation de la fin de phase (THINK)
+        self.seq = np.zeros(size, dtype=np.int64)
+        self.exo = np.fromiter((user.current_exo for user in self.users), np.int64, size)
+        self.intelligence = np.fromiter(
+            (user.intelligence for user in self.users), np.float64, size
+        )
+        self.chance = np.zeros(size)  # chance de réussite du commit en cours
+        self.last_chance = np.full(size, np.nan)  # chance du prochain commit (nan : intelligence)
+        self.date = np.zeros(size, dtype=np.int64)  # date du commit en cours
+        self.commits = np.zeros(size, dtype=np.int64)  # nombre de commits pour l'exo courant
+        # fenêtre glissante des tags : anneau des dates des tags ratés
+        self.tags = np.zeros((size, self.tag_limit), dtype=np.int64)
+        self.tag_count = np.zeros(size, dtype=np.int64)
+        self.commit_ids = np.full(size, -1, dtype=np.int64)  # commit en cours dans les métriques
+        self.promo = np.fromiter(
+            (CommitTable.PROMO_CODES[user.promo] for user in self.users), np.int8, size
+        )
+        self.user_index = np.fromiter((user.index for user in self.users), np.int64, size)
+
+        self.now = 0
+        self._counter = 0
+        self.test_busy = 0
+        self.test_waiting = 0
+        self.result_busy = 0
+        self.result_waiting = 0
+
+    def _keys(self, indices: np.ndarray, exo_start: bool = False) -> tuple:
+        # clés (utilisateur, exo, essai) des tirages, voir Commit.draw_key et Moulinette._exo_key
+        attempts = np.zeros_like(indices) if exo_start else self.commits[indices] - 1
+        return indices, self.exo[indices], attempts
+
+    def _draw(self, name: str, indices: np.ndarray, exo_start: bool = False) -> np.ndarray:
+        return self.variates.draw(name, len(indices), self._keys(indices, exo_start))
+
+    def _draw_time(self, name: str, indices: np.ndarray, exo_start: bool = False) -> np.ndarray:
+        return self._draw(name, indices, exo_start).astype(np.int64) * MINUTE_UNIT
+
+    def _record_state(self):
+        self.metrics.record_state(
+            self.now,
+            test_agents=self.test_busy,
+            test_queue_length=self.test_busy + self.test_waiting,
+            backup_length=0,
+            result_agents=self.result_busy,
+            result_queue_length=self.result_busy + self.result_waiting,
+            test_server_utilization=self.test_busy / self.K,
+            result_server_utilization=self.result_busy,
+        )
+
+    def _number(self, indices: np.ndarray):
+        self.seq[indices] = np.arange(self._counter, self._counter + len(indices))
+        self._counter += len(indices)
+
+    def _enqueue(self, indices: np.ndarray, phase: int):
+        self.phase[indices] = phase
+        self.due[indices] = _NEVER
+        self._number(indices)
+
+    def _think(self, indices: np.ndarray, delays: np.ndarray):
+        self.phase[indices] = THINK
+        self.due[indices] = self.now + delays
+        self._number(indices)
+
+    def run(self, until: int | None = None) -> int:
+        """
+        Exécute la simulation.
+
+        :param until: Limite de temps de la simulation.
+        :return: Nombre de pas de temps traités.
+        """
+        size = len(self.users)
+        done = self.exo > self.nb_exos
+        self.phase[done] = DONE
+        self.due[done] = _NEVER
+        active = np.flatnonzero(~done)
+        if self.model.initial_think:
+            self.due[active] = self._draw_time("exo_think", active, exo_start=True)
+        nb_done = int(done.sum())
+        if self.metrics.event_driven:
+            self._record_state()
+
+        end = _NEVER if until is None else until
+        steps = 0
+        while nb_done < size:
+            # mode "event" : saut direct à la prochaine fin de phase, sinon une unité de temps par pas
+            if self.metrics.event_driven:
+                self.now = int(self.due.min())
+            elif steps:
+                self.now += 1
+            if self.now >= end:
+                break
+            steps += 1
+
+            # même ordre que les processus simpy d'un même instant : les commits (programmés depuis
+            # longtemps) avant les fins de test, et l'orientation des commits testés après les fins d'envoi
+            ending = np.flatnonzero(self.due == self.now)
+            phases = self.phase[ending]
+            self._attempt(ending[phases == THINK])
+            tested = self._finish_tests(ending[phases == TESTING])
+            nb_done += self._finish_results(ending[phases == RESULT])
+            self._route_results(tested)
+            self._start_services()
+            self._record_state()
+
+        if until is not None:
+            self.now = until
+        for index, user in enumerate(self.users):
+            user.current_exo = int(self.exo[index])
+        self.model.nb_users_done = nb_done
+        return steps
+
+    # === résultats
+
+    def _finish_results(self, indices: np.ndarray) -> int:
+        if len(indices) == 0:
+            return 0
+        now = self.now
+        self.result_busy -= len(indices)
+        self.metrics.record_result_queue_exit(self.commit_ids[indices], now)
+
+        passed = self._draw("pass_draw", indices) <= self.chance[indices]
+        winners, losers = indices[passed], indices[~passed]
+
+        # exercice validé
+        self.exo[winners] += 1
+        self.commits[winners] = 0
+        self.tag_count[winners] = 0
+        self.last_chance[winners] = np.nan
+        finished = winners[self.exo[winners] > self.nb_exos]
+        self.phase[finished] = DONE
+        self.due[finished] = _NEVER
+        working = winners[self.exo[winners] <= self.nb_exos]
+        self._think(working, self._draw_time("exo_think", working, exo_start=True))
+
+        # commit raté : chance améliorée et tag comptabilisé à la date du commit
+        improvement = self._draw("improvement", losers)
+        self.last_chance[losers] = np.minimum(self.chance[losers] + improvement, 1)
+        self.tags[losers, self.tag_count[losers] % self.tag_limit] = self.date[losers]
+        self.tag_count[losers] += 1
+        self._think(losers, self._draw_time("retry_think", losers))
+        return len(finished)
+
+    # === tests
+
+    def _finish_tests(self, indices: np.ndarray) -> np.ndarray:
+        now = self.now
+        self.test_busy -= len(indices)
+        indices = indices[np.argsort(self.seq[indices], kind="stable")]
+        self.metrics.record_test_queue_exit(self.commit_ids[indices], now)
+        return indices
+
+    def _route_results(self, indices: np.ndarray):
+        if len(indices) == 0:
+            return
+        now = self.now
+
+        # file des résultats pleine, refus
+        if self.kf is not None:
+            room = max(self.kf - self.result_busy - self.result_waiting, 0)
+            refused = indices[room:]
+            indices = indices[:room]
+            for commit_id in self.commit_ids[refused].tolist():
+                self.metrics.record_result_queue_blocked(now, commit_id)
+            self._think(refused, self._draw_time("retry_delay", refused))
+
+        self.metrics.record_result_queue_entry(self.commit_ids[indices], now)
+        self._enqueue(indices, RESULT_QUEUE)
+        self.result_waiting += len(indices)
+
+    # === commits
+
+    def _attempt(self, indices: np.ndarray):
+        if len(indices) == 0:
+            return
+        now = self.now
+
+        # limite de tags : attente jusqu'à la sortie du plus ancien tag de la fenêtre
+        full = self.tag_count[indices] >= self.tag_limit
+        limited = indices[full]
+        oldest = self.tags[limited, self.tag_count[limited] % self.tag_limit]
+        next_allowed = oldest + self.tag_window
+        waiting = next_allowed > now
+        self.due[limited[waiting]] = next_allowed[waiting]
+        self._number(limited[waiting])
+        indices = np.concatenate((indices[~full], limited[~waiting]))
+        # commits dans l'ordre de programmation, comme les processus simpy
+        indices = indices[np.argsort(self.seq[indices], kind="stable")]
+
+        last_chance = self.last_chance[indices]
+        self.chance[indices] = np.where(
+            np.isnan(last_chance), self.intelligence[indices], last_chance
+        )
+        self.date[indices] = now
+        self.commits[indices] += 1
+
+        # file de test pleine, refus
+        if self.ks is not None:
+            room = max(self.ks - self.test_busy - self.test_waiting, 0)
+            refused = indices[room:]
+            indices = indices[:room]
+            for _ in range(len(refused)):
+                self.metrics.record_test_queue_blocked(now)
+            self._think(refused, self._draw_time("retry_delay", refused))
+
+        self.commit_ids[indices] = self.metrics.record_test_queue_entries(
+            self.user_index[indices], self.promo[indices], self.exo[indices], now
+        )
+        self._enqueue(indices, TEST_QUEUE)
+        self.test_waiting += len(indices)
+
+    # === serveurs
+
+    def _start_services(self):
+        now = self.now
+        free = self.K - self.test_busy
+        if free > 0 and self.test_waiting > 0:
+            waiting = np.flatnonzero(self.phase == TEST_QUEUE)
+            if len(waiting) > free:
+                waiting = waiting[np.argpartition(self.seq[waiting], free - 1)[:free]]
+            self.phase[waiting] = TESTING
+            self.due[waiting] = now + self.process_time
+            self.test_busy += len(waiting)
+            self.test_waiting -= len(waiting)
+
+        if self.result_busy == 0 and self.result_waiting > 0:
+            waiting = np.flatnonzero(self.phase == RESULT_QUEUE)
+            first = waiting[np.argmin(self.seq[waiting])]
+            self.phase[first] = RESULT
+            self.due[first] = now + self.result_time
+            self.result_busy = 1
+            self.result_waiting -= 1
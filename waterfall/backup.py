@@ -1,12 +1,12 @@
-import random
-
 from .finite import WaterfallMoulinetteFinite
-from basics import Commit, Utilisateur
+from basics import Commit, Utilisateur, MINUTE_UNIT
+from event_trace import EventCode, EventTrace
+from variates import RandomVariates
 
 
 class WaterfallMoulinetteFiniteBackup(WaterfallMoulinetteFinite):
     """
-    Moulinette Waterfall Finie utilisant FilterStore, avec 2 stages de processing :
+    Moulinette Waterfall Finie utilisant des BoundedQueue, avec 2 stages de processing :
 
     1. Placer le code dans une file d'attente FIFO finie (taille ks) pour exécuter des tests. (K serveurs)
     2. Envoyer le résultat dans une file d'attente FIFO finie (taille kf) pour l'envoyer au front. (1 serveur)
@@ -19,8 +19,17 @@ class WaterfallMoulinetteFiniteBackup(WaterfallMoulinetteFinite):
     :param result_time: Temps de process d'un utilisateur dans la file de résultat.
     :param ks: Tailles des FIFOs pour exécuter des tests.
     :param kf: Taille de la FIFO pour l'envoi des résultats.
+    :param metrics_mode: "sampled" (relevé à chaque unité de temps), "event" (relevé à chaque changement d'état) ou "stream" (relevé à chaque changement d'état, statistiques en mémoire constante, sans graphe).
+    :param rate_limit: Politique de limitation des tags ("sliding_window", "token_bucket" ou "leaky_bucket").
+    :param trace: Trace des événements (par défaut, affichage texte sur la sortie standard).
+    :param compact: Commits à identifiants entiers (pas de tirage d'identifiant aléatoire).
+    :param variates: Source des tirages aléatoires (par défaut, le module random global).
+    :param engine: Moteur de simulation : "simpy" (processus simpy), "fast" (calendrier d'événements natif, voir fast_engine) ou "vector" (pas de temps vectorisé, variantes infinie et finie, voir vector_engine).
     """
 
+    initial_think = False
+    uses_backup = True
+
     def __init__(
         self,
         K: int = 1,
@@ -30,6 +39,12 @@ class WaterfallMoulinetteFiniteBackup(WaterfallMoulinetteFinite):
         result_time: int = 1,
         ks: int = 1,
         kf: int = 1,
+        metrics_mode: str = "sampled",
+        rate_limit: str = "sliding_window",
+        trace: EventTrace | None = None,
+        compact: bool = False,
+        variates: RandomVariates | None = None,
+        engine: str = "simpy",
     ):
         super().__init__(
             K=K,
@@ -39,48 +54,69 @@ class WaterfallMoulinetteFiniteBackup(WaterfallMoulinetteFinite):
             nb_exos=nb_exos,
             ks=ks,
             kf=kf,
+            metrics_mode=metrics_mode,
+            rate_limit=rate_limit,
+            trace=trace,
+            compact=compact,
+            variates=variates,
+            engine=engine,
         )
+        # réveil de free_backup lors d'un ajout dans le backup
+        self._backup_pushed = self.env.event()
 
-    def _process_backup_result(self, commit: Commit, user_id: str):
-        #while len(self.result_queue.items) >= self.kf:
-        #    yield self.env.timeout(1)
+    def _control_processes(self) -> list:
+        return super()._control_processes() + [self.free_backup()]
 
-        self.metrics.record_result_queue_entry(user_id, self.env.now)
+    def _push_backup(self, commit: Commit, commit_id: int):
+        """
+        Place le résultat d'un commit refusé dans le backup.
 
-        print(f"{commit} : enters the result queue. [BACKUP]")
-        yield self.result_queue.put(commit.user)
+        :param commit: Commit refusé par la file des résultats.
+        :param commit_id: Identifiant du commit dans les métriques.
+        """
+        self.backup_storage.put((commit, commit_id))
+        if not self._backup_pushed.triggered:
+            self._backup_pushed.succeed()
+
+    def _process_backup_result(self, commit: Commit, commit_id: int):
+        """
+        Traite un commit du backup, dont la place dans la file des résultats a déjà été réservée.
+        """
+        self.metrics.record_result_queue_entry(commit_id, self.env.now, backup=True)
+
+        self.trace.commit(EventCode.BACKUP_ENTER, self.env.now, commit)
         with self.result_server.request() as request:
             yield request
-            print(f"{commit} : starts result processing. [BACKUP]")
+            self.trace.commit(EventCode.BACKUP_START, self.env.now, commit)
             yield self.env.timeout(self.result_time)
-            print(f"{commit} : finishes result processing. [BACKUP]")
-            yield self.result_queue.get(lambda x: x == commit.user)
+            self.trace.commit(EventCode.BACKUP_FINISH, self.env.now, commit)
+            yield self.result_queue.release()
 
-        self.metrics.record_result_queue_exit(user_id, self.env.now)
+        self.metrics.record_result_queue_exit(commit_id, self.env.now)
 
-        if random.random() <= commit.chance_to_pass:
-            print(f"{commit} : commit passed for exo {commit.exo} ! [BACKUP]")
+        if self.variates.pass_draw(commit.draw_key) <= commit.chance_to_pass:
+            self.trace.commit(EventCode.BACKUP_PASSED, self.env.now, commit)
 
             if commit.exo == commit.user.current_exo:
-                commit.user.current_exo += 1
-                self.users_commit_time[commit.user.name] = []
+                self._pass_exo(commit.user)
 
     def free_backup(self):
-        while True:
-            if (
-                all(user.current_exo > self.nb_exos for user in self.users)
-                and len(self.backup_storage.items) == 0
-            ):
-                break
-
-            while (len(self.result_queue.items)) >= self.kf:
-                yield self.env.timeout(1)
+        """
+        Pousse les commits du backup dans la file des résultats, dès qu'une place s'y libère.
+        """
+        while not self.all_done.triggered:
+            # on pousse autant de commits que la file des résultats peut en accueillir
+            while len(self.backup_storage.items) > 0 and not self.result_queue.is_full():
+                commit, commit_id = self.backup_storage.get().value
+                self.result_queue.admit()
+                self.env.process(self._process_backup_result(commit, commit_id))
+            self._check_all_done()
 
             if len(self.backup_storage.items) > 0:
-                commit, user_id = self.backup_storage.get().value
-                self.env.process(self._process_backup_result(commit, user_id))
-
-            yield self.env.timeout(1)
+                yield self.result_queue.slot_released()
+            elif not self.all_done.triggered:
+                self._backup_pushed = self.env.event()
+                yield self._backup_pushed | self.all_done
 
     def handle_commit(self, user: Utilisateur):
         """
@@ -88,96 +124,86 @@ class WaterfallMoulinetteFiniteBackup(WaterfallMoulinetteFinite):
 
         :param user: Utilisateur.
         """
-        minute_unit = 2
+        minute_unit = MINUTE_UNIT
         last_chance_commit = None
 
         while user.current_exo <= self.nb_exos:
             # push autorisé si dans la limite de tag
             current_time = self.env.now
-            if len(self.users_commit_time[user.name]) >= self.tag_limit:
-                if (
-                    self.users_commit_time[user.name][0]
-                    > current_time - 60 * minute_unit
-                ):
-                    yield self.env.timeout(minute_unit)
-                    continue
-                self.users_commit_time[user.name].pop(0)
+            next_tag_time = self.rate_limiter.next_allowed(user.index, current_time)
+            if next_tag_time > current_time:
+                yield self.env.timeout(next_tag_time - current_time)
+                continue
 
             exo = user.current_exo
-            commit = Commit(user, current_time, exo, last_chance_commit)
-            user_id = f"{user.name}_{current_time}_{exo}"
+            commit = self._new_commit(user, current_time, exo, last_chance_commit)
 
             # si plus de place dans la FIFO de test, refus
-            if len(self.test_queue.items) >= self.ks:
+            if self.test_queue.is_full():
                 self.metrics.record_test_queue_blocked(self.env.now)
-                print(f"{commit} : refused at test queue (FULL).")
-                yield self.env.timeout(random.randint(4, 10) * minute_unit)
+                self.trace.commit(EventCode.TEST_REFUSED, self.env.now, commit)
+                yield self.env.timeout(self.variates.retry_delay(commit.draw_key) * minute_unit)
                 continue
 
             # métriques queue test
-            self.metrics.record_test_queue_entry(user_id, current_time)
+            commit_id = self.metrics.record_test_queue_entry(
+                user.index, user.promo, exo, current_time
+            )
 
             # fifo serveur test
-            print(f"{commit} : enters the test queue.")
-            yield self.test_queue.put(user)
+            self.trace.commit(EventCode.TEST_ENTER, self.env.now, commit)
+            yield self.test_queue.admit()
             with self.test_server.request() as test_request:
                 yield test_request
-                print(f"{commit} : starts testing.")
+                self.trace.commit(EventCode.TEST_START, self.env.now, commit)
                 yield self.env.timeout(self.process_time)
-                print(f"{commit} : finishes testing.")
-                yield self.test_queue.get(lambda x: x == user)
+                self.trace.commit(EventCode.TEST_FINISH, self.env.now, commit)
+                yield self.test_queue.release()
 
-            self.metrics.record_test_queue_exit(user_id, self.env.now)
+            self.metrics.record_test_queue_exit(commit_id, self.env.now)
 
             # si plus de place dans la FIFO d'envoi, refus
-            if len(self.result_queue.items) >= self.kf:
+            if self.result_queue.is_full():
                 self.metrics.record_result_queue_blocked(self.env.now)
-                print(
-                    f"{commit} : refused at result queue (FULL). The result is backed up."
-                )
+                self.trace.commit(EventCode.RESULT_BACKED_UP, self.env.now, commit)
                 # on ajoute le commit dans le backup
-                self.backup_storage.put((commit, user_id))
+                self._push_backup(commit, commit_id)
 
-                yield self.env.timeout(random.randint(4, 10) * minute_unit)
+                yield self.env.timeout(self.variates.retry_delay(commit.draw_key) * minute_unit)
                 continue
 
             # métriques queue résultat
-            self.metrics.record_result_queue_entry(user_id, self.env.now)
+            self.metrics.record_result_queue_entry(commit_id, self.env.now)
 
             # fifo serveur d'envoi
-            print(f"{commit} : enters the result queue.")
-            yield self.result_queue.put(user)
+            self.trace.commit(EventCode.RESULT_ENTER, self.env.now, commit)
+            yield self.result_queue.admit()
             with self.result_server.request() as result_request:
                 yield result_request
-                print(f"{commit} : starts result processing.")
+                self.trace.commit(EventCode.RESULT_START, self.env.now, commit)
                 yield self.env.timeout(self.result_time)
-                print(f"{commit} : finishes result processing.")
-                yield self.result_queue.get(lambda x: x == user)
+                self.trace.commit(EventCode.RESULT_FINISH, self.env.now, commit)
+                yield self.result_queue.release()
 
-            self.metrics.record_result_queue_exit(user_id, self.env.now)
+            self.metrics.record_result_queue_exit(commit_id, self.env.now)
 
             # si le commit est bon
-            if random.random() <= commit.chance_to_pass:
-                print(f"{commit} : commit passed for exo {exo} !")
-                user.current_exo += 1
-                self.users_commit_time[user.name] = []
+            if self.variates.pass_draw(commit.draw_key) <= commit.chance_to_pass:
+                self.trace.commit(EventCode.PASSED, self.env.now, commit)
+                self._pass_exo(user)
                 last_chance_commit = None
 
                 if user.current_exo > self.nb_exos:
                     break
 
-                wating_before_next = round(max(random.gauss(mu=45, sigma=15), 1))
+                wating_before_next = self.variates.exo_think(self._exo_key(user))
                 yield self.env.timeout(wating_before_next * minute_unit)
             else:
-                print(
-                    f"{commit} : commit failed for exo {exo}... Increasing chance to pass for next commit."
-                )
-                more_chance_to_pass = max(
-                    min(random.gauss(mu=0.1, sigma=0.015), 0.2), 0.05
-                )
+                self.trace.commit(EventCode.FAILED, self.env.now, commit)
+                more_chance_to_pass = self.variates.improvement(commit.draw_key)
                 last_chance_commit = min(commit.chance_to_pass + more_chance_to_pass, 1)
 
-                self.users_commit_time[user.name].append(current_time)
-                wating_before_next = round(max(random.gauss(mu=15, sigma=5), 1))
+                self.rate_limiter.record(user.index, current_time)
+                wating_before_next = self.variates.retry_think(commit.draw_key)
 
                 yield self.env.timeout(wating_before_next * minute_unit)
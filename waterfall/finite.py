@@ -1,13 +1,13 @@
-import simpy
-import random
-
 from .infinite import WaterfallMoulinetteInfinite
-from basics import Commit, Utilisateur
+from basics import Utilisateur, MINUTE_UNIT
+from event_trace import EventCode, EventTrace
+from variates import RandomVariates
+from resources import BoundedQueue
 
 
 class WaterfallMoulinetteFinite(WaterfallMoulinetteInfinite):
     """
-    Moulinette Waterfall Finie utilisant FilterStore, avec 2 stages de processing :
+    Moulinette Waterfall Finie utilisant des BoundedQueue, avec 2 stages de processing :
 
     1. Placer le code dans une file d'attente FIFO finie (taille ks) pour exécuter des tests. (K serveurs)
     2. Envoyer le résultat dans une file d'attente FIFO finie (taille kf) pour l'envoyer au front. (1 serveur)
@@ -17,6 +17,12 @@ class WaterfallMoulinetteFinite(WaterfallMoulinetteInfinite):
     :param result_time: Temps de process d'un utilisateur dans la file de résultat.
     :param ks: Tailles des FIFOs pour exécuter des tests.
     :param kf: Taille de la FIFO pour l'envoi des résultats.
+    :param metrics_mode: "sampled" (relevé à chaque unité de temps), "event" (relevé à chaque changement d'état) ou "stream" (relevé à chaque changement d'état, statistiques en mémoire constante, sans graphe).
+    :param rate_limit: Politique de limitation des tags ("sliding_window", "token_bucket" ou "leaky_bucket").
+    :param trace: Trace des événements (par défaut, affichage texte sur la sortie standard).
+    :param compact: Commits à identifiants entiers (pas de tirage d'identifiant aléatoire).
+    :param variates: Source des tirages aléatoires (par défaut, le module random global).
+    :param engine: Moteur de simulation : "simpy" (processus simpy), "fast" (calendrier d'événements natif, voir fast_engine) ou "vector" (pas de temps vectorisé, variantes infinie et finie, voir vector_engine).
     """
 
     def __init__(
@@ -28,6 +34,12 @@ class WaterfallMoulinetteFinite(WaterfallMoulinetteInfinite):
         result_time: int = 1,
         ks: int = 1,
         kf: int = 1,
+        metrics_mode: str = "sampled",
+        rate_limit: str = "sliding_window",
+        trace: EventTrace | None = None,
+        compact: bool = False,
+        variates: RandomVariates | None = None,
+        engine: str = "simpy",
     ):
         super().__init__(
             K=K,
@@ -35,11 +47,17 @@ class WaterfallMoulinetteFinite(WaterfallMoulinetteInfinite):
             result_time=result_time,
             tag_limit=tag_limit,
             nb_exos=nb_exos,
+            metrics_mode=metrics_mode,
+            rate_limit=rate_limit,
+            trace=trace,
+            compact=compact,
+            variates=variates,
+            engine=engine,
         )
         self.ks = ks
         self.kf = kf
-        self.test_queue = simpy.FilterStore(self.env, capacity=self.ks)
-        self.result_queue = simpy.FilterStore(self.env, capacity=self.kf)
+        self.test_queue = BoundedQueue(self.env, capacity=self.ks)
+        self.result_queue = BoundedQueue(self.env, capacity=self.kf)
 
     def handle_commit(self, user: Utilisateur):
         """
@@ -47,95 +65,87 @@ class WaterfallMoulinetteFinite(WaterfallMoulinetteInfinite):
 
         :param user: Utilisateur.
         """
-        minute_unit = 2
+        minute_unit = MINUTE_UNIT
         last_chance_commit = None
 
         # working on first exercise
-        wating_before_next = round(max(random.gauss(mu=45, sigma=15), 1))
+        wating_before_next = self.variates.exo_think(self._exo_key(user))
         yield self.env.timeout(wating_before_next * minute_unit)
 
         while user.current_exo <= self.nb_exos:
             # push autorisé si dans la limite de tag
             current_time = self.env.now
-            if len(self.users_commit_time[user.name]) >= self.tag_limit:
-                if (
-                    self.users_commit_time[user.name][0]
-                    > current_time - 60 * minute_unit
-                ):
-                    yield self.env.timeout(minute_unit)
-                    continue
-                self.users_commit_time[user.name].pop(0)
+            next_tag_time = self.rate_limiter.next_allowed(user.index, current_time)
+            if next_tag_time > current_time:
+                yield self.env.timeout(next_tag_time - current_time)
+                continue
 
             exo = user.current_exo
-            commit = Commit(user, current_time, exo, last_chance_commit)
-            user_id = f"{user.name}_{current_time}_{exo}"
+            commit = self._new_commit(user, current_time, exo, last_chance_commit)
 
             # si plus de place dans la FIFO de test, refus
-            if len(self.test_queue.items) >= self.ks:
+            if self.test_queue.is_full():
                 self.metrics.record_test_queue_blocked(self.env.now)
-                print(f"{commit} : refused at test queue (FULL).")
-                yield self.env.timeout(random.randint(4, 10) * minute_unit)
+                self.trace.commit(EventCode.TEST_REFUSED, self.env.now, commit)
+                yield self.env.timeout(self.variates.retry_delay(commit.draw_key) * minute_unit)
                 continue
 
             # métriques queue test
-            self.metrics.record_test_queue_entry(user_id, current_time)
+            commit_id = self.metrics.record_test_queue_entry(
+                user.index, user.promo, exo, current_time
+            )
 
             # fifo serveur test
-            print(f"{commit} : enters the test queue.")
-            yield self.test_queue.put(user)
+            self.trace.commit(EventCode.TEST_ENTER, self.env.now, commit)
+            yield self.test_queue.admit()
             with self.test_server.request() as test_request:
                 yield test_request
-                print(f"{commit} : starts testing.")
+                self.trace.commit(EventCode.TEST_START, self.env.now, commit)
                 yield self.env.timeout(self.process_time)
-                print(f"{commit} : finishes testing.")
-                yield self.test_queue.get(lambda x: x == user)
+                self.trace.commit(EventCode.TEST_FINISH, self.env.now, commit)
+                yield self.test_queue.release()
 
-            self.metrics.record_test_queue_exit(user_id, self.env.now)
+            self.metrics.record_test_queue_exit(commit_id, self.env.now)
 
             # si plus de place dans la FIFO d'envoi, refus
-            if len(self.result_queue.items) >= self.kf:
-                self.metrics.record_result_queue_blocked(self.env.now)
-                print(f"{commit} : refused at result queue (FULL).")
-                yield self.env.timeout(random.randint(4, 10) * minute_unit)
+            if self.result_queue.is_full():
+                self.metrics.record_result_queue_blocked(self.env.now, commit_id)
+                self.trace.commit(EventCode.RESULT_REFUSED, self.env.now, commit)
+                yield self.env.timeout(self.variates.retry_delay(commit.draw_key) * minute_unit)
                 continue
 
             # métriques queue résultat
-            self.metrics.record_result_queue_entry(user_id, self.env.now)
+            self.metrics.record_result_queue_entry(commit_id, self.env.now)
 
             # fifo serveur d'envoi
-            print(f"{commit} : enters the result queue.")
-            yield self.result_queue.put(user)
+            self.trace.commit(EventCode.RESULT_ENTER, self.env.now, commit)
+            yield self.result_queue.admit()
             with self.result_server.request() as result_request:
                 yield result_request
-                print(f"{commit} : starts result processing.")
+                self.trace.commit(EventCode.RESULT_START, self.env.now, commit)
                 yield self.env.timeout(self.result_time)
-                print(f"{commit} : finishes result processing.")
-                yield self.result_queue.get(lambda x: x == user)
+                self.trace.commit(EventCode.RESULT_FINISH, self.env.now, commit)
+                yield self.result_queue.release()
 
-            self.metrics.record_result_queue_exit(user_id, self.env.now)
+            self.metrics.record_result_queue_exit(commit_id, self.env.now)
 
             # si le commit est bon
-            if random.random() <= commit.chance_to_pass:
-                print(f"{commit} : commit passed for exo {exo} !")
-                user.current_exo += 1
-                self.users_commit_time[user.name] = []
+            if self.variates.pass_draw(commit.draw_key) <= commit.chance_to_pass:
+                self.trace.commit(EventCode.PASSED, self.env.now, commit)
+                self._pass_exo(user)
                 last_chance_commit = None
 
                 if user.current_exo > self.nb_exos:
                     break
 
-                wating_before_next = round(max(random.gauss(mu=45, sigma=15), 1))
+                wating_before_next = self.variates.exo_think(self._exo_key(user))
                 yield self.env.timeout(wating_before_next * minute_unit)
             else:
-                print(
-                    f"{commit} : commit failed for exo {exo}... Increasing chance to pass for next commit."
-                )
-                more_chance_to_pass = max(
-                    min(random.gauss(mu=0.1, sigma=0.015), 0.2), 0.05
-                )
+                self.trace.commit(EventCode.FAILED, self.env.now, commit)
+                more_chance_to_pass = self.variates.improvement(commit.draw_key)
                 last_chance_commit = min(commit.chance_to_pass + more_chance_to_pass, 1)
 
-                self.users_commit_time[user.name].append(current_time)
-                wating_before_next = round(max(random.gauss(mu=15, sigma=5), 1))
+                self.rate_limiter.record(user.index, current_time)
+                wating_before_next = self.variates.retry_think(commit.draw_key)
 
                 yield self.env.timeout(wating_before_next * minute_unit)
@@ -1,6 +1,6 @@
-import random
-
-from basics import Moulinette, Utilisateur, Commit
+from basics import Moulinette, Utilisateur, MINUTE_UNIT
+from event_trace import EventCode, EventTrace
+from variates import RandomVariates
 
 
 class WaterfallMoulinetteInfinite(Moulinette):
@@ -13,6 +13,12 @@ class WaterfallMoulinetteInfinite(Moulinette):
     :param K: Nombre de FIFO pour les tests.
     :param process_time: Temps de process d'un utilisateur dans la file de test.
     :param result_time: Temps de process d'un utilisateur dans la file de résultat.
+    :param metrics_mode: "sampled" (relevé à chaque unité de temps), "event" (relevé à chaque changement d'état) ou "stream" (relevé à chaque changement d'état, statistiques en mémoire constante, sans graphe).
+    :param rate_limit: Politique de limitation des tags ("sliding_window", "token_bucket" ou "leaky_bucket").
+    :param trace: Trace des événements (par défaut, affichage texte sur la sortie standard).
+    :param compact: Commits à identifiants entiers (pas de tirage d'identifiant aléatoire).
+    :param variates: Source des tirages aléatoires (par défaut, le module random global).
+    :param engine: Moteur de simulation : "simpy" (processus simpy), "fast" (calendrier d'événements natif, voir fast_engine) ou "vector" (pas de temps vectorisé, variantes infinie et finie, voir vector_engine).
     """
 
     def __init__(
@@ -22,6 +28,12 @@ class WaterfallMoulinetteInfinite(Moulinette):
         result_time: int = 1,
         tag_limit: int = 5,
         nb_exos: int = 10,
+        metrics_mode: str = "sampled",
+        rate_limit: str = "sliding_window",
+        trace: EventTrace | None = None,
+        compact: bool = False,
+        variates: RandomVariates | None = None,
+        engine: str = "simpy",
     ):
         super().__init__(
             K=K,
@@ -29,6 +41,12 @@ class WaterfallMoulinetteInfinite(Moulinette):
             result_time=result_time,
             tag_limit=tag_limit,
             nb_exos=nb_exos,
+            metrics_mode=metrics_mode,
+            rate_limit=rate_limit,
+            trace=trace,
+            compact=compact,
+            variates=variates,
+            engine=engine,
         )
 
     def handle_commit(self, user: Utilisateur):
@@ -37,77 +55,69 @@ class WaterfallMoulinetteInfinite(Moulinette):
 
         :param user: Utilisateur.
         """
-        minute_unit = 2
+        minute_unit = MINUTE_UNIT
         last_chance_commit = None
 
         # working on first exercise
-        wating_before_next = round(max(random.gauss(mu=45, sigma=15), 1))
+        wating_before_next = self.variates.exo_think(self._exo_key(user))
         yield self.env.timeout(wating_before_next * minute_unit)
 
         while user.current_exo <= self.nb_exos:
             # push autorisé si dans la limite de tag
             current_time = self.env.now
-            if len(self.users_commit_time[user.name]) >= self.tag_limit:
-                if (
-                    self.users_commit_time[user.name][0]
-                    > current_time - 60 * minute_unit
-                ):
-                    yield self.env.timeout(minute_unit)
-                    continue
-                self.users_commit_time[user.name].pop(0)
+            next_tag_time = self.rate_limiter.next_allowed(user.index, current_time)
+            if next_tag_time > current_time:
+                yield self.env.timeout(next_tag_time - current_time)
+                continue
 
             exo = user.current_exo
-            commit = Commit(user, current_time, exo, last_chance_commit)
-            user_id = f"{user.name}_{current_time}_{exo}"
+            commit = self._new_commit(user, current_time, exo, last_chance_commit)
 
             # métriques queue test
-            self.metrics.record_test_queue_entry(user_id, current_time)
-            print(f"{commit} : enters the test queue.")
+            commit_id = self.metrics.record_test_queue_entry(
+                user.index, user.promo, exo, current_time
+            )
+            self.trace.commit(EventCode.TEST_ENTER, self.env.now, commit)
 
             # fifo serveur test
             with self.test_server.request() as test_request:
                 yield test_request
-                print(f"{commit} : starts testing.")
+                self.trace.commit(EventCode.TEST_START, self.env.now, commit)
                 yield self.env.timeout(self.process_time)
-                print(f"{commit} : finishes testing.")
+                self.trace.commit(EventCode.TEST_FINISH, self.env.now, commit)
 
-            self.metrics.record_test_queue_exit(user_id, self.env.now)
+            self.metrics.record_test_queue_exit(commit_id, self.env.now)
 
             # métriques queue résultat
-            self.metrics.record_result_queue_entry(user_id, self.env.now)
-            print(f"{commit} : enters the result queue.")
+            self.metrics.record_result_queue_entry(commit_id, self.env.now)
+            self.trace.commit(EventCode.RESULT_ENTER, self.env.now, commit)
 
             # fifo serveur d'envoi
             with self.result_server.request() as result_request:
                 yield result_request
-                print(f"{commit} : starts result processing.")
+                self.trace.commit(EventCode.RESULT_START, self.env.now, commit)
                 yield self.env.timeout(self.result_time)
-                print(f"{commit} : finishes result processing.")
+                self.trace.commit(EventCode.RESULT_FINISH, self.env.now, commit)
 
-            self.metrics.record_result_queue_exit(user_id, self.env.now)
+            self.metrics.record_result_queue_exit(commit_id, self.env.now)
 
             # si le commit est bon
-            if random.random() <= commit.chance_to_pass:
-                print(f"{commit} : commit passed for exo {exo} !")
-                user.current_exo += 1
-                self.users_commit_time[user.name] = []
+            if self.variates.pass_draw(commit.draw_key) <= commit.chance_to_pass:
+                self.trace.commit(EventCode.PASSED, self.env.now, commit)
+                self._pass_exo(user)
                 last_chance_commit = None
 
                 if user.current_exo > self.nb_exos:
                     break
 
-                wating_before_next = round(max(random.gauss(mu=45, sigma=15), 1))
+                wating_before_next = self.variates.exo_think(self._exo_key(user))
                 yield self.env.timeout(wating_before_next * minute_unit)
             else:
-                print(
-                    f"{commit} : commit failed for exo {exo}... Increasing chance to pass for next commit."
-                )
-                more_chance_to_pass = max(
-                    min(random.gauss(mu=0.1, sigma=0.015), 0.2), 0.05
-                )
+                self.trace.commit(EventCode.FAILED, self.env.now, commit)
+                more_chance_to_pass = self.variates.improvement(commit.draw_key)
                 last_chance_commit = min(commit.chance_to_pass + more_chance_to_pass, 1)
 
-                self.users_commit_time[user.name].append(current_time)
-                wating_before_next = round(max(random.gauss(mu=15, sigma=5), 1))
+                self.rate_limiter.record(user.index, current_time)
+                wating_before_next = self.variates.retry_think(commit.draw_key)
 
                 yield self.env.timeout(wating_before_next * minute_unit)